@@ -0,0 +1,61 @@
+# coding=utf-8
+'''
+基准测试用的模型, 覆盖常见关联形式:
+    Book -(外键)-> Publisher -(外键)-> Country
+    Publisher <-(o2o)- Profile
+    Book -(m2m)-> Tag
+    Book <-(反向外键)- Chapter
+'''
+from django.db import models
+
+
+class Country(models.Model):
+    name = models.CharField('国家', max_length=50)
+
+    def __str__(self):
+        return self.name
+
+
+class Publisher(models.Model):
+    name = models.CharField('出版社', max_length=100)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, verbose_name='国家')
+
+    def __str__(self):
+        return self.name
+
+
+class Profile(models.Model):
+    publisher = models.OneToOneField(Publisher, on_delete=models.CASCADE, verbose_name='出版社')
+    website = models.CharField('网站', max_length=100)
+
+    def __str__(self):
+        return self.website
+
+
+class Tag(models.Model):
+    name = models.CharField('标签', max_length=50)
+
+    def __str__(self):
+        return self.name
+
+
+class Book(models.Model):
+    STATUS = ((0, '草稿'), (1, '已发布'), (2, '下架'))
+    title = models.CharField('书名', max_length=100, db_index=True)
+    status = models.IntegerField('状态', choices=STATUS, default=0)
+    active = models.BooleanField('有效', default=True)
+    price = models.DecimalField('价格', max_digits=8, decimal_places=2, default=0)
+    publisher = models.ForeignKey(Publisher, on_delete=models.CASCADE, verbose_name='出版社')
+    tags = models.ManyToManyField(Tag, blank=True, verbose_name='标签')
+    updated = models.DateTimeField('更新时间', auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+
+class Chapter(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name='书')
+    name = models.CharField('章节', max_length=100)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,5 @@
+# coding=utf-8
+# 未安装 django-bootstrap3 时, 模板中 {% load bootstrap3 %} 使用的空标签库 (基准测试不渲染表单)
+from django import template
+
+register = template.Library()
@@ -0,0 +1,24 @@
+# coding=utf-8
+from django.conf.urls import url
+
+from generic.routers import MyRouter
+
+from . import models
+from . import views
+
+urlpatterns = [
+    *[
+        url(rf'^list/{shape}/{opt}/$', view.as_view(), name=f'list_{shape}_{opt}')
+        for (shape, opt), view in views.LIST_VIEWS.items()
+    ],
+    *[
+        url(rf'^detail/{shape}/{opt}/(?P<pk>\d+)/$', view.as_view(), name=f'detail_{shape}_{opt}')
+        for (shape, opt), view in views.DETAIL_VIEWS.items()
+    ],
+    url(r'^delete/book/$', views.BookDelete.as_view(), name='delete_book'),
+    url(r'^delete/chapter/$', views.ChapterDelete.as_view(), name='delete_chapter'),
+
+    # MyRouter自动生成的视图, 列表页未配置list_fields/filter_fields, 为DataTables服务端模式
+    *MyRouter(models.Book),
+    *MyRouter(models.Publisher),
+]
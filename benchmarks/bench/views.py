@@ -0,0 +1,73 @@
+# coding=utf-8
+'''
+基准测试视图: 各种 list_fields/detail_fields 字段形式 x SQL优化开/关
+'''
+from generic import views
+
+from . import models
+
+LIST_SHAPES = {
+    # 本表字段
+    'flat': ['pk', 'title', 'status', 'active', 'price', 'updated'],
+    # x2o多层关联字段
+    'fk': ['pk', 'title', 'publisher__name', 'publisher__country__name'],
+    # 外键显示关联obj (str)
+    'fk_obj': ['pk', 'title', 'publisher', 'publisher__country'],
+    # 反向o2o
+    'o2o': ['pk', 'title', 'publisher__profile__website'],
+    # 正向m2m/反向外键
+    'x2m': ['pk', 'title', 'tags', 'chapter_set'],
+    'mixed': ['pk', 'title', 'status', 'publisher__name', 'publisher__country__name', 'publisher__profile__website',
+              'tags', 'chapter_set'],
+    # 声明式虚拟关联 (virtual_relations), 关联表当成跨库表处理
+    'virtual': ['pk', 'title', 'pub__name', 'pub__country__name', 'chapters__name'],
+    # 同上, 出版社为维度表, 缓存于进程内LRU
+    'virtual_cache': ['pk', 'title', 'pub__name', 'pub__country__name', 'chapters__name'],
+    # 同flat/fk, values行模式 (不生成model实例)
+    'flat_values': ['pk', 'title', 'status', 'active', 'price', 'updated'],
+    'fk_values': ['pk', 'title', 'publisher__name', 'publisher__country__name'],
+}
+
+VALUES_SHAPES = {'flat_values', 'fk_values'}
+
+VIRTUAL_RELATIONS = {
+    'pub': {'rel_model': models.Publisher, 'rel_field': 'publisher_id'},
+    'chapters': {'rel_model': models.Chapter, 'rel_field': 'book_id', 'reverse': True, 'to_field': 'pk'},
+}
+
+VIRTUAL_RELATIONS_CACHE = {
+    **VIRTUAL_RELATIONS,
+    'pub': {**VIRTUAL_RELATIONS['pub'], 'cache': {'timeout': 600}},
+}
+
+DETAIL_SHAPES = {
+    'all': [],  # 本表所有字段
+    'fk': ['title', 'status', 'publisher__name', 'publisher__country__name', 'publisher__profile__website'],
+    'x2m': ['title', 'publisher', 'tags', 'chapter_set'],
+}
+
+OPTIMIZE = {'on': True, 'off': False}
+
+
+def make_view(base, name, **attrs):
+    return type(name, (base, ), {'__module__': __name__, 'model': models.Book, **attrs})
+
+
+LIST_VIEWS = {
+    (shape, opt): make_view(
+        views.MyListView, f'List_{shape}_{opt}',
+        list_fields=fields, filter_fields=['title'], optimize_sql=optimize,
+        virtual_relations={'virtual': VIRTUAL_RELATIONS, 'virtual_cache': VIRTUAL_RELATIONS_CACHE}.get(shape, {}),
+        row_mode='values' if shape in VALUES_SHAPES else 'objects',
+    )
+    for shape, fields in LIST_SHAPES.items() for opt, optimize in OPTIMIZE.items()
+}
+
+DETAIL_VIEWS = {
+    (shape, opt): make_view(views.MyDetailView, f'Detail_{shape}_{opt}', detail_fields=fields, optimize_sql=optimize)
+    for shape, fields in DETAIL_SHAPES.items() for opt, optimize in OPTIMIZE.items()
+}
+
+# 删除不使用后台线程, 测量的是同步删除耗时
+BookDelete = make_view(views.MyDeleteView, 'BookDelete', delete_background_threshold=0)
+ChapterDelete = make_view(views.MyDeleteView, 'ChapterDelete', model=models.Chapter, delete_background_threshold=0)
@@ -0,0 +1,307 @@
+# coding=utf-8
+'''
+通用视图基准测试: MyListView/MyDetailView/MyDeleteView/MyRouter生成的视图, 在不同数据量下的
+响应耗时(p50/p95/p99), SQL查询次数, 内存峰值(tracemalloc).
+
+场景 (名称格式, -k 按子串筛选):
+    list.<字段形式>.<SQL优化on/off>.ps<每页条数>    字段形式见 bench/views.py LIST_SHAPES
+    list.flat.on.ps20.last                         最后一页 (大OFFSET)
+    detail.<字段形式>.<on/off>                      DETAIL_SHAPES
+    delete.<book/chapter>.n<条数>                   批量删除, 每次测量后回滚, 数据不变
+    router.<model>.<list/data/detail>              MyRouter生成的视图, data为DataTables服务端模式ajax数据
+
+数据使用SQLite文件 (默认在系统临时目录, 按行数复用, --rebuild 重新生成) 或内存数据库 (--db :memory:).
+
+用法 (在仓库根目录执行):
+    python -m benchmarks.run                               # 1k行, 所有场景
+    python -m benchmarks.run --rows 1k,100k,1m -k list.    # 多种数据量, 只测列表页
+    python -m benchmarks.run --save baseline.json          # 保存基准结果
+    python -m benchmarks.run --compare baseline.json       # 与基准结果比较, 变慢超过 --threshold 的标记出来
+'''
+import os
+import sys
+import json
+import time
+import warnings
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+from .settings import configure
+
+ROW_UNITS = {'k': 1000, 'm': 1000000}
+
+
+def parse_rows(value):
+    # 1000 / 1k / 100k / 1m
+    rows = []
+    for item in value.lower().split(','):
+        item = item.strip()
+        if item[-1:] in ROW_UNITS:
+            rows.append(int(float(item[:-1]) * ROW_UNITS[item[-1]]))
+        elif item:
+            rows.append(int(item))
+    return rows
+
+
+def percentile(values, p):
+    # 最近秩百分位
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def populate(rows, batch_size=10000):
+    '''
+    生成数据: rows本书, 每本书3个标签/2个章节, 每20本书一个出版社(含o2o简介), 20个国家, 100个标签
+    '''
+    from django.db import transaction
+    from .bench import models
+
+    def bulk(model, objs):
+        model.objects.bulk_create(objs, batch_size=batch_size)
+
+    publishers = max(1, rows // 20)
+    with transaction.atomic():
+        bulk(models.Country, [models.Country(id=i, name=f'国家{i}') for i in range(1, 21)])
+        bulk(models.Tag, [models.Tag(id=i, name=f'标签{i}') for i in range(1, 101)])
+        bulk(models.Publisher, [
+            models.Publisher(id=i, name=f'出版社{i}', country_id=i % 20 + 1) for i in range(1, publishers + 1)
+        ])
+        bulk(models.Profile, [
+            models.Profile(id=i, publisher_id=i, website=f'https://publisher{i}.example.com')
+            for i in range(1, publishers + 1)
+        ])
+
+    through = models.Book.tags.through
+    for start in range(1, rows + 1, batch_size):
+        ids = range(start, min(start + batch_size, rows + 1))
+        with transaction.atomic():
+            bulk(models.Book, [
+                models.Book(id=i, title=f'书名{i}', status=i % 3, active=bool(i % 2), price=i % 1000,
+                            publisher_id=i % publishers + 1)
+                for i in ids
+            ])
+            bulk(through, [through(book_id=i, tag_id=(i + k * 7) % 100 + 1) for i in ids for k in range(3)])
+            bulk(models.Chapter, [models.Chapter(book_id=i, name=f'第{k}章') for i in ids for k in range(1, 3)])
+
+
+def setup_database(rows, db, rebuild=False):
+    '''
+    切换到rows行数据的数据库, 文件数据库已有相同行数的数据时直接使用
+    '''
+    from django.db import connections
+    from django.core.cache import caches
+    from django.core.management import call_command
+    from .bench import models
+
+    name = db if db == ':memory:' else os.path.join(db, f'generic_bench_{rows}.sqlite3')
+    connection = connections['default']
+    connection.close()
+    if name != ':memory:' and rebuild and os.path.exists(name):
+        os.remove(name)
+    connection.settings_dict['NAME'] = name
+    caches['default'].clear()  # 版本号/权限等缓存
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if models.Book.objects.count() != rows:
+        for model in (models.Chapter, models.Book.tags.through, models.Book, models.Profile, models.Publisher,
+                      models.Tag, models.Country):
+            model.objects.all()._raw_delete('default')
+        start = time.perf_counter()
+        populate(rows)
+        print(f'生成 {rows} 行数据: {time.perf_counter() - start:.1f}秒', file=sys.stderr)
+
+
+def get_client():
+    from django.db import close_old_connections
+    from django.core import signals
+    from django.test import Client
+    from django.contrib.auth import get_user_model
+
+    # 同django测试: 请求结束不关闭数据库连接 (内存数据库/回滚事务需要, 相当于持久连接 CONN_MAX_AGE)
+    signals.request_started.disconnect(close_old_connections)
+    signals.request_finished.disconnect(close_old_connections)
+
+    User = get_user_model()
+    user = User.objects.filter(username='bench').first() or User.objects.create_superuser(
+        'bench', 'bench@example.com', 'bench'
+    )
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+class Scenario:
+    def __init__(self, name, path, data=None, method='get', rollback=False):
+        self.name = name
+        self.path = path
+        self.data = data or {}
+        self.method = method
+        self.rollback = rollback  # 修改数据的请求, 执行后回滚
+
+    def request(self, client):
+        from django.db import transaction
+        if not self.rollback:
+            return getattr(client, self.method)(self.path, self.data)
+        with transaction.atomic():
+            response = getattr(client, self.method)(self.path, self.data)
+            transaction.set_rollback(True)
+        return response
+
+
+def get_scenarios(rows):
+    from .bench import views
+
+    detail_pk = max(1, rows // 2)
+    scenarios = []
+    for shape, opt in views.LIST_VIEWS:
+        for pagesize in (20, 50, 100):
+            scenarios.append(
+                Scenario(f'list.{shape}.{opt}.ps{pagesize}', f'/list/{shape}/{opt}/', {'pagesize': pagesize})
+            )
+    scenarios.append(Scenario('list.flat.on.ps20.last', '/list/flat/on/', {'page': 'last'}))
+
+    for shape, opt in views.DETAIL_VIEWS:
+        scenarios.append(Scenario(f'detail.{shape}.{opt}', f'/detail/{shape}/{opt}/{detail_pk}/'))
+
+    for model in ('book', 'chapter'):
+        for count in (10, 100):
+            ids = list(range(1, min(count, rows) + 1))
+            scenarios.append(Scenario(f'delete.{model}.n{count}', f'/delete/{model}/', {'id': ids}, 'post', True))
+
+    scenarios += [
+        Scenario('router.book.list', '/book/'),
+        Scenario('router.book.data', '/book/', {'draw': 1, 'start': 0, 'length': 20}),
+        Scenario('router.book.detail', f'/book/{detail_pk}/'),
+        Scenario('router.publisher.data', '/publisher/', {'draw': 1, 'start': 0, 'length': 20}),
+    ]
+    return scenarios
+
+
+def measure(client, scenario, repeat, warmup):
+    from django.db import connection
+
+    for i in range(warmup):
+        response = scenario.request(client)
+        if response.status_code != 200:
+            raise Exception(f'{scenario.name}: HTTP {response.status_code}')
+
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        scenario.request(client)
+        times.append(time.perf_counter() - start)
+
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        scenario.request(client)
+
+    tracemalloc.start()
+    try:
+        scenario.request(client)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50': percentile(times, 50) * 1000,
+        'p95': percentile(times, 95) * 1000,
+        'p99': percentile(times, 99) * 1000,
+        'mean': sum(times) / len(times) * 1000,
+        'queries': len(queries),
+        'peak_kb': peak / 1024,
+    }
+
+
+def get_meta():
+    import django
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, cwd=os.path.dirname(__file__)
+        ).decode().strip()
+    except Exception:
+        commit = ''
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(results, baseline, threshold):
+    '''
+    与基准结果比较, 返回变慢(p50超过阈值)或SQL查询次数增加的场景
+    '''
+    regressions = []
+    print(f'\n与基准比较 (commit {baseline["meta"].get("commit") or "?"}, {baseline["meta"].get("time")}):')
+    print(f'{"场景":<40} {"p50基准":>10} {"p50":>10} {"变化":>8} {"SQL":>9}')
+    for key, result in results.items():
+        base = baseline['results'].get(key)
+        if not base:
+            continue
+        change = result['p50'] / base['p50'] - 1 if base['p50'] else 0
+        flag = ''
+        if change > threshold or result['queries'] > base['queries']:
+            regressions.append(key)
+            flag = ' !'
+        print(f'{key:<40} {base["p50"]:>10.2f} {result["p50"]:>10.2f} {change:>+7.0%} '
+              f'{base["queries"]:>4}->{result["queries"]:<4}{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='通用视图基准测试')
+    parser.add_argument('--rows', default='1k', help='数据行数, 逗号分隔, 比如 1k,100k,1m')
+    parser.add_argument('-k', dest='keyword', default='', help='只测名称包含该字符串的场景')
+    parser.add_argument('--repeat', type=int, default=20, help='每个场景测量次数')
+    parser.add_argument('--warmup', type=int, default=2, help='每个场景预热次数')
+    parser.add_argument('--db', default=tempfile.gettempdir(), help='SQLite数据文件目录, :memory: 为内存数据库')
+    parser.add_argument('--rebuild', action='store_true', help='重新生成数据')
+    parser.add_argument('--save', help='结果保存为基准文件 (json)')
+    parser.add_argument('--compare', help='与基准文件比较')
+    parser.add_argument('--threshold', type=float, default=0.1, help='比较时p50变慢超过该比例视为退化, 默认0.1')
+    args = parser.parse_args(argv)
+
+    configure()  # 数据库按行数在 setup_database() 中切换
+    warnings.simplefilter('ignore')  # 未排序分页等警告, 不影响测量
+
+    results = {}
+    for rows in parse_rows(args.rows):
+        setup_database(rows, args.db, args.rebuild)
+        client = get_client()
+        print(f'\n{rows}行 {"场景":<32} {"p50":>9} {"p95":>9} {"p99":>9} {"mean":>9} {"SQL":>5} {"内存KB":>9}')
+        for scenario in get_scenarios(rows):
+            if args.keyword not in scenario.name:
+                continue
+            result = results[f'{rows}:{scenario.name}'] = measure(client, scenario, args.repeat, args.warmup)
+            print(f'{"":<{len(str(rows)) + 2}}{scenario.name:<32} {result["p50"]:>9.2f} {result["p95"]:>9.2f} '
+                  f'{result["p99"]:>9.2f} {result["mean"]:>9.2f} {result["queries"]:>5} {result["peak_kb"]:>9.0f}')
+
+    data = {'meta': {**get_meta(), 'repeat': args.repeat}, 'results': results}
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f'\n已保存: {args.save}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)}个场景退化')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
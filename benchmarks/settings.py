@@ -0,0 +1,55 @@
+# coding=utf-8
+'''
+基准测试的django配置, 不需要项目, settings.configure() 直接配置
+'''
+import django
+from django.conf import settings
+
+
+def configure(db_name=':memory:', debug=False):
+    try:
+        import bootstrap3  # noqa: F401
+        bootstrap3_library = 'bootstrap3.templatetags.bootstrap3'
+    except ImportError:
+        bootstrap3_library = 'benchmarks.bench.templatetags.nobootstrap'
+
+    settings.configure(
+        DEBUG=debug,
+        SECRET_KEY='benchmarks',
+        ALLOWED_HOSTS=['*'],
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'django.contrib.messages',
+            'generic',
+            'benchmarks.bench',
+        ],
+        MIDDLEWARE=[
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+        ],
+        ROOT_URLCONF='benchmarks.bench.urls',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': db_name}},
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'APP_DIRS': True,
+            'OPTIONS': {
+                'context_processors': [
+                    'django.template.context_processors.request',
+                    'django.contrib.auth.context_processors.auth',
+                ],
+                'libraries': {
+                    # django 3.0 起无 staticfiles 标签库, 通用模板中 {% load staticfiles %} 使用static代替
+                    'staticfiles': 'django.templatetags.static',
+                    'bootstrap3': bootstrap3_library,
+                },
+            },
+        }],
+        STATIC_URL='/static/',
+        USE_TZ=True,
+        LOGGING={'version': 1, 'disable_existing_loggers': False, 'root': {'level': 'ERROR'}},
+    )
+    django.setup()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GenericConfig(AppConfig):
     name = 'generic'
     verbose_name = '通用视图模板(LowCode)'
+
+    def ready(self):
+        from . import perms
+        perms.watch_perms()  # 用户/组/权限变化时, 权限缓存失效
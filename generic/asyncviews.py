@@ -0,0 +1,188 @@
+# coding=utf-8
+'''
+异步视图 (ASGI)
+
+django 3.x 无异步ORM, 视图的同步流程(权限检查/查询/模板渲染)不能直接在事件循环中执行.
+异步视图的处理:
+    as_view() 返回协程函数, 整个同步流程通过 sync_to_async(thread_sensitive=False) 在线程中执行,
+    不阻塞事件循环, 各请求也不会排队等待同一个同步线程 (ASGI下同步视图默认都在同一线程中依次执行).
+    请求中互不依赖的查询, 在有界线程池(conf.ASYNC_WORKERS, 所有请求共用)中并发执行:
+        列表页: 分页总条数 COUNT 与当前页数据查询(含prefetch)同时查询
+        DataTables服务端模式: 总条数/过滤后条数/当前页数据同时查询
+        虚拟关联: 多个关联表/分批查询同时查询 (不需另外配置 virtual_workers)
+    请求耗时由各次查询耗时之和, 减少为其中最慢的一个, 关联表在其它数据库(跨库/远程)时效果明显.
+    模板响应在线程中渲染完成后再返回 (模板中的数据库查询不能在事件循环中执行).
+
+注意:
+    视图流程线程及并发查询工作线程使用各自的数据库连接, 执行前后都按 CONN_MAX_AGE 关闭或保留 (建议配置持久连接).
+    django不支持 ATOMIC_REQUESTS 与异步视图一起使用; 请求中已开启事务时不并发, 以免其它线程看不到未提交数据.
+    导出为流式响应, django 4.2以下ASGI在事件循环中迭代响应内容, 边查边输出会出错, 导出使用同步视图 (MyExportView).
+
+使用:
+    视图继承 AsyncListView/AsyncDetailView 等, 或自定义视图最前面继承 AsyncViewMixin/AsyncListMixin,
+    MyRouter(model, async_views=True) 或 conf.ROUTER_ASYNC_VIEWS 自动生成异步视图.
+'''
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db import close_old_connections, connections
+from django.http import Http404
+
+from . import conf
+from . import views
+from . import metrics
+
+logger = logging.getLogger()
+
+_local = threading.local()  # 标记当前线程为并发查询工作线程
+_executor = None
+_executor_lock = threading.Lock()
+
+__all__ = [
+    'AsyncViewMixin', 'AsyncListMixin', 'AsyncListView', 'AsyncDetailView',
+    'AsyncCreateView', 'AsyncUpdateView', 'AsyncDeleteView', 'AsyncBulkUpdateView', 'run_concurrent',
+]
+
+
+def get_executor():
+    # 并发查询线程池, 所有请求共用, 限制同时执行的查询数(数据库连接数)
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=conf.ASYNC_WORKERS, thread_name_prefix='generic-async')
+    return _executor
+
+
+def run_concurrent(funcs):
+    '''
+    并发执行多个互不依赖的查询函数(无参数), 返回各结果列表, 顺序同funcs.
+    第一个函数在当前线程执行, 其余提交到线程池.
+    只有一个函数/已在工作线程中(嵌套调用, 以免线程池占满时互相等待)/当前线程数据库连接处于事务中时, 依次执行.
+    '''
+    if len(funcs) <= 1 or getattr(_local, 'worker', False) or any(
+        connection.in_atomic_block for connection in connections.all()
+    ):
+        return [func() for func in funcs]
+
+    request_metrics = metrics.get_current()
+    futures = [get_executor().submit(run_in_worker, func, request_metrics) for func in funcs[1:]]
+    try:
+        first = funcs[0]()
+    finally:
+        wait(futures)
+    return [first, *[future.result() for future in futures]]
+
+
+def run_in_worker(func, request_metrics=None):
+    # 工作线程执行查询, 完成后按 CONN_MAX_AGE 关闭本线程的数据库连接
+    _local.worker = True
+    try:
+        if request_metrics is None:
+            return func()
+        with request_metrics.record_thread():
+            return func()
+    finally:
+        _local.worker = False
+        close_old_connections()
+
+
+class AsyncViewMixin:
+    '''
+    异步视图, as_view() 返回协程函数, 同步流程在线程中执行, 参考模块说明.
+    需放在视图继承的最前面.
+    '''
+
+    @classmethod
+    def as_view(cls, *a, **k):
+        view = super().as_view(*a, **k)
+
+        def render_view(request, *args, **kwargs):
+            # 线程池线程中执行, 不经过django同步线程的 request_started/request_finished,
+            # 前后按 CONN_MAX_AGE 关闭过期/不可用的数据库连接, 同 run_in_worker()
+            close_old_connections()
+            try:
+                response = view(request, *args, **kwargs)
+                if callable(getattr(response, 'render', None)) and not response.is_rendered:
+                    response.render()
+                return response
+            finally:
+                close_old_connections()
+
+        async def async_view(request, *args, **kwargs):
+            return await sync_to_async(render_view, thread_sensitive=False)(request, *args, **kwargs)
+
+        async_view.__dict__.update(view.__dict__)  # view_class/view_initkwargs/csrf_exempt等
+        async_view.__name__ = view.__name__
+        async_view.__qualname__ = view.__qualname__
+        async_view.__module__ = view.__module__
+        async_view.__doc__ = view.__doc__
+        return async_view
+
+    def run_concurrent(self, *funcs):
+        return run_concurrent(funcs)
+
+
+class AsyncListMixin(AsyncViewMixin):
+    '''
+    异步列表页, 分页总条数与当前页数据并发查询, 虚拟关联使用并发查询线程池
+    '''
+
+    def paginate_queryset(self, queryset, page_size):
+        page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        if self.keyset_pagination or not str(page_number).isdigit() or int(page_number) < 1:
+            # 游标分页无COUNT, 'last'尾页需先得到总条数, 无效页码的404, 按原方式处理
+            return super().paginate_queryset(queryset, page_size)
+
+        number = int(page_number)
+        page_paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        bottom = (number - 1) * page_paginator.per_page
+        count, objects = self.run_concurrent(
+            lambda: page_paginator.count,
+            lambda: self.get_page_objects(queryset[bottom:bottom + page_paginator.per_page + page_paginator.orphans]),
+        )
+        if page_paginator.count_estimated and number > 1 and not objects:
+            # 估算条数超出实际尾页, 按原方式处理 (改为精确计数, 显示实际尾页)
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page_paginator.validate_number(number)
+        except InvalidPage as e:
+            raise Http404(f'无效的页码 ({number}): {e}')
+        if bottom + page_paginator.per_page + page_paginator.orphans < count:
+            objects = objects[:page_paginator.per_page]  # 多查的orphans条不属于当前页
+        page = page_paginator._get_page(objects, number, page_paginator)
+        return page_paginator, page, page.object_list, page.has_other_pages()
+
+    def run_tasks(self, tasks, aliases=()):
+        # 虚拟关联 (VirtualRelation) 分批/多表查询
+        return run_concurrent(tasks)
+
+
+class AsyncListView(AsyncListMixin, views.MyListView):
+    1
+
+
+class AsyncDetailView(AsyncViewMixin, views.MyDetailView):
+    1
+
+
+class AsyncCreateView(AsyncViewMixin, views.MyCreateView):
+    1
+
+
+class AsyncUpdateView(AsyncViewMixin, views.MyUpdateView):
+    1
+
+
+class AsyncDeleteView(AsyncViewMixin, views.MyDeleteView):
+    1
+
+
+class AsyncBulkUpdateView(AsyncViewMixin, views.MyBulkUpdateView):
+    1
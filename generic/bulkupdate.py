@@ -0,0 +1,98 @@
+# coding=utf-8
+'''
+批量修改, 选中的多条数据修改为相同的字段值
+
+    快速修改: 无逐条处理时 (视图未重写 update_object), 直接 UPDATE ... SET ... WHERE pk IN (...),
+             不查询obj, 每批一条SQL, 提交的条数不超过一批时只有一条SQL.
+    逐条处理: 先按批查出obj (只查主键及修改字段), update_object() 逐条赋值后, bulk_update() 按批写回修改字段.
+    auto_now字段 (最后修改时间等) 同save(), 一起更新为当前时间.
+
+    所有批次在同一事务中, 中途出错时全部回滚.
+    只修改默认管理器(或视图queryset)中的数据, 同 deletion.BulkDeleter.
+    注意: 两种方式都不调用 model.save(), 不发送 pre_save/post_save 信号 (同 queryset.update()),
+         通用视图的页面缓存/条件GET版本号在修改后直接更新.
+'''
+import logging
+
+from django.db import router, transaction
+
+from . import conf
+from . import cache
+
+logger = logging.getLogger()
+
+
+class BulkUpdater:
+    '''
+    分批修改model数据
+    values: 修改字段值 {字段名: 值}
+    update_object: 逐条处理函数 update_object(obj, values), 为None时使用快速修改
+    queryset: 可修改的数据范围, 默认为 model._default_manager.all()
+    '''
+    chunk_size = conf.BULK_UPDATE_CHUNK_SIZE
+
+    def __init__(self, model, pks, values, using=None, chunk_size=None, update_object=None, queryset=None):
+        self.model = model
+        self.queryset = model._default_manager.all() if queryset is None else queryset.all()
+        self.pks = list(dict.fromkeys(pks))  # 去重, 保持顺序
+        self.values = values
+        self.using = using or router.db_for_write(model)
+        self.chunk_size = chunk_size or self.chunk_size
+        self.update_object = update_object
+        self.total = len(self.pks)  # 待修改条数 (提交的主键个数)
+        self.updated = 0  # 已修改条数
+        self.error = ''
+
+    def get_queryset(self, pks):
+        return self.queryset.using(self.using).filter(pk__in=pks)
+
+    def get_auto_now_fields(self):
+        # save()时自动更新的字段 (DateField/DateTimeField auto_now)
+        return [
+            field for field in self.model._meta.concrete_fields
+            if getattr(field, 'auto_now', False) and field.name not in self.values
+        ]
+
+    def run(self):
+        fast = self.update_object is None
+        logger.debug(f'{self.model._meta.label} 批量修改 {self.total}条 {list(self.values)}, 快速修改: {fast}')
+        try:
+            with transaction.atomic(using=self.using):
+                for i in range(0, self.total, self.chunk_size):
+                    pks = self.pks[i:i + self.chunk_size]
+                    self.updated += self.update_chunk(pks) if fast else self.update_chunk_objects(pks)
+        except Exception as e:
+            logger.exception(f'{self.model._meta.label} 批量修改出错, 已回滚')
+            self.error = str(e)
+            self.updated = 0
+        else:
+            if self.updated:
+                cache.bump_model_version(self.model)
+                cache.bump_object_version(self.model, *self.pks)
+        return self
+
+    def update_chunk(self, pks):
+        values = dict(self.values)
+        for field in self.get_auto_now_fields():
+            values[field.name] = field.pre_save(self.model(), False)
+        return self.get_queryset(pks).update(**values)
+
+    def update_chunk_objects(self, pks):
+        auto_now_fields = self.get_auto_now_fields()
+        fields = [*self.values, *[field.name for field in auto_now_fields]]
+        objs = list(self.get_queryset(pks).only(*fields))
+        for obj in objs:
+            self.update_object(obj, self.values)
+            for field in auto_now_fields:
+                field.pre_save(obj, False)
+        if objs:
+            self.model._default_manager.using(self.using).bulk_update(objs, fields, batch_size=self.chunk_size)
+        return len(objs)
+
+    def get_status(self):
+        return {
+            'status': not self.error,
+            'error': self.error,
+            'total': self.total,
+            'updated': self.updated,
+        }
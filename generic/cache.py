@@ -0,0 +1,450 @@
+# coding=utf-8
+'''
+通用视图缓存相关
+
+model数据版本号: 每个model一个版本号, 存于django缓存,
+model数据有增删改(post_save/post_delete/m2m_changed信号)时版本号递增,
+缓存key中带上相关model的版本号, 数据变化后自动使用新key, 旧缓存自然失效, 无需逐个删除.
+
+注意: 多进程部署时, conf.GENERIC_CACHE_ALIAS 应配置为共享缓存(redis/memcached等),
+否则各进程版本号不一致, 其它进程修改数据后本进程缓存不会失效.
+信号只能感知通过django ORM进行的修改, 其它系统直接修改数据库时, 需调用 bump_model_version().
+
+虚拟关联表缓存: VirtualCache, 参考 listview.VirtualRelation
+'''
+import time
+import datetime
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import models
+from django.db.models import signals
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import conf
+
+logger = logging.getLogger()
+
+_senders = {}  # 已监听的信号发送者 {sender: {model, ...}}, m2m中间表对应多个model
+_virtual_caches = {}  # 配置对应的虚拟关联缓存策略 {配置: VirtualCache}, 进程内LRU缓存跨请求保留
+
+
+def get_cache():
+    return caches[conf.GENERIC_CACHE_ALIAS]
+
+
+def is_shared_cache():
+    # conf.GENERIC_CACHE_ALIAS 是否为多进程共享缓存 (redis/memcached/数据库/文件等), 进程内存缓存/dummy缓存不是
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def make_key(*args):
+    # 缓存key, 参数过长或含特殊字符时使用md5
+    key = ':'.join(str(arg) for arg in args)
+    return f'{conf.GENERIC_CACHE_PREFIX}:{hashlib.md5(key.encode()).hexdigest()}'
+
+
+def get_version_key(model):
+    return f'{conf.GENERIC_CACHE_PREFIX}:version:{model._meta.label_lower}'
+
+
+def get_model_version(model):
+    '''
+    获取model数据版本号, 首次使用时自动监听model数据变化.
+    初始值使用时间戳, 以免缓存清空/重启后版本号从头开始, 与旧缓存的key重复.
+    '''
+    watch_model(model)
+    cache = get_cache()
+    key = get_version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def get_models_version(models):
+    # 多个model版本号组合, 用于缓存key
+    return '.'.join(str(get_model_version(model)) for model in sorted(models, key=lambda m: m._meta.label_lower))
+
+
+def bump_model_version(model):
+    # model数据已变化, 版本号递增, 相关缓存失效
+    cache = get_cache()
+    key = get_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 版本号不存在 (未使用过或已过期)
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def get_object_version_key(model, pk):
+    return f'{conf.GENERIC_CACHE_PREFIX}:version:{model._meta.concrete_model._meta.label_lower}:{pk}'
+
+
+def get_object_version(model, pk):
+    '''
+    获取单条数据版本号 (详情页ETag), 首次使用时自动监听model数据变化.
+    数据变化时直接删除版本号, 下次使用时重新生成, 不给每条保存过的数据都保留一个key.
+    '''
+    watch_model(model)
+    cache = get_cache()
+    key = get_object_version_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), conf.GENERIC_OBJECT_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_object_version(model, *pks):
+    get_cache().delete_many([get_object_version_key(model, pk) for pk in pks])
+
+
+def watch_model(model):
+    '''
+    监听model数据变化, 版本号递增.
+    注意: 监听post_delete后, django批量删除该model数据时不再走fast delete, 会先查出obj再删.
+    '''
+    model = model._meta.concrete_model
+    if model in _senders.get(model, ()):
+        return
+    connect(signals.post_save, model, model)
+    connect(signals.post_delete, model, model)
+
+    # m2m关系变化 (正反m2m中间表)
+    for field in model._meta.many_to_many:
+        connect(signals.m2m_changed, field.remote_field.through, model)
+    for rel in model._meta.related_objects:
+        if rel.many_to_many and rel.through:
+            connect(signals.m2m_changed, rel.through, model)
+
+
+def connect(signal, sender, model):
+    models = _senders.setdefault(sender, set())
+    models.add(model)
+    signal.connect(model_changed, sender=sender, weak=False, dispatch_uid=f'generic.cache.{id(signal)}')
+
+
+def model_changed(sender, **kwargs):
+    action = kwargs.get('action')
+    if action and not action.startswith('post_'):
+        # m2m_changed信号, 只处理变化完成后的post_add/post_remove/post_clear
+        return
+    instance = kwargs.get('instance')
+    for model in _senders.get(sender, ()):
+        logger.debug(f'{model._meta.label} 数据变化, 缓存版本号更新')
+        bump_model_version(model)
+        # 单条数据版本号: save/delete及正向m2m变化的instance, 反向m2m变化的pk_set
+        if isinstance(instance, model):
+            bump_object_version(model, instance.pk)
+        elif kwargs.get('model') is model and kwargs.get('pk_set'):
+            bump_object_version(model, *kwargs['pk_set'])
+
+
+class ModelVersionMixin:
+    '''
+    页面内容依赖的model及版本号, 用于页面缓存(PageCacheMixin)/条件GET(ConditionalGetMixin)
+    '''
+
+    @classmethod
+    def watch_version_models(cls, **initkwargs):
+        # 加载url时即监听相关model, 修改数据的进程(即使未访问过本页面)才能使缓存失效
+        for model in cls(**initkwargs).get_version_models():
+            watch_model(model)
+
+    def get_version_models(self):
+        # 页面内容依赖的model: 本model及 list_fields/detail_fields/filter_fields 关联的model
+        model = self.model or self.queryset.model
+        return {model, *getattr(self.fields_plan, 'related_models', ())}
+
+    def get_user_perms(self):
+        # 用户对model的增删改查权限, 页面内容因权限而不同 (编辑/删除按钮等)
+        from . import perms  # perms 依赖本模块
+        model = self.model or self.queryset.model
+        return sorted(perms.get_model_perms(self.request.user, model).items())
+
+
+class PageCacheMixin(ModelVersionMixin):
+    '''
+    列表页/详情页内容缓存, 视图配置 page_cache = True 开启.
+
+    缓存的是模板中 {% pagecache 名称 %}...{% endpagecache %} 包含的片段, 不是整个页面,
+    基础模板中的当前用户/菜单/csrf等, 每次请求照常渲染.
+    缓存key包含: 视图类, url路径, url参数, 用户对model的增删改查权限, 本model及字段关联model的数据版本号,
+    数据增删改后key变化, 旧缓存自然失效. 命中缓存时不查询数据库 (不执行 get_queryset/分页/计数).
+
+    url参数只允许 搜索/分页/每页条数/游标/orm_过滤, 含其它参数(导出/DataTables服务端等)时不使用缓存.
+    '''
+    page_cache = conf.GENERIC_PAGE_CACHE  # 是否缓存页面内容
+    page_cache_timeout = conf.GENERIC_PAGE_CACHE_TIMEOUT  # 缓存秒数
+    page_cache_fragments = ('content',)  # 模板中缓存的片段名称, 命中时需全部存在
+
+    @classmethod
+    def as_view(cls, *a, **k):
+        view = super().as_view(*a, **k)
+        if cls.page_cache:
+            cls.watch_version_models(**k)
+        return view
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_page_cache_key()
+        if key:
+            fragments = get_cache().get_many([f'{key}:{name}' for name in self.page_cache_fragments])
+            if len(fragments) == len(self.page_cache_fragments):
+                logger.debug(f'{self.model._meta.label} 页面缓存命中: {request.get_full_path()}')
+                return self.render_page_cache({k.rsplit(':', 1)[1]: html for k, html in fragments.items()})
+            self.page_cache_key = key  # 模板渲染后由 {% pagecache %} 存入缓存
+        return super().get(request, *args, **kwargs)
+
+    def render_page_cache(self, fragments):
+        # 缓存命中, 不查询数据, 模板片段直接输出缓存内容
+        self.object_list = self.object = None  # get_template_names() 需要
+        return self.render_to_response({'view': self, 'page_cache_fragments': fragments})
+
+    def get_page_cache_params(self):
+        # 可缓存的url参数, 不在其中(orm_过滤除外)的不缓存
+        kwargs = ('page_kwarg', 'page_size_kwarg', 'cursor_kwarg')
+        return {'s', *(getattr(self, kwarg) for kwarg in kwargs if getattr(self, kwarg, None))}
+
+    def get_page_cache_key(self):
+        if not self.page_cache or self.request.method != 'GET':
+            return None
+        names = self.get_page_cache_params()
+        params = []
+        for name in sorted(self.request.GET):
+            if name not in names and not name.startswith('orm_'):
+                return None
+            params.append((name, self.request.GET.getlist(name)))
+
+        view_class = f'{type(self).__module__}.{type(self).__qualname__}'
+        return make_key(
+            'page', view_class, self.request.path, get_models_version(self.get_version_models()),
+            params, self.get_user_perms(),
+        )
+
+
+class ConditionalGetMixin(ModelVersionMixin):
+    '''
+    条件GET: 执行主查询前计算ETag(及Last-Modified), 与浏览器缓存一致时直接返回304, 不查询/不渲染.
+    视图配置 conditional_get = True 开启, 或 conf.GENERIC_CONDITIONAL_GET 全局开启 (MyRouter生成的视图同样有效).
+
+    ETag包含: 视图类, 用户及其model权限, 相关model数据版本号,
+        列表页: 本model版本号, 配置了 last_modified_field 时改为数据库 MAX(last_modified_field) 及总条数;
+        详情页: 当前数据的版本号, 配置了 last_modified_field 时改为数据库中当前数据该字段值.
+    字段关联model的数据变化仍使用版本号判断, 所以只有无其它关联model时才输出 Last-Modified.
+
+    注意: 不经过django ORM修改数据时, 版本号不会变化, 应配置 last_modified_field 或调用 bump_model_version().
+    '''
+    conditional_get = conf.GENERIC_CONDITIONAL_GET  # 是否开启条件GET
+    last_modified_field = None  # 数据更新时间字段, 比如 'updated_at'
+
+    @classmethod
+    def as_view(cls, *a, **k):
+        view = super().as_view(*a, **k)
+        if cls.conditional_get:
+            cls.watch_version_models(**k)
+        return view
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_conditional_validators() if self.conditional_get else None
+        if not validators:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            # 内容因用户而不同, 不允许代理缓存; 浏览器每次都需验证
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_conditional_validators(self):
+        # 返回 (ETag, Last-Modified时间戳), 无法确定时返回None
+        model = self.model or self.queryset.model
+        pk_url_kwarg = getattr(self, 'pk_url_kwarg', None)
+        if pk_url_kwarg:
+            # 详情页, 只支持主键url
+            pk = self.kwargs.get(pk_url_kwarg)
+            if pk is None:
+                return None
+            if self.last_modified_field:
+                values = model._default_manager.filter(pk=pk).values_list(self.last_modified_field, flat=True)[:1]
+                if not values:
+                    return None  # 数据不存在, 正常返回404
+                data_version = values[0]
+            else:
+                data_version = get_object_version(model, pk)
+        elif self.last_modified_field:
+            data_version = model._default_manager.aggregate(
+                last=models.Max(self.last_modified_field), count=models.Count('pk'),
+            )
+            data_version = (data_version['count'], data_version['last'])
+        else:
+            data_version = get_model_version(model)
+
+        last_modified = None
+        related_models = self.get_version_models() - {model}
+        if self.last_modified_field and not related_models:
+            value = data_version[1] if isinstance(data_version, tuple) else data_version
+            if isinstance(value, datetime.datetime):
+                last_modified = int(value.timestamp())
+
+        view_class = f'{type(self).__module__}.{type(self).__qualname__}'
+        user = self.request.user
+        key = make_key(
+            view_class, user.pk, self.get_user_perms(), data_version,
+            get_models_version(related_models) if related_models else '',
+        )
+        return f'W/"{key.rsplit(":", 1)[1]}"', last_modified
+
+
+class LocalCache:
+    '''
+    进程内LRU缓存, 各条带过期时间(TTL), 线程安全. 接口同django缓存的 get_many/set_many/clear
+    '''
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # {key: (过期时间, value)}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+                if item[0] and item[0] < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                result[key] = item[1]
+        return result
+
+    def set_many(self, data, timeout=None):
+        expires = time.monotonic() + timeout if timeout else 0
+        with self._lock:
+            for key, value in data.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return []
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class VirtualCache:
+    '''
+    虚拟关联(VirtualRelation)关联表数据缓存策略,
+    适用于数据量小/变化少的维度表(部门/地区等), 通常在其它数据库, 不必每次页面访问都查询关联表.
+
+    backend: None 进程内LRU缓存 (各进程独立), 或django缓存别名 (settings.CACHES, 多进程共享)
+    timeout: 缓存秒数 (TTL), 0/None为不过期
+    maxsize: 进程内LRU缓存最多条数, 超出时淘汰最久未使用的
+    preload: True 首次使用时查出关联表qs2所有数据并缓存, 之后完全在内存中关联, 不再查询关联表
+    versioned: 缓存key带上关联表model版本号 (get_model_version), 通过django ORM修改关联表数据时自动失效,
+               使用django缓存时总是带上版本号 (clear()通过版本号使缓存失效)
+
+    缓存key由 关联表model/数据库/qs2查询条件(SQL)/关联字段/版本号 及关联值组成, 各关联值分别缓存,
+    页面只查询未命中的关联值, 关联表中不存在的关联值也缓存, 全部命中时不查询关联表.
+    其它系统直接修改关联表数据时, 调用 bump_model_version(Model2) 或 clear() 使缓存失效, 否则等待过期.
+    进程内缓存的obj2由各请求共用, 只读使用, 不应修改.
+    '''
+
+    def __init__(self, backend=None, timeout=conf.VIRTUAL_CACHE_TIMEOUT, maxsize=conf.VIRTUAL_CACHE_MAXSIZE,
+                 preload=False, versioned=True):
+        self.backend = backend
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.preload = preload
+        self.versioned = versioned
+        self.local = None if backend else LocalCache(maxsize)
+        self.models = set()  # 使用过的关联表model
+
+    @property
+    def store(self):
+        return self.local or caches[self.backend]
+
+    def clear(self):
+        # 主动使缓存失效, django缓存不能按前缀删除, 关联表model版本号递增
+        if self.local:
+            self.local.clear()
+        else:
+            for model in self.models:
+                bump_model_version(model)
+
+    def get_prefix(self, qs2, field2, many):
+        model = qs2.model
+        self.models.add(model)
+        try:
+            sql = str(qs2.query)
+        except EmptyResultSet:
+            sql = ''
+        version = get_model_version(model) if self.versioned or not self.local else ''
+        return make_key('virtual', model._meta.label_lower, qs2.db, sql, field2, many, version)
+
+    def make_key(self, prefix, key):
+        # 进程内缓存直接使用元组作为key, 不必md5
+        return (prefix, key) if self.local else make_key(prefix, key)
+
+    def get_dict2(self, qs2, field2, many, keys, fetch):
+        '''
+        返回关联值对应的 {key: obj2} 或 {key: [obj2, ...]}, 未命中缓存的关联值调用 fetch(keys) 查询.
+        preload时调用 fetch(None) 查出所有数据, keys不使用.
+        '''
+        prefix = self.get_prefix(qs2, field2, many)
+        store = self.store
+        if self.preload:
+            dict2 = store.get_many([prefix]).get(prefix)
+            if dict2 is None:
+                dict2 = fetch(None)
+                store.set_many({prefix: dict2}, self.timeout)
+            return dict2
+
+        cache_keys = {self.make_key(prefix, key): key for key in keys}
+        found = store.get_many(list(cache_keys))
+        # 关联表中不存在的关联值缓存为 (), 与未缓存区分
+        dict2 = {cache_keys[cache_key]: value for cache_key, value in found.items() if value != ()}
+        missing = [key for cache_key, key in cache_keys.items() if cache_key not in found]
+        if missing:
+            fetched = fetch(missing)
+            store.set_many({self.make_key(prefix, key): fetched.get(key, ()) for key in missing}, self.timeout)
+            dict2.update(fetched)
+        return dict2
+
+
+def get_virtual_cache(config):
+    '''
+    虚拟关联缓存配置转为缓存策略, 相同配置使用同一个策略(进程内LRU缓存跨请求共用)
+    config: VirtualCache对象 / True 默认策略 / 数字 缓存秒数 / dict VirtualCache参数 / None,False 不缓存
+    '''
+    if not config or isinstance(config, VirtualCache):
+        return config or None
+    if config is True:
+        key = ()
+    elif isinstance(config, dict):
+        key = tuple(sorted(config.items()))
+    else:
+        key = (('timeout', config), )
+    policy = _virtual_caches.get(key)
+    if policy is None:
+        policy = _virtual_caches.setdefault(key, VirtualCache(**dict(key)))
+    return policy
@@ -0,0 +1,393 @@
+# coding=utf-8
+'''
+列表页各列取值函数 (accessor)
+
+按字段方案中已解析的字段, 每列预先编译为专用的取值函数,
+避免每个单元格都重复拆分字段路径, 逐个判断字段类型.
+'''
+import uuid
+import traceback
+from functools import partial
+
+from django.contrib.admin import utils
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from django.db.models.fields import reverse_related
+from django.db.models.fields import related
+from django.urls import reverse, NoReverseMatch
+from django.utils.html import format_html, format_html_join
+
+
+_accessors = {}  # 模板过滤器 lookup_val 使用的取值函数缓存
+
+
+def display_qs(qs):
+    return format_html('<br/>'.join([str(obj) for obj in qs]))
+
+
+class Row:
+    '''列表页一行数据, object为行对应的obj, cells为各列显示值, urls为各action链接 {action: url}'''
+    __slots__ = ('object', 'cells', 'urls')
+
+    def __init__(self, obj, cells, urls=None):
+        self.object = obj
+        self.cells = cells
+        self.urls = urls or {}
+
+
+def render_rows(objects, accessors, row_urls=None):
+    '''
+    一次性生成列表页各行数据, 供模板直接循环输出, 不再每个单元格调用模板过滤器.
+    row_urls: {action: RowUrl}, 各行action链接
+    '''
+    if not row_urls:
+        return [Row(obj, [accessor(obj) for accessor in accessors]) for obj in objects]
+    return [
+        Row(obj, [accessor(obj) for accessor in accessors], {
+            action: row_url(obj.pk) for action, row_url in row_urls.items()
+        }) for obj in objects
+    ]
+
+
+def render_value_rows(rows, value_columns, row_urls=None):
+    '''
+    values行模式 (SqlListView.row_mode), rows为 values_list 命名元组 (含pk), 不生成model实例,
+    各列按列格式化, 再转为各行数据.
+    value_columns: [(值序号, x2o关联obj主键序号 或 None, 格式化函数), ...], 关联obj不存在时显示None, 同 get_chain_value()
+    '''
+    cols = []
+    for value_index, null_index, format_value in value_columns:
+        if null_index is None:
+            cols.append([format_value(row[value_index]) for row in rows])
+        else:
+            cols.append([None if row[null_index] is None else format_value(row[value_index]) for row in rows])
+    cells_list = [list(cells) for cells in zip(*cols)] if cols else [[] for row in rows]
+    if not row_urls:
+        return [Row(row, cells) for row, cells in zip(rows, cells_list)]
+    return [
+        Row(row, cells, {
+            action: row_url(row.pk) for action, row_url in row_urls.items()
+        }) for row, cells in zip(rows, cells_list)
+    ]
+
+
+class RowUrl:
+    '''
+    各行obj的action链接 (详情/编辑等, url参数为主键), 每个请求只reverse一次:
+    使用占位主键reverse出url, 拆分为 前缀+主键+后缀, 各行直接拼接主键.
+    主键类型不是整数/UUID, 或url中无法唯一定位占位主键时, 各行仍使用reverse.
+    url未配置时, 各行均为None.
+    '''
+    INT_PK = 9182736450  # 占位主键, 不太可能与url其它部分重复
+    UUID_PK = uuid.UUID('91827364-5091-8273-6450-918273645091')
+
+    def __init__(self, view_name, model):
+        self.view_name = view_name
+        self.prefix = self.suffix = None
+        self.enabled = True
+
+        pk_field = model._meta.pk
+        while pk_field.remote_field and pk_field.related_model:
+            pk_field = pk_field.target_field  # 主键为o2o外键 (多表继承)
+        if isinstance(pk_field, models.UUIDField):
+            self.pk_type, placeholder = uuid.UUID, self.UUID_PK
+        elif isinstance(pk_field, (models.AutoField, models.IntegerField)):
+            self.pk_type, placeholder = int, self.INT_PK
+        else:
+            return
+
+        try:
+            url = reverse(view_name, args=[placeholder])
+        except NoReverseMatch:
+            self.enabled = False  # 主键类型匹配, 仍reverse失败, 认为url未配置
+            return
+        parts = url.split(str(placeholder))
+        if len(parts) == 2:
+            self.prefix, self.suffix = parts
+
+    def __call__(self, pk):
+        if self.prefix is not None and type(pk) is self.pk_type and not (self.pk_type is int and pk < 0):
+            return f'{self.prefix}{pk}{self.suffix}'
+        if self.enabled:
+            try:
+                return reverse(self.view_name, args=[pk])
+            except NoReverseMatch:
+                '未配置action路径，忽略'
+
+
+def get_accessor(field_info):
+    # 取值函数, 按字段缓存, 用于自定义模板中的 {{ object|lookup_val:field }}
+    field_path, verbose_name, last_field_name, field = field_info
+    key = field_path, last_field_name, field
+    accessor = _accessors.get(key)
+    if accessor is None:
+        accessor = _accessors[key] = compile_accessor(field_info)
+    return accessor
+
+
+def compile_accessor(field_info):
+    '''
+    编译列取值函数, 返回 accessor(obj) -> 显示值
+    field_info: field_path, verbose_name, last_field_name, field
+    '''
+    field_path, verbose_name, last_field_name, field = field_info
+    if not field_path:
+        # ListView.list_fields 为空或无任何有效字段, 返回obj本身
+        return get_self
+
+    field_names = field_path.split('__')
+    get_value = compile_value_getter(field, last_field_name)
+    if len(field_names) > 1:
+        # x2o 多层关联表字段
+        get_value = partial(get_chain_value, field_names[:-1], get_value)
+
+    return partial(safe_call, get_value)
+
+
+def get_self(obj):
+    return obj
+
+
+def safe_call(get_value, obj):
+    try:
+        return get_value(obj)
+    except Exception:
+        traceback.print_exc()
+
+
+def get_chain_value(field_names, get_value, obj):
+    for field_name in field_names:
+        # 循环取关联表数据
+        obj = getattr(obj, field_name)
+        if not obj:
+            return
+    return get_value(obj)
+
+
+def compile_value_getter(field, source_field_name=None):
+    '''
+    根据字段类型, 返回取 obj.field_name 显示值的函数, 取值规则同 views.obj_get_val()
+    '''
+    if isinstance(field, related.RelatedField):
+        # 正向关系字段
+        if isinstance(field, related.ManyToManyField):
+            # 多对多字段
+            return partial(get_x2m_value, field.name)
+        # (N对一) 外键/一对一
+        return partial(get_x2o_value, field, source_field_name or field.name)
+
+    if isinstance(field, reverse_related.ForeignObjectRel):
+        # 反向关系字段
+        related_name = field.get_accessor_name()
+        if isinstance(field, reverse_related.OneToOneRel):
+            # 反向OneToOne字段
+            return partial(get_reverse_o2o_value, field, related_name)
+        # (N对多) 反向外键/反向m2m字段, 对应多条obj数据.
+        return partial(get_x2m_value, related_name)
+
+    flatchoices = getattr(field, 'flatchoices', None)
+    if flatchoices:
+        # 有choices的字段, 直接查字典
+        return partial(get_choice_value, field.name, dict(flatchoices))
+
+    return partial(get_field_value, field)
+
+
+def compile_value_formatter(field_info):
+    '''
+    values行模式的列格式化函数, 参数为数据库字段值, 显示值同 compile_accessor()
+    '''
+    field_path, verbose_name, last_field_name, field = field_info
+    flatchoices = getattr(field, 'flatchoices', None)
+    if flatchoices and not field.is_relation:
+        return partial(safe_call, partial(format_choice_value, dict(flatchoices)))
+    return partial(safe_call, partial(format_field_value, field))
+
+
+def format_field_value(field, value):
+    return utils.display_for_field(value, field, value or '')
+
+
+def format_choice_value(choices, value):
+    return choices.get(value, value or '')
+
+
+def get_field_value(field, obj):
+    # 普通字段
+    value = getattr(obj, field.name)
+    return utils.display_for_field(value, field, value or '')
+
+
+def get_choice_value(field_name, choices, obj):
+    value = getattr(obj, field_name)
+    return choices.get(value, value or '')
+
+
+def get_x2o_value(field, source_field_name, obj):
+    # 注意区分 field.name 与带"_id"的 field.attname
+    # 如果是field.attname, 不使用关联表数据, 而是当前表关联字段值
+    try:
+        value = getattr(obj, source_field_name)
+    except ObjectDoesNotExist:
+        value = getattr(obj, field.attname)  # 取数据库字段值
+    if not value:
+        value = getattr(obj, field.name)
+    return utils.display_for_field(value, field, value or '')
+
+
+def get_reverse_o2o_value(field, related_name, obj):
+    value = getattr(obj, related_name, None)
+    if value is None:
+        return
+    return utils.display_for_field(value, field, value or '')
+
+
+def get_x2m_value(related_name, obj):
+    rel_obj = getattr(obj, related_name, None)
+    if rel_obj is None:
+        return
+    return display_qs(rel_obj.all())
+
+
+def get_count_attr(field_path):
+    # x2m预览列, 关联数据总条数存于obj的属性名
+    return f'{field_path.replace("__", "_")}_preview_count'
+
+
+def get_related_name(field):
+    # x2m关联字段在obj上的属性名, 反向外键未指定related_name时为 xxx_set, 与查询名(字段路径)不同
+    return field.name if isinstance(field, related.ManyToManyField) else field.get_accessor_name()
+
+
+def get_prefetch_lookup(field_path, field):
+    # x2m预览列的 prefetch_related 路径
+    return '__'.join([*field_path.split('__')[:-1], get_related_name(field)])
+
+
+def compile_preview_accessor(field_info, limit, display_field=None):
+    '''
+    x2m列预览取值函数, 只显示前limit条关联数据, 其余显示为 "+N"
+    display_field: 关联obj显示的字段, 为空则显示 str(obj)
+    '''
+    field_path, verbose_name, last_field_name, field = field_info
+    related_name = get_related_name(field)
+    get_value = partial(get_x2m_preview, related_name, limit, display_field, get_count_attr(field_path))
+    field_names = field_path.split('__')
+    if len(field_names) > 1:
+        get_value = partial(get_chain_value, field_names[:-1], get_value)
+    return partial(safe_call, get_value)
+
+
+def get_x2m_preview(related_name, limit, display_field, count_attr, obj):
+    rel_obj = getattr(obj, related_name, None)
+    if rel_obj is None:
+        return
+    qs = rel_obj.all()
+    total = getattr(obj, count_attr, None)  # 预览prefetch只查出前limit条时, 总条数另外统计 (count_x2m)
+    if total is None and qs._result_cache is not None:
+        total = len(qs)  # 已prefetch全部关联数据
+    if total is None:
+        # 未prefetch (未开启SQL优化等), 多查一条判断是否还有, 不逐行COUNT, 不显示总条数
+        items = list(qs[:limit + 1])
+        more = len(items) > limit
+        items = items[:limit]
+    else:
+        items = qs[:limit]
+        more = total > len(items)
+
+    values = [getattr(o, display_field) if display_field else str(o) for o in items]
+    html = format_html_join(format_html('<br/>'), '{}', ((value,) for value in values))
+    if more and total is None:
+        html += format_html('<br/><span class="text-muted" title="{}">+...</span>', '还有更多')
+    elif more:
+        html += format_html('<br/><span class="text-muted" title="共{}条">+{}</span>', total, total - len(values))
+    return html
+
+
+def compile_virtual_accessor(attr, many, field_info=None, export=False):
+    '''
+    虚拟关联列取值函数 (VirtualRelationListView), obj.attr 为虚拟关联obj, many为True时为obj列表.
+    field_info: 关联表字段 (相对关联表model解析), 为空则显示 str(关联obj)
+    export: 导出用, 返回纯文本
+    '''
+    if field_info:
+        get_value = compile_export_accessor(field_info) if export else compile_accessor(field_info)
+    else:
+        get_value = str
+    if many:
+        return partial(safe_call, partial(get_virtual_values, attr, get_value, export))
+    return partial(safe_call, partial(get_virtual_value, attr, get_value))
+
+
+def get_virtual_value(attr, get_value, obj):
+    rel_obj = getattr(obj, attr, None)
+    if rel_obj is None:
+        return
+    return get_value(rel_obj)
+
+
+def get_virtual_values(attr, get_value, export, obj):
+    values = [get_value(rel_obj) for rel_obj in getattr(obj, attr, None) or ()]
+    if export:
+        return ', '.join(str(value) for value in values if value is not None)
+    return format_html_join(format_html('<br/>'), '{}', ((value, ) for value in values if value is not None))
+
+
+def compile_export_accessor(field_info):
+    '''
+    编译导出(CSV/JSONL)用的列取值函数, 返回原始值/纯文本, 不含html
+    '''
+    field_path, verbose_name, last_field_name, field = field_info
+    if not field_path:
+        return str
+
+    field_names = field_path.split('__')
+    get_value = compile_export_getter(field, last_field_name)
+    if len(field_names) > 1:
+        get_value = partial(get_chain_value, field_names[:-1], get_value)
+
+    return partial(safe_call, get_value)
+
+
+def compile_export_getter(field, source_field_name=None):
+    if isinstance(field, related.ManyToManyField):
+        return partial(get_x2m_text, field.name)
+
+    if isinstance(field, related.RelatedField):
+        if source_field_name == field.attname:
+            return partial(get_attr, field.attname)  # 外键数据库值
+        return partial(get_x2o_text, field.name)
+
+    if isinstance(field, reverse_related.ForeignObjectRel):
+        related_name = field.get_accessor_name()
+        if isinstance(field, reverse_related.OneToOneRel):
+            return partial(get_x2o_text, related_name)
+        return partial(get_x2m_text, related_name)
+
+    flatchoices = getattr(field, 'flatchoices', None)
+    if flatchoices:
+        choices = {k: str(v) for k, v in flatchoices}
+        return partial(get_choice_text, field.name, choices)
+
+    return partial(get_attr, field.name)
+
+
+def get_attr(field_name, obj):
+    return getattr(obj, field_name)
+
+
+def get_choice_text(field_name, choices, obj):
+    value = getattr(obj, field_name)
+    return choices.get(value, value)
+
+
+def get_x2o_text(field_name, obj):
+    value = getattr(obj, field_name, None)
+    return None if value is None else str(value)
+
+
+def get_x2m_text(related_name, obj):
+    rel_obj = getattr(obj, related_name, None)
+    if rel_obj is None:
+        return
+    return ', '.join([str(o) for o in rel_obj.all()])
@@ -28,6 +28,7 @@ else:
 
 LISTVIEW_FILTER_ORM = False  # 开启ORM过滤
 LISTVIEW_OPTIMIZE_SQL = True  # 开启SQL优化
+LISTVIEW_X2M_PREVIEW = None  # x2m列每行预览条数, 其余显示"+N", None不限, 可按列配置字典, 参考SqlListView
 
 LISTVIEW_PAGE_KWARG = 'page'  # url页码名称, &page=3
 LISTVIEW_PAGINATE_BY = 20  # 每页条数
@@ -37,6 +38,50 @@ LISTVIEW_PAGE_SIZE_LIST = [
     20, 30, 50,
 ]  # 页面PageSize选择列表, 供用户动态改变每页显示条数.
 
+LISTVIEW_KEYSET_PAGINATION = False  # 游标分页(keyset), 大表深度翻页不使用OFFSET/COUNT
+LISTVIEW_CURSOR_KWARG = 'cursor'  # 游标分页-url参数名称, &cursor=xxx
+
+LISTVIEW_ROW_MODE = 'objects'  # 列表页行模式: objects 查出model实例; values 只查出各列值(values_list), 不生成model实例
+LISTVIEW_COUNT_STRATEGY = 'exact'  # 分页总条数计算方式: exact 精确COUNT, cache 缓存COUNT结果, estimate 数据库估算
+LISTVIEW_COUNT_CACHE_TIMEOUT = 300  # cache方式, COUNT结果缓存秒数 (数据增删改时自动失效)
+LISTVIEW_COUNT_ESTIMATE_THRESHOLD = 10000  # estimate方式, 估算条数小于该值时仍使用精确COUNT
+
+LISTVIEW_SEARCH_BACKEND = None  # filter_fields搜索后端: None(icontains)/postgres/postgres_trgm/sqlite_fts5, 参考search.py
+SEARCH_PG_CONFIG = 'simple'  # postgres全文检索配置(分词), 中文可安装zhparser等扩展后配置
+SEARCH_SQLITE_TOKENIZE = 'trigram'  # sqlite_fts5分词器, trigram支持中文子串匹配 (SQLite 3.34+)
+SEARCH_INDEX_CHECK_INTERVAL = 60  # sqlite_fts5全文检索表是否存在的检查结果缓存秒数, 其它进程建立/删除索引后按此间隔生效
+
+LISTVIEW_JS_TABLE_SERVER = True  # DataTable.js前端表格使用服务端模式, ajax按页加载数据, 不一次输出整表
+
+LISTVIEW_EXPORT_KWARG = 'export'  # 导出-url参数名称, &export=csv
+LISTVIEW_EXPORT_FORMATS = ['csv', 'jsonl']  # 支持的导出格式, 为空则关闭导出
+LISTVIEW_EXPORT_CHUNK_SIZE = 2000  # 导出时每批从数据库读取条数
+
+DELETE_CHUNK_SIZE = 500  # 批量删除, 每批删除条数 (每批一个事务)
+DELETE_BACKGROUND_THRESHOLD = 5000  # 批量删除条数达到该值时后台线程删除, 前端轮询进度, 0则不使用后台删除 (非共享缓存时同步删除)
+DELETE_TASK_TIMEOUT = 3600  # 后台删除任务进度在缓存中保留秒数
+DELETE_WORKERS = 2  # 后台删除线程池大小 (每个进程), 0则不使用后台删除. 需GENERIC_CACHE_ALIAS为共享缓存
+BULK_UPDATE_CHUNK_SIZE = 500  # 批量修改, 每批修改条数 (所有批次一个事务)
+
+VIRTUAL_CHUNK_SIZE = 500  # 虚拟关联(VirtualRelation), 关联表按关联值 IN (...) 过滤时每批最多值个数
+VIRTUAL_WORKERS = 0  # 虚拟关联分批查询/多个关联表并发查询的线程数, 0/1为不并发 (关联表在其它数据库时适用)
+VIRTUAL_CACHE = None  # 虚拟关联表数据缓存策略默认值, None不缓存, 参考cache.VirtualCache (适用于小的维度表)
+VIRTUAL_CACHE_TIMEOUT = 300  # 虚拟关联表数据缓存秒数
+VIRTUAL_CACHE_MAXSIZE = 10000  # 虚拟关联表进程内LRU缓存最多条数 (每个缓存策略)
+
+GENERIC_CACHE_ALIAS = 'default'  # 通用视图使用的django缓存 (settings.CACHES), 多进程部署应为共享缓存
+GENERIC_CACHE_PREFIX = 'generic'  # 缓存key前缀
+GENERIC_PERMS_CACHE_TIMEOUT = 0  # 用户model权限跨请求缓存秒数, 0则只在请求内缓存. 需GENERIC_CACHE_ALIAS为共享缓存才生效
+GENERIC_PAGE_CACHE = False  # 列表页/详情页内容缓存 (模板 {% pagecache %} 片段), 相关model数据变化时自动失效
+GENERIC_PAGE_CACHE_TIMEOUT = 600  # 页面内容缓存秒数
+GENERIC_CONDITIONAL_GET = False  # 列表页/详情页条件GET, 数据未变化时返回304 (ETag/Last-Modified)
+GENERIC_OBJECT_VERSION_TIMEOUT = 86400  # 单条数据版本号缓存秒数 (详情页ETag), 过期后重新生成, 只是多一次完整响应
+GENERIC_METRICS = False  # 视图性能指标(SQL次数/耗时/各阶段耗时/N+1检测), 参考metrics.py
+GENERIC_METRICS_SERVER_TIMING = True  # 性能指标输出到响应头 Server-Timing
+GENERIC_METRICS_HOOKS = []  # 性能指标回调 hook(view, response, metrics), 函数或导入路径
+GENERIC_METRICS_N_PLUS_ONE = 2  # 列表页同一列取值查询SQL次数达到该值时警告 (N+1查询)
+ASYNC_WORKERS = 8  # 异步视图(asyncviews)并发查询线程池大小, 所有请求共用, 限制同时查询的数据库连接数
+
 
 '''
 MyRouter自动url, 相关参数宏观配置
@@ -54,6 +99,10 @@ ROUTER_ACTIONS = {
     # 'list': False,  # ListView.list_fields 为空时, 只显示一列object_list
 }
 
+ROUTER_ASYNC_VIEWS = False  # MyRouter生成异步视图 (ASGI部署), 参考asyncviews.py
+ROUTER_LAZY_VIEWS = False  # MyRouter延迟生成视图, 首次请求时才生成视图类, model很多时加快启动
+ROUTER_APP_ROUTER = False  # add_router_for_all_models() 每个app只注册一个url项, 按model名分发 (routers.AppRouter)
+
 ROUTER_URL_RULES = {
     # 配置各action页面的URL路径规则, 用于自动生成urls
     # .../app_label/model_name/{action_url_rule}
@@ -62,5 +111,7 @@ ROUTER_URL_RULES = {
     'update': r'(?P<pk>\d+)/update/$',
     'detail': r'(?P<pk>\d+)/$',  # model_name根路径+主键ID, 打开Detail页
     'list': r'$',  # 访问model_name根路径, 打开列表页
+    'export': r'export/$',  # 导出列表数据 (csv/jsonl)
+    'bulk_update': r'bulk_update/$',  # 批量修改列表页勾选的数据
 }
 
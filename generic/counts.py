@@ -0,0 +1,107 @@
+# coding=utf-8
+'''
+列表页分页总条数计算方式 (PageListView.count_strategy)
+
+    exact: 精确计数, 每次请求执行 COUNT(*), 默认
+    cache: 缓存COUNT结果, 按查询SQL(含搜索/过滤参数)缓存, 相关model数据增删改时自动失效
+    estimate: 数据库估算, PostgreSQL 无过滤条件时取 pg_class.reltuples, 有过滤条件时取 EXPLAIN 估算行数,
+              估算值较小或非PostgreSQL数据库时, 使用精确计数.
+
+自定义计数方式: 继承 ExactCount 重写 count(), 配置 count_strategy = 自定义类或其实例.
+'''
+import json
+import logging
+
+from django.db import connections
+
+from . import conf
+from . import cache
+
+logger = logging.getLogger()
+
+
+class ExactCount:
+    '''精确计数'''
+
+    def count(self, view, queryset):
+        # 返回 (总条数, 是否为估算值)
+        return queryset.count(), False
+
+
+class CachedCount(ExactCount):
+    '''
+    缓存计数, 缓存key包含:
+        查询SQL及参数 (搜索/过滤条件不同则key不同),
+        列表页model及 list_fields/filter_fields 关联model的数据版本号 (数据增删改后key变化, 旧缓存失效)
+    '''
+    timeout = conf.LISTVIEW_COUNT_CACHE_TIMEOUT
+
+    def count(self, view, queryset):
+        key = self.get_cache_key(view, queryset)
+        count = cache.get_cache().get(key)
+        if count is None:
+            count, estimated = super().count(view, queryset)
+            cache.get_cache().set(key, count, self.timeout)
+        return count, False
+
+    def get_cache_key(self, view, queryset):
+        sql, params = queryset.query.sql_with_params()
+        models = {queryset.model, *getattr(view.fields_plan, 'related_models', ())}
+        return cache.make_key('count', queryset.db, cache.get_models_version(models), sql, params)
+
+
+class EstimatedCount(ExactCount):
+    '''
+    数据库估算计数 (PostgreSQL), 大表COUNT(*)需全表/全索引扫描, 估算值只读取统计信息.
+    估算值依赖数据库统计信息(ANALYZE)的准确度, 模板显示为"约N条".
+    '''
+    threshold = conf.LISTVIEW_COUNT_ESTIMATE_THRESHOLD  # 估算值小于该值时, 精确计数
+
+    def count(self, view, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            try:
+                estimate = self.estimate(queryset, connection)
+            except Exception as e:
+                logger.warning(f'{queryset.model} 估算条数失败, 使用精确计数: {e}')
+            else:
+                if estimate is not None and estimate >= self.threshold:
+                    return estimate, True
+        return super().count(view, queryset)
+
+    def estimate(self, queryset, connection):
+        with connection.cursor() as cursor:
+            if not queryset.query.where and not queryset.query.distinct:
+                # 无过滤条件, 直接取表统计信息
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(queryset.model._meta.db_table)]
+                )
+                row = cursor.fetchone()
+                if row and row[0] >= 0:  # 未ANALYZE过的表 reltuples 为 -1 (PostgreSQL 14+)
+                    return row[0]
+                return
+
+            # 有过滤条件, 取执行计划估算行数
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+
+
+STRATEGIES = {
+    'exact': ExactCount,
+    'cache': CachedCount,
+    'estimate': EstimatedCount,
+}
+
+
+def get_count_strategy(strategy):
+    # strategy: 名称/类/实例
+    if isinstance(strategy, str):
+        strategy = STRATEGIES[strategy]
+    if isinstance(strategy, type):
+        strategy = strategy()
+    return strategy
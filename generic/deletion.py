@@ -0,0 +1,143 @@
+# coding=utf-8
+'''
+批量删除, 分批执行, 每批一个事务
+
+    queryset.delete() 一次删除大量数据时, django Collector 会把所有obj及级联关联obj全部查出到内存,
+    SQL为一个超长的 IN (...) 列表 (可能超过SQLite/Oracle参数个数限制), 事务长时间锁表.
+    分批删除: 每批 conf.DELETE_CHUNK_SIZE 条, 每批单独事务, 内存/锁/参数个数都有上限.
+
+    快速删除: model无级联删除关联表, 无删除信号接收者时 (Collector.can_fast_delete), 直接 DELETE ... WHERE,
+             不查询obj, 不走Collector.
+    后台删除: 删除条数达到 conf.DELETE_BACKGROUND_THRESHOLD 时, 在后台线程池(conf.DELETE_WORKERS, 进程内共用)执行,
+             进度存于缓存, 按任务id查询. 进度需各进程都能查到, 只有 conf.GENERIC_CACHE_ALIAS 为共享缓存时才后台删除,
+             否则仍在请求中同步删除.
+
+注意: 分批事务, 中途出错(或后台删除时进程重启)时已完成的批次不会回滚, 返回结果中 deleted 为已删除条数.
+     只删除默认管理器(或视图queryset)中的数据, 软删除/多租户等过滤掉的数据, 即使提交了主键也不删除.
+'''
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, router, transaction
+from django.db.models.deletion import Collector
+
+from . import conf
+from . import cache
+
+logger = logging.getLogger()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BulkDeleter:
+    '''
+    分批删除model数据
+    progress: 进度回调函数 progress(deleter), 每批删除后调用, 可读取 total/done/deleted
+    queryset: 可删除的数据范围, 默认为 model._default_manager.all()
+    '''
+    chunk_size = conf.DELETE_CHUNK_SIZE
+
+    def __init__(self, model, pks, using=None, chunk_size=None, progress=None, queryset=None):
+        self.model = model
+        self.queryset = model._default_manager.all() if queryset is None else queryset.all()
+        self.pks = list(dict.fromkeys(pks))  # 去重, 保持顺序
+        self.using = using or router.db_for_write(model)
+        self.chunk_size = chunk_size or self.chunk_size
+        self.progress = progress
+        self.total = len(self.pks)  # 待删除条数 (提交的主键个数)
+        self.done = 0  # 已处理条数
+        self.deleted = 0  # 已删除条数 (本表, 不含级联删除)
+        self.error = ''
+
+    def get_queryset(self, pks):
+        return self.queryset.using(self.using).filter(pk__in=pks)
+
+    def can_fast_delete(self):
+        # 无级联删除/删除信号, 可直接删除
+        return Collector(using=self.using).can_fast_delete(self.get_queryset([]))
+
+    def run(self):
+        fast = self.can_fast_delete()
+        logger.debug(f'{self.model._meta.label} 分批删除 {self.total}条, 每批{self.chunk_size}条, 快速删除: {fast}')
+        try:
+            for i in range(0, self.total, self.chunk_size):
+                pks = self.pks[i:i + self.chunk_size]
+                with transaction.atomic(using=self.using):
+                    self.deleted += self.delete_chunk(pks, fast)
+                self.done += len(pks)
+                if self.progress:
+                    self.progress(self)
+        except Exception as e:
+            logger.exception(f'{self.model._meta.label} 删除出错, 已删除{self.deleted}条')
+            self.error = str(e)
+        return self
+
+    def delete_chunk(self, pks, fast):
+        queryset = self.get_queryset(pks)
+        if fast:
+            return queryset._raw_delete(self.using)
+        # 有级联/信号, 使用django Collector, 每批只查出本批obj及其级联obj
+        deleted, rows = queryset.delete()
+        return rows.get(self.model._meta.label, 0)
+
+    def get_status(self):
+        return {
+            'status': not self.error,
+            'error': self.error,
+            'total': self.total,
+            'done': self.done,
+            'deleted': self.deleted,
+        }
+
+
+def get_task_key(task_id):
+    return f'{conf.GENERIC_CACHE_PREFIX}:delete:{task_id}'
+
+
+def get_task_status(task_id):
+    return cache.get_cache().get(get_task_key(task_id))
+
+
+def set_task_status(task_id, status):
+    cache.get_cache().set(get_task_key(task_id), status, conf.DELETE_TASK_TIMEOUT)
+
+
+def get_executor():
+    # 后台删除线程池, 进程内所有请求共用, 限制同时执行的删除任务数
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=conf.DELETE_WORKERS, thread_name_prefix='generic-delete')
+    return _executor
+
+
+def can_delete_in_background():
+    # 任务进度存于缓存, 前端轮询可能由其它进程处理, 需共享缓存
+    return conf.DELETE_WORKERS > 0 and cache.is_shared_cache()
+
+
+def delete_in_background(deleter, user_pk=None):
+    '''
+    后台线程池删除, 返回任务id, 进度通过 get_task_status(task_id) 查询:
+        {'status': 是否无错误, 'error': 错误, 'total', 'done', 'deleted', 'finished': 是否完成, 'user': 用户pk}
+    '''
+    task_id = uuid.uuid4().hex
+
+    def save_status(deleter, finished=False):
+        set_task_status(task_id, {**deleter.get_status(), 'finished': finished, 'user': user_pk})
+
+    def run():
+        try:
+            deleter.run()
+        finally:
+            save_status(deleter, True)
+            connections.close_all()  # 线程中的数据库连接不会被请求结束时关闭
+
+    deleter.progress = save_status
+    save_status(deleter)
+    get_executor().submit(run)
+    return task_id
@@ -0,0 +1,110 @@
+# coding=utf-8
+'''
+列表页数据导出 (CSV/JSONL), 流式输出
+
+使用列表页相同的 list_fields 字段/标识名, filter_fields 搜索, orm_ 过滤及SQL优化,
+queryset 分批迭代 (iterator), 边查边输出, 内存占用与表数据量无关.
+
+    列表页/?export=csv
+    列表页/?s=xx&orm_status=1&export=jsonl
+    或 MyRouter 生成的导出url: .../model_name/export/?export=jsonl
+'''
+import csv
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse, HttpResponseBadRequest
+
+from . import conf
+from . import columns
+
+logger = logging.getLogger()
+
+
+class Echo:
+    # csv.writer 写入对象, 直接返回写入的行, 用于流式输出
+    def write(self, value):
+        return value
+
+
+class ExportMixin:
+    '''
+    列表页导出, 需和 ListView(SqlListView) 一起使用
+    '''
+    export_kwarg = conf.LISTVIEW_EXPORT_KWARG  # url导出参数名称
+    export_formats = conf.LISTVIEW_EXPORT_FORMATS  # 支持的导出格式
+    export_chunk_size = conf.LISTVIEW_EXPORT_CHUNK_SIZE  # 每批从数据库读取条数
+    export_format = None  # 默认导出格式, 为空则只在url带导出参数时导出
+
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get(self.export_kwarg) or self.export_format
+        if export_format:
+            if export_format not in self.export_formats:
+                return HttpResponseBadRequest(f'不支持的导出格式: {export_format}')
+            return self.export(export_format)
+        return super().get(request, *args, **kwargs)
+
+    def export(self, export_format):
+        self.object_list = self.get_queryset()
+        rows = getattr(self, f'export_{export_format}')(self.iter_export_rows(self.object_list))
+        response = StreamingHttpResponse(rows, content_type=self.content_types.get(export_format))
+        response['Content-Disposition'] = f'attachment; filename="{self.get_export_filename(export_format)}"'
+        return response
+
+    def get_export_filename(self, export_format):
+        return f'{self.model_meta.model_name}.{export_format}'
+
+    def get_export_headers(self):
+        return [str(field_info[1]) for field_info in self.fields_plan.list_fields]
+
+    def iter_export_rows(self, queryset):
+        '''
+        分批迭代queryset, 每批数据手工进行 prefetch_related,
+        (django 4.1以前版本 iterator() 不支持 prefetch_related, 会每条数据查询关联表)
+        '''
+        accessors = self.fields_plan.export_accessors
+        lookups = queryset._prefetch_related_lookups
+        if getattr(self, 'optimize_sql', None):
+            # x2m预览列不在列表queryset中prefetch, 导出需全部数据
+            lookups = (*lookups, *(
+                columns.get_prefetch_lookup(field_path, preview[-1])
+                for field_path, preview in self.fields_plan.x2m_previews.items()
+            ))
+        if lookups:
+            queryset = queryset.prefetch_related(None)
+
+        chunk = []
+        for obj in queryset.iterator(chunk_size=self.export_chunk_size):
+            chunk.append(obj)
+            if len(chunk) >= self.export_chunk_size:
+                yield from self.get_export_rows(chunk, accessors, lookups)
+                chunk = []
+        if chunk:
+            yield from self.get_export_rows(chunk, accessors, lookups)
+
+    def get_export_rows(self, objects, accessors, lookups):
+        if lookups:
+            prefetch_related_objects(objects, *lookups)
+        objects = self.prepare_objects(objects)
+        for obj in objects:
+            yield [accessor(obj) for accessor in accessors]
+
+    def export_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield '\ufeff'  # BOM, 使Excel正确识别utf-8中文
+        yield writer.writerow(self.get_export_headers())
+        for row in rows:
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    def export_jsonl(self, rows):
+        # 使用字段路径作为key, 标识名可能重复
+        headers = [field_info[0] or self.model_meta.model_name for field_info in self.fields_plan.list_fields]
+        for row in rows:
+            yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
@@ -1,19 +1,36 @@
 # coding=utf-8
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 # import traceback
-from django.db import models
+from django.apps import apps
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
 
 from django.views import generic
 # from django.db.models.constants import LOOKUP_SEP
 
 from django.db.models.fields import reverse_related
 from django.db.models.fields import related
-from django.urls import reverse_lazy
+from django.db.models.signals import class_prepared
+from django.http import Http404, JsonResponse
+from django.urls import reverse, reverse_lazy, NoReverseMatch
+from django.utils.html import conditional_escape, format_html
+from django.utils.functional import cached_property
 
 from . import conf
+from . import columns
+from . import paginator
+from . import counts
+from . import search
+from . import perms
+from .cache import get_virtual_cache
 
 logger = logging.getLogger()
 
+_fields_plans = {}  # 各视图类的字段方案缓存 {(view_class, fields_key): FieldsPlan}
+_local = threading.local()  # 虚拟关联并发查询, 标记当前线程为工作线程
+
 
 def get_field_from_meta(_meta, field_name):
     '''
@@ -36,6 +53,207 @@ def get_field_from_meta(_meta, field_name):
         # # raise
 
 
+def get_fields_key(fields):
+    # 字段配置转为可hash的key (list/tuple/dict 逐层转换, dict含各配置值), 用于字段方案缓存
+    if isinstance(fields, dict):
+        return tuple((k, get_fields_key(v)) for k, v in fields.items())
+    if isinstance(fields, (list, tuple, set, frozenset)):
+        return tuple(get_fields_key(f) for f in fields)
+    try:
+        hash(fields)
+    except TypeError:
+        return repr(fields)
+    return fields
+
+
+def clear_fields_plans(view_class=None):
+    # 清除字段方案缓存, view_class为空则清除所有视图类的缓存
+    for key in list(_fields_plans):
+        if view_class is None or issubclass(key[0], view_class):
+            _fields_plans.pop(key, None)
+
+
+def clear_model_fields_plans(sender, **kwargs):
+    '''
+    模型重新加载(class_prepared信号)时, 清除使用了旧model的字段方案, 防止缓存中的field对象为旧model的字段.
+    字段方案key含model, 新model生成新的方案, 只需清除旧model的方案; 其它model的方案不受影响.
+    '''
+    label = sender._meta.label
+    for key, plan in list(_fields_plans.items()):
+        if any(m is not sender and m._meta.label == label for m in (plan.model, *plan.related_models) if m):
+            _fields_plans.pop(key, None)
+
+
+def get_fields_plan(key, build_plan):
+    # 字段方案, key为 (视图类, 字段配置key), 缓存中没有则调用 build_plan() 生成
+    plan = _fields_plans.get(key)
+    if plan is None:
+        plan = _fields_plans[key] = build_plan()
+    return plan
+
+
+class_prepared.connect(clear_model_fields_plans, dispatch_uid='generic.listview.clear_fields_plans')
+
+
+def get_related_models(model, field_path):
+    # 字段路径 xx__xx 经过的各关联表model
+    models = []
+    _meta = model._meta
+    for field_name in field_path.split('__'):
+        field = get_field_from_meta(_meta, field_name)
+        if not field or not field.is_relation or not field.related_model:
+            break
+        models.append(field.related_model)
+        _meta = field.related_model._meta
+    return models
+
+
+def init_fields(model, fields, multi_valued=False):
+    '''
+    解析字段配置 (list_fields/filter_fields/detail_fields 等), 转field对象, 去除错误配置的字段
+    返回: [(field_path, verbose_name, last_field_name, field), ...]
+    multi_valued: 是否允许多值关联字段后续关联 (x2m__xx), 搜索过滤字段使用EXISTS子查询, 可以允许
+    '''
+    _fields = []
+    for _field in fields:
+        if isinstance(_field, str):
+            field_path, verbose_name = _field, None
+        else:
+            field_path, verbose_name = _field
+
+        field_names = field_path.split('__')
+        _field_names = []
+        _meta = model._meta
+        for index, field_name in enumerate(field_names):
+            if field_name == 'pk':
+                field_name = _meta.pk.name
+
+            field = get_field_from_meta(_meta, field_name)
+            if not field:
+                break
+
+            _field_names.append(field_name)
+            if index + 1 < len(field_names):
+                if isinstance(field, (related.ForeignKey, reverse_related.OneToOneRel)):
+                    # 其它对应一条数据的关联表字段 (外键/正反o2o), 循环取字段
+                    _meta = field.related_model._meta
+                elif isinstance(field, (
+                    reverse_related.ManyToOneRel,
+                    reverse_related.ManyToManyRel,
+                    related.ManyToManyField
+                )):  # 反向外键/正反m2m 对应多条数据, 循环应当结束, 否则认为错误的字段配置
+                    if multi_valued:
+                        _meta = field.related_model._meta
+                        continue
+                    logger.warning(f'反向外键/正反m2m 对应多条数据, 因SQL优化处理复杂, 不支持进行后续__{field_names[index + 1]}关联')
+                    field = None
+                    break
+
+        if field:
+            if not verbose_name:
+                if hasattr(field, 'verbose_name'):
+                    verbose_name = field.verbose_name
+                else:
+                    # 反向关系字段 ForeignObjectRel, 使用对方model标识名称
+                    verbose_name = field.related_model._meta.verbose_name
+            _field_path = '__'.join(_field_names)
+            _fields.append((_field_path, verbose_name, field_name, field))
+
+    return _fields
+
+
+def get_optimize_fields(list_fields):
+    '''
+    根据已解析的字段, 计算SQL优化所需的 select_related / prefetch_related / only 字段
+    返回: (sr_fields, pr_fields, onlys)
+    '''
+    onlys = []  # 限定查询字段
+    sr_fields = []  # x2o关联, select_related. 多表左联/内联
+    pr_fields = []  # x2m关联, prefetch_related. 关联表独立进行一次性查出
+    for field_info in list_fields:
+        field_path, verbose_name, last_field_name, field = field_info
+        if field_path:
+            if isinstance(field, (
+                reverse_related.ManyToOneRel,
+                reverse_related.ManyToManyRel,
+                related.ManyToManyField
+            )):  # 反向外键/正反m2m 对应多条数据, prefetch_related优化, 并排除加入限定字段only()
+                pr_fields.append(field_path)
+                if '__' in field_path:
+                    # x2o__x2m, 当前表需一并查出x2o关联obj, x2m关联数据属于该obj
+                    lookup_field = field_path.rsplit('__', 1)[0]
+                    sr_fields.append(lookup_field)
+                    onlys.append(lookup_field)
+            else:
+                onlys.append(field_path)
+                if isinstance(field, related.ForeignKey) and last_field_name != field.attname:
+                    # 外键/o2o字段, 未进一步配置__外表字段, 显示obj.__str__(),
+                    # 这种情形无法限定关联表查询字段, SQL将查询关联表所有字段或每条where查询.
+                    logger.warning(
+                        f'\r\n关联字段"{field_path}"未指明链到关联表Model哪个字段,'
+                        f'\r\n如果是取本表字段数据库值({field.attname}), 应当加上_id: "{field_path}_id"'
+                        f'\r\n否则取关联obj.__str__(), 无法确定str()使用哪些字段, 关联表SQL查询不进行优化.'
+                        f'\r\n只有list_fields配置字段改为: {field_path}__xx外表字段, 才可确定所需查询字段.'
+                    )
+                    sr_fields.append(field_path)
+                elif '__' in field_path:
+                    # 关联字段, 去掉最后一级的外部表字段, 得到"当前表"model中的关联字段
+                    field_names = field_path.split('__')
+                    lookup_field = '__'.join(field_names[:-1])  # 去掉末尾的__外部关联表字段
+                    sr_fields.append(lookup_field)
+
+    sr_fields = [*set(sr_fields)]  # 去重
+    pr_fields = [*set(pr_fields)]  # 去重
+    return sr_fields, pr_fields, onlys
+
+
+def add_only_fields(queryset, field_names=[]):
+    '''
+    进行限定字段, 执行queryset.only(*field_names),
+    如果多次执行only(), 按django设计的方案只有最后一次的only()有效,
+    所以这里改成only追加字段的方式, 相当于在前一次only()限定字段基础上, 追加新字段.
+    使用户ListView若有自定义的only(), 不会被删.
+    '''
+    if field_names:
+        existing, defer = queryset.query.deferred_loading
+        field_names = set(field_names)
+        if 'pk' in field_names:
+            field_names.remove('pk')
+            field_names.add(queryset.model._meta.pk.name)
+
+        if defer:
+            # 用户queryset没进行only()自定义限定字段, defer()差集
+            # return queryset.only(*field_names)
+            field_names = field_names.difference(existing)
+        else:
+            # 在前一次限定字段基础上, 追加新限定字段, only()并集
+            logger.debug(f'保留用户queryset已有的only限定字段: {existing}')
+            field_names = existing.union(field_names)
+        queryset.query.deferred_loading = field_names, False
+
+
+class FieldsPlan:
+    '''
+    列表页字段方案, 由 list_fields/filter_fields 配置解析而来.
+    每个视图类(及字段配置)只解析一次并缓存, 后续请求直接使用, 不再每次遍历 _meta 字段.
+    '''
+
+    def __init__(self):
+        self.model = None  # 字段所属model
+        self.list_fields = []  # 列表页字段 [(field_path, verbose_name, last_field_name, field), ...]
+        self.filter_fields = []  # 搜索字段路径
+        self.filter_labels = []  # 搜索框提示名称
+        self.select_related = []  # x2o关联
+        self.prefetch_related = []  # x2m关联
+        self.onlys = []  # 限定查询字段
+        self.accessors = []  # 列表页各列取值函数, 和list_fields一一对应
+        self.export_accessors = []  # 导出数据各列取值函数
+        self.related_models = set()  # list_fields/filter_fields 字段路径关联的model, 用于缓存失效判断
+        self.x2m_previews = {}  # x2m预览列 {field_path: (条数, 显示字段, field)}
+        self.values_fields = None  # values行模式查询字段, 为None表示list_fields不支持values行模式
+        self.value_columns = []  # values行模式各列 [(值序号, x2o关联obj主键序号, 格式化函数), ...]
+
+
 class ListView(generic.ListView):
     '''
     列表页视图
@@ -57,22 +275,7 @@ class ListView(generic.ListView):
 
     def get_context_data(self, *args, **kwargs):
         # 根据用户权限，对应显示增删改查的链接/按钮
-        action_perm = {
-            # action: 对应的action权限码
-            'create': 'add',
-            'delete': 'delete',
-            'update': 'change',
-            'detail': 'view',
-            # 'list': 'view',
-        }
-        app_label = self.model_meta.app_label
-        model_name = self.model_meta.model_name
-
-        model_perms = {
-            # action: 操作权限
-            action: self.request.user.has_perm(f'{app_label}.{perm}_{model_name}')
-            for action, perm in action_perm.items()
-        }
+        model_perms = self.get_model_perms()
 
         # list_view_name = self.request.resolver_match.view_name  # app_name可能和meta.app_label不同
         # view_name = list_view_name[:-5]
@@ -88,69 +291,126 @@ class ListView(generic.ListView):
         # import ipdb; ipdb.set_trace()  # breakpoint f7da10f4 //
 
         context_data = super().get_context_data(model_perms=model_perms, *args, **kwargs)
+        context_data['object_rows'] = self.get_object_rows(context_data['object_list'])
         return context_data
 
-    def get_queryset(self):
-        model = self.model or self.queryset.model
-        self.list_fields = self.init_fields(self.list_fields) or [
-            ('', model._meta.verbose_name, '', None)
-        ]  # 列表页字段为空时, 只一列显示obj列表, 提供标识名.
-        return super().get_queryset()
+    def get_model_perms(self):
+        # 当前用户对model的增删改查权限 {action: True/False}, 一次性计算并缓存, 参考perms.py
+        action_perm = {
+            # action: 对应的action权限码
+            'create': 'add',
+            'delete': 'delete',
+            'update': 'change',
+            'detail': 'view',
+            'bulk_update': 'change',
+            # 'list': 'view',
+        }
+        model_perms = perms.get_model_perms(self.request.user, self.model or self.queryset.model)
 
-    def init_fields(self, fields):
-        # 处理 list_fields, 转field对象用以模板页显示标识名verbose_name, 去除错误配置的字段
-        model = self.model or self.queryset.model
-        _fields = []
-        for _field in fields:
-            if isinstance(_field, str):
-                field_path, verbose_name = _field, None
-            else:
-                field_path, verbose_name = _field
+        return {
+            # action: 操作权限
+            action: model_perms[perm]
+            for action, perm in action_perm.items()
+        }
+
+    def get_model_view_name(self):
+        # 各action的url名称前缀, 当前 app_name 可能和 meta.app_label 不同, 优先从当前url名称取
+        resolver_match = self.request.resolver_match
+        view_name = resolver_match.view_name[:-5] if resolver_match and resolver_match.view_name else ''
+        return view_name or f'{self.model_meta.app_label}:{self.model_meta.model_name}'
+
+    @cached_property
+    def batch_urls(self):
+        # 批量删除/批量修改url {action: url}, 无权限或url未配置则为None, 列表页模板/DataTables服务端数据共用
+        model_view = self.get_model_view_name()
+        model_perms = self.get_model_perms()
+        return {
+            action: model_perms[action] and self.reverse_url(f'{model_view}_{action}')
+            for action in ('delete', 'bulk_update')
+        }
 
-            field_names = field_path.split('__')
-            _field_names = []
-            _meta = model._meta
-            for index, field_name in enumerate(field_names):
-                if field_name == 'pk':
-                    field_name = _meta.pk.name
+    @property
+    def list_checkbox(self):
+        # 列表首列是否为勾选框 (批量删除/批量修改), 模板各block中使用 view.list_checkbox (页面缓存命中时也有效)
+        return any(self.batch_urls.values())
+
+    def reverse_url(self, view_name, *args):
+        if view_name:
+            try:
+                return reverse(view_name, args=args)
+            except NoReverseMatch:
+                '未配置action路径，忽略'
+
+    def get_object_rows(self, object_list):
+        # 当前页各行数据, 各列显示值及各行链接一次性生成
+        return columns.render_rows(self.prepare_objects(object_list), self.get_row_accessors(), self.row_urls)
+
+    def prepare_objects(self, objects):
+        # 当前页(或导出的一批)数据查出后, 生成各行数据前的处理, 比如虚拟关联, 返回obj列表
+        return objects
+
+    def get_row_accessors(self):
+        # 各列取值函数, 与 fields_plan.list_fields 一一对应
+        return self.fields_plan.accessors
+
+    def run_concurrent(self, *funcs):
+        # 执行多个互不依赖的查询函数(无参数), 返回各结果列表. 同步视图依次执行, 异步视图并发 (asyncviews)
+        return [func() for func in funcs]
+
+    @cached_property
+    def row_urls(self):
+        # 各行详情/编辑链接 {action: RowUrl}, 每个请求只reverse一次, 无权限的action不生成
+        model_view = self.get_model_view_name()
+        model_perms = self.get_model_perms()
+        return {
+            action: columns.RowUrl(f'{model_view}_{action}', self.model or self.queryset.model)
+            for action in ('detail', 'update') if model_perms[action]
+        }
 
-                field = get_field_from_meta(_meta, field_name)
-                if not field:
-                    break
+    @cached_property
+    def fields_plan(self):
+        # 当前请求使用的字段方案 (按视图类缓存), 模板中使用 view.fields_plan.list_fields
+        return self.get_fields_plan()
 
-                _field_names.append(field_name)
-                if index + 1 < len(field_names):
-                    if isinstance(field, (related.ForeignKey, reverse_related.OneToOneRel)):
-                        # 其它对应一条数据的关联表字段 (外键/正反o2o), 循环取字段
-                        _meta = field.related_model._meta
-                    elif isinstance(field, (
-                        reverse_related.ManyToOneRel,
-                        reverse_related.ManyToManyRel,
-                        related.ManyToManyField
-                    )):  # 反向外键/正反m2m 对应多条数据, 循环应当结束, 否则认为错误的字段配置
-                        logger.warning(f'反向外键/正反m2m 对应多条数据, 因SQL优化处理复杂, 不支持进行后续__{field_names[index + 1]}关联')
-                        field = None
-                        break
-
-            if field:
-                if not verbose_name:
-                    if hasattr(field, 'verbose_name'):
-                        verbose_name = field.verbose_name
-                    else:
-                        # 反向关系字段 ForeignObjectRel, 使用对方model标识名称
-                        verbose_name = field.related_model._meta.verbose_name
-                _field_path = '__'.join(_field_names)
-                _fields.append((_field_path, verbose_name, field_name, field))
-
-        return _fields
+    def get_fields_plan(self):
+        return get_fields_plan((type(self), self.get_fields_plan_key()), self.build_fields_plan)
+
+    def get_fields_plan_key(self):
+        # 影响字段方案的配置, 子类扩展配置项时需一并加入. 按实例属性计算, as_view(**initkwargs) 修改配置时同样有效
+        return self.model or self.queryset.model, get_fields_key(self.list_fields)
+
+    def build_fields_plan(self):
+        # 解析字段配置, 生成字段方案, 子类可扩展
+        model = self.model or self.queryset.model
+        plan = FieldsPlan()
+        plan.model = model
+        plan.list_fields = self.init_fields(self.list_fields) or [
+            ('', model._meta.verbose_name, '', None)
+        ]  # 列表页字段为空时, 只一列显示obj列表, 提供标识名.
+        plan.accessors = [columns.compile_accessor(field_info) for field_info in plan.list_fields]
+        plan.export_accessors = [columns.compile_export_accessor(field_info) for field_info in plan.list_fields]
+        for field_info in plan.list_fields:
+            plan.related_models.update(get_related_models(model, field_info[0]))
+        return plan
+
+    @classmethod
+    def clear_fields_plan(cls):
+        # 清除当前视图类(含子类)的字段方案缓存
+        clear_fields_plans(cls)
+
+    def init_fields(self, fields, multi_valued=False):
+        # 处理 list_fields, 转field对象用以模板页显示标识名verbose_name, 去除错误配置的字段
+        return init_fields(self.model or self.queryset.model, fields, multi_valued)
 
 
 class QueryListView(ListView):
     '''
-    搜索过滤, filter_fields 配置格式同 list_fields
+    搜索过滤, filter_fields 配置格式同 list_fields,
+    filter_fields 可使用多值关联字段 (反向外键/多对多, 比如 tags__name), 查询为EXISTS子查询, 搜索结果无重复数据
     '''
     filter_fields = []  # 使用模糊搜索多字段功能
     filter_orm = conf.LISTVIEW_FILTER_ORM  # 是否开启ORM过滤功能
+    search_backend = conf.LISTVIEW_SEARCH_BACKEND  # 搜索后端, 参考search.py
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -158,27 +418,42 @@ class QueryListView(ListView):
             qs = self.get_queryset_orm(qs, True)
         return self.get_queryset_search(qs)
 
+    def get_fields_plan_key(self):
+        return super().get_fields_plan_key(), get_fields_key(self.filter_fields)
+
+    def build_fields_plan(self):
+        plan = super().build_fields_plan()
+        field_infos = self.init_fields(self.filter_fields, multi_valued=True)
+        plan.filter_fields = [f[0] for f in field_infos]
+        plan.filter_labels = [f[1] for f in field_infos]  # 搜索框提示名称
+        model = self.model or self.queryset.model
+        for field_path in plan.filter_fields:
+            plan.related_models.update(get_related_models(model, field_path))
+        return plan
+
+    @property
+    def filter_labels(self):
+        return self.fields_plan.filter_labels
+
     def get_queryset_search(self, queryset=None):
         '''
         模糊查询多字段, 各字段逻辑或
         外键使用<field>__关联表<field>,
         django不支持 <field>_id 模糊查询, 使用 <field>__id 代替
         '''
-        field_infos = self.init_fields(self.filter_fields)
-        self.filter_fields = [f[0] for f in field_infos]
-        self.filter_labels = [f[1] for f in field_infos]  # 搜索框提示名称
+        filter_fields = self.fields_plan.filter_fields
 
         if queryset is None:
             queryset = super().get_queryset()
         s = self.request.GET.get('s')
-        if s and self.filter_fields:
-            Q_kwargs = {f'{field}__icontains': s.strip() for field in self.filter_fields}
-            # print(Q_kwargs, 77777777)
-            q = models.Q(**Q_kwargs)
-            q.connector = 'OR'  # 写法兼容django 1.x
-            queryset = queryset.filter(q)
+        if s and filter_fields:
+            queryset = self.search_queryset(queryset, filter_fields, s.strip())
         return queryset
 
+    def search_queryset(self, queryset, fields, s):
+        # 多字段搜索s, 各字段逻辑或, 默认icontains模糊查询, 可配置全文检索等搜索后端
+        return search.get_search_backend(self.search_backend).search(self, queryset, fields, s)
+
     def get_queryset_orm(self, queryset=None, ignore_error=False):
         '''
         使ListView支持GET参数ORM查询过滤，
@@ -197,6 +472,7 @@ class QueryListView(ListView):
         http://xxx列表页/?orm_city__name=深圳&orm_field__icontains=xx
         相当于queryset.filter(city__name='深圳', field__icontains='xx')
         多个参数一律视为"和"，不支持“或”操作，因为URL的&只是间隔符，不含逻辑与或信息
+        多值关联字段(反向外键/多对多)参数, 使用EXISTS子查询, 不JOIN关联表, 无重复数据
         '''
         if queryset is None:
             queryset = super().get_queryset()
@@ -204,7 +480,7 @@ class QueryListView(ListView):
             if k.startswith('orm_'):
                 # print('ORM_参数', k, v)
                 try:
-                    queryset = queryset.filter(**{k[4:]: v})
+                    queryset = queryset.filter(search.get_lookup_q(queryset.model, k[4:], v))
                 except Exception:
                     if ignore_error:
                         # 忽略错误的orm表达式参数
@@ -219,6 +495,7 @@ class PageListView(QueryListView):
     分页ListView, 支持url请求参数:
         page: 页码
         pagesize: 每页条数 (最大限制100条)
+        cursor: 游标, 开启游标分页(keyset_pagination)时使用, 代替页码
     '''
 
     paginate_by = conf.LISTVIEW_PAGINATE_BY  # 每页条数
@@ -229,6 +506,13 @@ class PageListView(QueryListView):
     page_size_list = conf.LISTVIEW_PAGE_SIZE_LIST  # 前端PageSize选择列表
     js_table_data = None  # 开启DataTable.js前端表格分页
 
+    keyset_pagination = conf.LISTVIEW_KEYSET_PAGINATION  # 游标分页, 按排序字段值定位翻页, 无OFFSET/COUNT查询
+    keyset_ordering = None  # 游标分页排序字段, 比如 ['-created', 'pk'], 为空则使用queryset排序或pk
+    cursor_kwarg = conf.LISTVIEW_CURSOR_KWARG  # url游标参数名称
+
+    paginator_class = paginator.CountPaginator
+    count_strategy = conf.LISTVIEW_COUNT_STRATEGY  # 总条数计算方式: exact/cache/estimate, 参考counts.py
+
     def get_context_data(self, *args, **kwargs):
 
         pagesize = self.request.GET.get(self.page_size_kwarg)  # 每页显示条数
@@ -241,7 +525,8 @@ class PageListView(QueryListView):
         if context_data.get('is_paginated'):
             # 生成url参数，用于各分页链接，不包含page=xx参数本身
             context_data['url_args'] = [
-                f'{arg}={val}' for arg, val in self.request.GET.items() if arg != self.page_kwarg
+                f'{arg}={val}' for arg, val in self.request.GET.items()
+                if arg not in (self.page_kwarg, self.cursor_kwarg)
             ]
             context_data['page_range'] = self.get_page_range(context_data['page_obj'])
 
@@ -250,8 +535,40 @@ class PageListView(QueryListView):
             self.js_table_data = not self.filter_fields
         return context_data
 
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_pagination:
+            return super().paginate_queryset(queryset, page_size)
+
+        # 游标分页
+        keyset_paginator = paginator.KeysetPaginator(queryset, page_size, self.get_keyset_ordering(queryset))
+        try:
+            page = keyset_paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except paginator.InvalidCursor:
+            raise Http404('无效的游标参数')
+        return keyset_paginator, page, page.object_list, page.has_other_pages()
+
+    def get_paginator(self, *args, **kwargs):
+        page_paginator = super().get_paginator(*args, **kwargs)
+        page_paginator.count_func = self.get_queryset_count
+        return page_paginator
+
+    def get_queryset_count(self, queryset):
+        # 分页总条数, 返回 (总条数, 是否为估算值). object_list不是QuerySet(比如list)时同django Paginator使用len()
+        if not isinstance(queryset, models.query.QuerySet):
+            return len(queryset), False
+        return counts.get_count_strategy(self.count_strategy).count(self, queryset)
+
+    def get_keyset_ordering(self, queryset):
+        # 游标分页排序字段, 未配置时使用queryset的排序字段 (表达式排序不支持, 忽略)
+        if self.keyset_ordering:
+            return self.keyset_ordering
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return [f for f in ordering if isinstance(f, str) and f != '?']
+
     def get_page_range(self, page_obj):
         # 大表分页时，优化页码显示
+        if getattr(page_obj, 'is_keyset', False):
+            return []  # 游标分页无页码
         page_range = page_obj.paginator.page_range
         num_pages = page_obj.paginator.num_pages
         if num_pages > 10:
@@ -267,8 +584,27 @@ class PageListView(QueryListView):
 class SqlListView(PageListView):
     '''
     SQL优化
+
+    x2m_preview, x2m列(反向外键/正反m2m)预览, 每行只显示前N条关联数据, 其余显示为"+N":
+        None: 不限条数, 显示全部
+        整数: 所有x2m列预览条数
+        字典: {字段路径: 条数 或 (条数, 关联表显示字段)}, 指定显示字段时只查询该字段, 否则显示 str(obj)
+    预览列不在列表queryset中prefetch, 而是当前页数据查出后(get_object_rows)再prefetch:
+    数据库支持窗口函数时, 只查出每个obj的前N条 (ROW_NUMBER() OVER (PARTITION BY 关联外键)), 总条数另外分组统计;
+    否则仍查出全部关联数据, 只限制显示条数.
+
+    row_mode, 行模式:
+        objects: 当前页查出model实例 (及select_related关联obj), 各列从obj取值
+        values: 当前页使用 values_list() 只查出各列数据库字段值, 不生成model实例, 各列按列格式化, 显示同objects.
+                list_fields 都是本表或x2o关联表的数据库字段(外键需为 xx_id 或 xx__外表字段)时才有效, 否则仍为objects.
+                各行 row.object 为命名元组 (pk及各字段路径), 自定义模板扩展列/prepare_objects() 不能使用obj其它属性.
     '''
     optimize_sql = conf.LISTVIEW_OPTIMIZE_SQL  # SQL优化, 根据list_fields配置字段进行处理, 优化SQL性能
+    x2m_preview = conf.LISTVIEW_X2M_PREVIEW  # x2m列预览条数
+    row_mode = conf.LISTVIEW_ROW_MODE  # 行模式: objects/values
+
+    def get_fields_plan_key(self):
+        return super().get_fields_plan_key(), get_fields_key(self.x2m_preview), self.row_mode
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -276,6 +612,145 @@ class SqlListView(PageListView):
             qs = self.optimize_queryset(qs)
         return qs
 
+    def build_fields_plan(self):
+        plan = super().build_fields_plan()
+        plan.select_related, plan.prefetch_related, plan.onlys = get_optimize_fields(plan.list_fields)
+        for index, field_info in enumerate(plan.list_fields):
+            preview = self.get_x2m_preview(field_info)
+            if preview:
+                plan.x2m_previews[field_info[0]] = (*preview, field_info[3])
+                plan.accessors[index] = columns.compile_preview_accessor(field_info, *preview)
+        plan.values_fields, plan.value_columns = self.get_value_columns(plan.list_fields)
+        return plan
+
+    def get_value_columns(self, list_fields):
+        '''
+        values行模式的查询字段及各列, 所有列都是本表或x2o关联表的数据库字段时才支持, 否则返回 (None, [])
+        x2o关联字段另外查出最后一层关联obj的主键, 用于区分关联obj不存在(显示None)和字段值为空.
+        '''
+        values_fields = {'pk': 0}  # {字段路径: 序号}
+        value_columns = []
+        for field_info in list_fields:
+            field_path, verbose_name, last_field_name, field = field_info
+            if not field_path or not getattr(field, 'concrete', False) or field.many_to_many or (
+                field.is_relation and last_field_name != field.attname
+            ):
+                return None, []  # 显示关联obj/x2m等, 需model实例
+            index = values_fields.setdefault(field_path, len(values_fields))
+            null_index = None
+            if '__' in field_path:
+                null_index = values_fields.setdefault(f'{field_path.rsplit("__", 1)[0]}__pk', len(values_fields))
+            value_columns.append((index, null_index, columns.compile_value_formatter(field_info)))
+        return list(values_fields), value_columns
+
+    def use_value_rows(self):
+        plan = self.fields_plan
+        return self.row_mode == 'values' and plan.values_fields is not None and not (
+            plan.x2m_previews or getattr(plan, 'virtual_relations', None)
+        )
+
+    def get_page_objects(self, queryset):
+        # 查出当前页数据, values行模式时为各列值 (命名元组), 不生成model实例
+        if isinstance(queryset, models.query.QuerySet) and self.use_value_rows():
+            queryset = queryset.prefetch_related(None).values_list(*self.fields_plan.values_fields, named=True)
+        return list(queryset)
+
+    def get_x2m_preview(self, field_info):
+        # x2m列预览配置, 返回 (条数, 显示字段) 或 None
+        field_path, verbose_name, last_field_name, field = field_info
+        if not self.x2m_preview or not field_path or not isinstance(field, (
+            reverse_related.ManyToOneRel,
+            reverse_related.ManyToManyRel,
+            related.ManyToManyField
+        )) or isinstance(field, reverse_related.OneToOneRel):
+            return
+        preview = self.x2m_preview.get(field_path) if isinstance(self.x2m_preview, dict) else self.x2m_preview
+        if not preview:
+            return
+        return tuple(preview) if isinstance(preview, (tuple, list)) else (preview, None)
+
+    def get_object_rows(self, object_list):
+        if self.use_value_rows():
+            object_list = self.get_page_objects(object_list)
+            if not object_list or not isinstance(object_list[0], models.Model):
+                # 游标分页等已查出model实例的, 仍按objects方式
+                return columns.render_value_rows(object_list, self.fields_plan.value_columns, self.row_urls)
+        previews = self.fields_plan.x2m_previews
+        if previews and self.optimize_sql:
+            object_list = list(object_list)
+            for field_path in previews:
+                self.prefetch_x2m_preview(object_list, field_path)
+        return super().get_object_rows(object_list)
+
+    def prefetch_x2m_preview(self, objects, field_path):
+        # 当前页数据的x2m预览列prefetch, 只查询显示字段, 数据库支持窗口函数时只查出每个obj的前N条
+        limit, display_field, field = self.fields_plan.x2m_previews[field_path]
+        field_names = field_path.split('__')
+        for field_name in field_names[:-1]:
+            # x2o__x2m, 关联数据属于x2o关联obj
+            objects = [obj for obj in (getattr(o, field_name, None) for o in objects) if obj is not None]
+        if not objects:
+            return
+
+        using = objects[0]._state.db
+        queryset = field.related_model._default_manager.using(using).all()
+        if display_field:
+            onlys = ['pk', display_field]
+            if isinstance(field, reverse_related.ManyToOneRel):
+                onlys.append(field.field.name)  # 反向外键prefetch按外键分组
+            queryset = queryset.only(*onlys)
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        if getattr(connections[using].features, 'supports_over_clause', False):
+            queryset = queryset.filter(pk__in=self.get_x2m_preview_sql(objects, field, limit, queryset))
+            self.count_x2m(objects, field_path, field)
+        models.prefetch_related_objects(objects, models.Prefetch(columns.get_related_name(field), queryset=queryset))
+
+    def get_x2m_preview_sql(self, objects, field, limit, queryset):
+        '''
+        各obj前N条关联数据的主键子查询:
+            SELECT 主键 FROM (SELECT 主键, ROW_NUMBER() OVER (PARTITION BY 关联外键 ORDER BY 排序) AS rn
+                              FROM 关联表/中间表 WHERE 关联外键 IN (当前页obj)) WHERE rn <= N
+        '''
+        from django.db.models.expressions import Window
+        from django.db.models.functions import RowNumber
+
+        sub_model, source, target_name = search.get_multi_valued_source(field)
+        attname = source.target_field.attname
+        prefix = f'{target_name}__' if target_name else ''  # 多对多, 按中间表关联的目标表排序
+        order_by = [
+            models.F(prefix + o[1:]).desc() if o.startswith('-') else models.F(prefix + o).asc()
+            for o in queryset.query.order_by or queryset.model._meta.ordering if isinstance(o, str) and o != '?'
+        ]
+        value = sub_model._meta.get_field(target_name).attname if target_name else 'pk'
+        inner = sub_model._base_manager.using(queryset.db).filter(
+            **{f'{source.attname}__in': {getattr(obj, attname) for obj in objects}}
+        ).annotate(
+            generic_value=models.F(value),
+            generic_rn=Window(RowNumber(), partition_by=[models.F(source.attname)], order_by=order_by),
+        ).order_by().values_list('generic_value', 'generic_rn')
+        sql, params = inner.query.sql_with_params()
+        qn = connections[queryset.db].ops.quote_name
+        return RawSQL(
+            f'SELECT {qn("generic_value")} FROM ({sql}) {qn("generic_preview")} WHERE {qn("generic_rn")} <= %s',
+            (*params, limit)
+        )
+
+    def count_x2m(self, objects, field_path, field):
+        '''
+        统计各obj的x2m关联数据总条数, 一次分组查询 (GROUP BY 关联外键), 存于obj属性, 用于显示"+N"
+        '''
+        sub_model, source, target_name = search.get_multi_valued_source(field)
+        attname = source.target_field.attname
+        counts = dict(
+            sub_model._base_manager.using(objects[0]._state.db)
+            .filter(**{f'{source.attname}__in': {getattr(obj, attname) for obj in objects}})
+            .order_by().values_list(source.attname).annotate(models.Count('pk'))
+        )
+        count_attr = columns.get_count_attr(field_path)
+        for obj in objects:
+            setattr(obj, count_attr, counts.get(getattr(obj, attname), 0))
+
     def optimize_queryset(self, queryset=None):
         '''
         SQL查询优化, select_related() + prefetch_related() + only()
@@ -295,70 +770,177 @@ class SqlListView(PageListView):
         # queryset = queryset or super().get_queryset()  # or需库查询qs才能判断真假, 且qs.none()为假
         if queryset is None:
             queryset = super().get_queryset()
-        onlys = []  # 限定查询字段
-        sr_fields = []  # x2o关联, select_related. 多表左联/内联
-        pr_fields = []  # x2m关联, prefetch_related. 关联表独立进行一次性查出
-        # logger.debug(self.list_fields)
-        for field_info in self.list_fields:
-            field_path, verbose_name, last_field_name, field = field_info
-            if field_path:
-                if isinstance(field, (
-                    reverse_related.ManyToOneRel,
-                    reverse_related.ManyToManyRel,
-                    related.ManyToManyField
-                )):  # 反向外键/正反m2m 对应多条数据, prefetch_related优化, 并排除加入限定字段only()
-                    pr_fields.append(field_path)
-                else:
-                    onlys.append(field_path)
-                    if isinstance(field, related.ForeignKey) and last_field_name != field.attname:
-                        # 外键/o2o字段, 未进一步配置__外表字段, 显示obj.__str__(),
-                        # 这种情形无法限定关联表查询字段, SQL将查询关联表所有字段或每条where查询.
-                        logger.warning(
-                            f'\r\n关联字段"{field_path}"未指明链到关联表Model哪个字段,'
-                            f'\r\n如果是取本表字段数据库值({field.attname}), 应当加上_id: "{field_path}_id"'
-                            f'\r\n否则取关联obj.__str__(), 无法确定str()使用哪些字段, 关联表SQL查询不进行优化.'
-                            f'\r\n只有list_fields配置字段改为: {field_path}__xx外表字段, 才可确定所需查询字段.'
-                        )
-                        sr_fields.append(field_path)
-                    elif '__' in field_path:
-                        # 关联字段, 去掉最后一级的外部表字段, 得到"当前表"model中的关联字段
-                        field_names = field_path.split('__')
-                        lookup_field = '__'.join(field_names[:-1])  # 去掉末尾的__外部关联表字段
-                        sr_fields.append(lookup_field)
-
-        sr_fields = [*set(sr_fields)]  # 去重
-        pr_fields = [*set(pr_fields)]  # 去重
+        plan = self.fields_plan
+        sr_fields = plan.select_related
+        pr_fields = plan.prefetch_related
+        onlys = plan.onlys
         logger.debug(f'\r\nx2o关联: {sr_fields} \r\nx2m关联: {pr_fields} \r\n限定查询字段: \r\n{onlys}')
         if sr_fields:
             queryset = queryset.select_related(*sr_fields)
+        pr_fields = [f for f in pr_fields if f not in plan.x2m_previews]  # 预览列在当前页数据查出后再prefetch
         if pr_fields:
             queryset = queryset.prefetch_related(*pr_fields)
         self.add_only_fields(queryset, onlys)
         return queryset
 
     def add_only_fields(self, queryset, field_names=[]):
-        '''
-        进行限定字段, 执行queryset.only(*field_names),
-        如果多次执行only(), 按django设计的方案只有最后一次的only()有效,
-        所以这里改成only追加字段的方式, 相当于在前一次only()限定字段基础上, 追加新字段.
-        使用户ListView若有自定义的only(), 不会被删.
-        '''
-        if field_names:
-            existing, defer = queryset.query.deferred_loading
-            field_names = set(field_names)
-            if 'pk' in field_names:
-                field_names.remove('pk')
-                field_names.add(self.model._meta.pk.name)
-
-            if defer:
-                # 用户queryset没进行only()自定义限定字段, defer()差集
-                # return queryset.only(*field_names)
-                field_names = field_names.difference(existing)
+        # 限定查询字段, 在用户queryset已有的only()基础上追加
+        add_only_fields(queryset, field_names)
+
+
+class JsTableListView(SqlListView):
+    '''
+    DataTables.js 服务端模式 (serverSide), 列表页只输出表头, 表格数据由前端ajax按页请求加载,
+    不再把整表数据一次输出到html中由前端分页/搜索.
+
+    开启条件: js_table_server 为True, 且 js_table_data 为True或未指定(None)时 filter_fields 为空.
+    注意: 服务端模式只输出 list_fields 各列, 自定义模板中扩展的 add_table_td 列不会输出,
+    这种情况请设置 js_table_server = False.
+
+    数据请求使用列表页相同url, DataTables请求参数:
+        draw: 请求序号, 原样返回
+        start/length: 偏移/每页条数
+        search[value]: 全局搜索, 搜索字段为 filter_fields, 未配置则为list_fields中的字符串字段, 也没有则为本表字符串字段
+        order[i][column]/order[i][dir]: 排序列/方向
+    url中的 orm_ 等过滤参数仍然有效.
+    '''
+    js_table_server = conf.LISTVIEW_JS_TABLE_SERVER  # DataTable.js 服务端分页/搜索/排序
+    js_table_lazy = False  # 当前请求是否只输出表头, 数据由前端ajax加载
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        # 在get()之前确定, 页面缓存命中时不执行get(), 模板仍需 js_table_lazy 输出DataTables初始化js
+        if self.is_js_table_server():
+            self.js_table_data = True
+            self.js_table_lazy = 'draw' not in request.GET
+
+    def get(self, request, *args, **kwargs):
+        if self.is_js_table_server() and 'draw' in request.GET:
+            return self.get_js_table_data()
+        return super().get(request, *args, **kwargs)
+
+    def is_js_table_server(self):
+        return self.js_table_server and self.js_table_data is not False and (
+            self.js_table_data or not self.filter_fields
+        )
+
+    def get_context_data(self, *args, **kwargs):
+        if self.js_table_lazy:
+            # 列表页只输出表头, 不查询数据
+            kwargs['object_list'] = self.object_list.none()
+        return super().get_context_data(*args, **kwargs)
+
+    def build_fields_plan(self):
+        plan = super().build_fields_plan()
+        model = self.model or self.queryset.model
+        # 本表字符串字段, list_fields中无字符串字段时(比如MyRouter生成的列表页只一列显示obj)全局搜索使用
+        model_text_fields = [
+            field.name for field in model._meta.concrete_fields if isinstance(field, (models.CharField, models.TextField))
+        ]
+        plan.js_table_search_fields = []  # 未配置filter_fields时, 全局搜索使用的字段
+        plan.js_table_orderings = []  # 各列排序字段, 不支持排序的列为None
+        for field_path, verbose_name, last_field_name, field in plan.list_fields:
+            if isinstance(field, (models.CharField, models.TextField)):
+                plan.js_table_search_fields.append(field_path)
+            if not field_path:
+                # 只显示obj的默认列, 按model默认排序字段, 或第一个字符串字段(通常为str(obj)所用字段), 或主键排序
+                plan.js_table_orderings.append(self.get_js_table_default_ordering(model, model_text_fields))
+            elif not isinstance(field, (
+                reverse_related.ManyToOneRel,
+                reverse_related.ManyToManyRel,
+                related.ManyToManyField
+            )):
+                plan.js_table_orderings.append(field_path)
             else:
-                # 在前一次限定字段基础上, 追加新限定字段, only()并集
-                logger.debug(f'保留用户queryset已有的only限定字段: {existing}')
-                field_names = existing.union(field_names)
-            queryset.query.deferred_loading = field_names, False
+                plan.js_table_orderings.append(None)
+        if not plan.js_table_search_fields:
+            plan.js_table_search_fields = model_text_fields
+        return plan
+
+    def get_js_table_default_ordering(self, model, text_fields):
+        for ordering in model._meta.ordering:
+            if isinstance(ordering, str) and ordering != '?':
+                return ordering.lstrip('-')
+        return text_fields[0] if text_fields else 'pk'
+
+    def get_js_table_data(self):
+        GET = self.request.GET
+        try:
+            draw = int(GET['draw'])
+            start = max(0, int(GET.get('start', 0)))
+            length = int(GET.get('length', self.paginate_by or 0))
+        except ValueError:
+            return JsonResponse({'error': '请求参数错误'}, status=400)
+        if not 0 < length <= 100:
+            length = 100  # 限制最大100条, length=-1(显示全部)也限制
+
+        queryset = self.object_list = self.get_queryset()
+        s = GET.get('search[value]', '').strip()
+        search_fields = self.fields_plan.filter_fields or self.fields_plan.js_table_search_fields
+        filtered = self.search_queryset(queryset, search_fields, s) if s and search_fields else None
+
+        table_urls = self.get_js_table_urls()
+        ordering = self.get_js_table_ordering(table_urls)
+        page_queryset = queryset if filtered is None else filtered
+        if ordering:
+            page_queryset = page_queryset.order_by(*ordering, 'pk')
+
+        # 总条数/过滤后条数/当前页数据互不依赖, 异步视图中并发查询
+        tasks = [lambda: self.get_queryset_count(queryset)[0]]
+        if filtered is not None:
+            tasks.append(lambda: self.get_queryset_count(filtered)[0])
+        tasks.append(lambda: self.get_page_objects(page_queryset[start:start + length]))
+        records_total, *records_filtered, objects = self.run_concurrent(*tasks)
+        records_filtered = records_filtered[0] if records_filtered else records_total
+
+        rows = self.get_object_rows(objects)
+        return JsonResponse({
+            'draw': draw,
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+            'data': [self.get_js_table_row(row, table_urls) for row in rows],
+        })
+
+    def get_js_table_urls(self):
+        # 根据用户权限, 批量删除/批量修改url, 无权限或url未配置则为None. 各行详情/编辑链接使用 row.urls
+        return self.batch_urls
+
+    def get_js_table_ordering(self, table_urls):
+        ordering = []
+        orderings = self.fields_plan.js_table_orderings
+        offset = 1 if self.list_checkbox else 0  # 首列为批量删除/修改勾选框
+        index = 0
+        while f'order[{index}][column]' in self.request.GET:
+            try:
+                column = int(self.request.GET[f'order[{index}][column]']) - offset
+            except ValueError:
+                column = -1
+            # 勾选框列(-1)/超出范围的列不排序, 负数不能作为列表下标
+            field_path = orderings[column] if 0 <= column < len(orderings) else None
+            if field_path:
+                desc = self.request.GET.get(f'order[{index}][dir]') == 'desc'
+                ordering.append(f'-{field_path}' if desc else field_path)
+            index += 1
+        return ordering
+
+    def get_js_table_row(self, row, table_urls):
+        # 一行表格数据, 各列与列表页模板表头一致: [勾选框] + list_fields各列 + 操作
+        pk = row.object.pk
+        cells = [conditional_escape(cell) for cell in row.cells]
+        detail_url = row.urls.get('detail')
+        if detail_url and cells:
+            cells[0] = format_html('<a href="{}">{}</a>', detail_url, cells[0])
+
+        actions = []
+        update_url = row.urls.get('update')
+        if update_url:
+            actions.append(format_html('<a class="btn btn-info btn-xs" href="{}">编辑</a>', update_url))
+        if table_urls['delete']:
+            actions.append('<a class="btn btn-danger btn-xs">删除</a>')
+        if self.list_checkbox:
+            cells.insert(0, format_html('<input type="checkbox" value="{}"  name="id">', pk))
+        cells.append(' '.join(actions))
+        return {'DT_RowId': pk, 'cells': cells}
 
 
 class VirtualRelation:
@@ -372,12 +954,28 @@ class VirtualRelation:
         两表关联时, SQL只查出二个表数据, 然后面象对象开发进行"连接", 后续处理只消耗CPU, 不再有二表数据库IO操作.
 
     注意:
-        列表页展示虚拟关联表数据, 暂不支持list_fields自动处理虚拟字段, 需自定义模板页扩展新列.
+        列表页展示虚拟关联表数据, 可使用 VirtualRelationListView 配置 virtual_relations, list_fields 中使用虚拟字段,
+        或者自定义模板页扩展新列.
         如果提供的qs有.only()限定字段, 模板也需只使用这些字段, 否则超出字段会产生大量where查询SQL.
         如果模板中使用的最终字段数据, 是多层虚拟"外键"关系, 需进行多次两两虚拟关联, 类似三表m2m需关联二次.
+
+    分批/并发查询:
+        qs2按qs1的关联字段值(去重)过滤, IN列表每批最多 virtual_chunk_size 个值 (SQLite/Oracle有参数个数限制),
+        virtual_workers 大于1时, 多批查询及 virtual_joins() 的多个关联表, 使用线程池并发查询,
+        适合关联表在其它数据库(跨库/远程)的情形. 每个工作线程使用各自的数据库连接, 任务完成后关闭.
+        qs2所在数据库连接正处于事务中时(比如 ATOMIC_REQUESTS), 其它线程看不到未提交数据, 不并发.
+
+    关联表缓存:
+        关联表为数据量小/变化少的维度表时, 可配置缓存策略 (virtual_join的cache参数, 或 virtual_cache 默认值),
+        各关联值对应的obj2缓存于进程内LRU或django缓存, 页面访问只查询未命中的关联值, 全部命中则只查询本表.
+        preload缓存整个关联表, 完全在内存中关联. 失效方式参考 cache.VirtualCache
     '''
+    virtual_chunk_size = conf.VIRTUAL_CHUNK_SIZE  # qs2过滤 IN (...) 每批最多值个数
+    virtual_workers = conf.VIRTUAL_WORKERS  # 并发查询线程数, 0/1为不并发
+    virtual_cache = conf.VIRTUAL_CACHE  # 关联表缓存策略默认值, 参考 cache.get_virtual_cache()
 
-    def virtual_join(self, qs1, qs2, attr=None, rel_field=None, to_field='pk', reverse=False):
+    def virtual_join(self, qs1, qs2, attr=None, rel_field=None, to_field='pk', reverse=False, optimize=None,
+                     cache=None):
         '''
         表数据在业务上是o2o/m2o或m2o关系, 而DB表/Model字段为普通字段, 对两表进行虚拟左联.
         两个Model如果有实际的关联关系, 也可当虚拟关联来处理, attr和外键字段同名时, 注意obj1.save()
@@ -390,6 +988,9 @@ class VirtualRelation:
         reverse: 业务关联正反方向
             False 业务关联字段rel_field在obj1表
             True  业务关联字段rel_field在obj2表
+        optimize: qs2是否按qs1关联值过滤, 为None时同 self.optimize_sql
+        cache: 关联表缓存策略, 为None时同 self.virtual_cache, False不缓存, 参考 cache.get_virtual_cache()
+               (qs2需为QuerySet, 缓存时qs2总是按qs1关联值过滤)
 
         返回obj1列表, 不允许后续再进行叠加过滤等qs操作, 以免obj2关联关系丢失
         '''
@@ -403,36 +1004,24 @@ class VirtualRelation:
         else:
             field1 = rel_field or to_field
 
-        qs2 = self.optimize_qs2(obj_list1, qs2, field1, field2)
-        obj_list2 = [obj2 for obj2 in qs2]  # qs._fetch_all()
-
-        if obj_list1 and obj_list2:
-
-            if o2m:
-                '''
-                反向关联, 业务关系当成o2m关联来处理, 也就是一obj1对多obj2
-                如果实际业务是每个obj1对应一个obj2, 也就是反向o2o,
-                业务上类似反向外键, 只是对应的反向数据只有一条, 兼容
-                不管对应一条还是多条数据, 模板中都需for迭代取.
-                '''
-                # field1 = to_field
-                # field2 = rel_field
-                dict2 = {}
-                for obj2 in obj_list2:
-                    key2 = getattr(obj2, field2)
-                    if key2 in dict2:
-                        dict2[key2].append(obj2)
-                    else:
-                        dict2[key2] = [obj2]
-            else:
-                # field1 = rel_field or to_field
-                # field2 = to_field
+        policy = get_virtual_cache(self.virtual_cache if cache is None else cache)
+        if policy and isinstance(qs2, models.query.QuerySet):
+            def fetch(keys):
+                obj_list2 = [obj2 for obj2 in qs2] if keys is None else self.fetch_keys(qs2, field2, keys)
+                return self.get_dict2(obj_list2, field2, o2m)
+
+            keys = None if policy.preload else self.get_rel_keys(obj_list1, field1)
+            dict2 = policy.get_dict2(qs2, field2, o2m, keys, fetch) if obj_list1 else {}
+            meta2 = qs2.model._meta
+        else:
+            obj_list2 = self.fetch_qs2(obj_list1, qs2, field1, field2, optimize)
+            dict2 = self.get_dict2(obj_list2, field2, o2m)
+            meta2 = obj_list2 and obj_list2[0]._meta
 
-                # obj1与obj2 为x2o关联
-                dict2 = {getattr(obj2, field2): obj2 for obj2 in obj_list2}
+        if obj_list1 and dict2:
 
             # 检查attr是否为model1的 x2o 或 o2x 字段
-            attr, IsForeignKeyField = self.check_attr(attr, obj_list1[0]._meta, obj_list2[0]._meta)
+            attr, IsForeignKeyField = self.check_attr(attr, obj_list1[0]._meta, meta2)
 
             for obj1 in obj_list1:
                 key2 = getattr(obj1, field1)
@@ -443,6 +1032,31 @@ class VirtualRelation:
 
         return obj_list1
 
+    def get_dict2(self, obj_list2, field2, o2m=False):
+        if o2m:
+            '''
+            反向关联, 业务关系当成o2m关联来处理, 也就是一obj1对多obj2
+            如果实际业务是每个obj1对应一个obj2, 也就是反向o2o,
+            业务上类似反向外键, 只是对应的反向数据只有一条, 兼容
+            不管对应一条还是多条数据, 模板中都需for迭代取.
+            '''
+            # field1 = to_field
+            # field2 = rel_field
+            dict2 = {}
+            for obj2 in obj_list2:
+                key2 = getattr(obj2, field2)
+                if key2 in dict2:
+                    dict2[key2].append(obj2)
+                else:
+                    dict2[key2] = [obj2]
+            return dict2
+
+        # field1 = rel_field or to_field
+        # field2 = to_field
+
+        # obj1与obj2 为x2o关联
+        return {getattr(obj2, field2): obj2 for obj2 in obj_list2}
+
     def optimize_qs2(self, qs1, qs2, field1, field2):
         '''
         优化查询， qs2过滤数据， 减少查询量
@@ -451,10 +1065,82 @@ class VirtualRelation:
         '''
 
         if isinstance(qs2, models.query.QuerySet) and getattr(self, 'optimize_sql', None):
-            ids = [getattr(o, field1) for o in qs1]
-            qs2 = qs2.filter(**{f'{field2}__in': ids})
+            qs2 = qs2.filter(**{f'{field2}__in': self.get_rel_keys(qs1, field1)})
         return qs2
 
+    def get_rel_keys(self, qs1, field1):
+        # qs1的关联字段值, 去重, 去除空值 (NULL不会关联到数据)
+        return list(dict.fromkeys(key for key in (getattr(o, field1) for o in qs1) if key is not None))
+
+    def fetch_qs2(self, qs1, qs2, field1, field2, optimize=None):
+        '''
+        查出qs2中与qs1关联的数据, 返回obj2列表.
+        关联字段值超过 virtual_chunk_size 个时分批查询, 开启并发时各批并发.
+        '''
+        if optimize is None:
+            optimize = getattr(self, 'optimize_sql', None)
+        if not (isinstance(qs2, models.query.QuerySet) and optimize):
+            return [obj2 for obj2 in qs2]  # qs._fetch_all()
+
+        return self.fetch_keys(qs2, field2, self.get_rel_keys(qs1, field1))
+
+    def fetch_keys(self, qs2, field2, keys):
+        # 按关联值查出qs2数据, 分批/并发查询
+        if not keys:
+            return []
+        chunk_size = self.get_chunk_size(qs2.db)
+        querysets = [
+            qs2.filter(**{f'{field2}__in': keys[i:i + chunk_size]}) for i in range(0, len(keys), chunk_size)
+        ]
+        results = self.run_tasks([lambda qs=qs: list(qs) for qs in querysets], {qs2.db})
+        return [obj2 for result in results for obj2 in result]
+
+    def get_chunk_size(self, using):
+        # 每批IN列表值个数, 不超过数据库限制 (Oracle IN列表最多1000个, SQLite参数个数999/32766, 留出qs2其它条件的参数)
+        connection = connections[using]
+        chunk_size = self.virtual_chunk_size or 1000
+        max_in_list = connection.ops.max_in_list_size()
+        if max_in_list:
+            chunk_size = min(chunk_size, max_in_list)
+        max_params = getattr(connection.features, 'max_query_params', None)
+        if max_params:
+            chunk_size = min(chunk_size, max(1, max_params - 100))
+        return chunk_size
+
+    def run_tasks(self, tasks, aliases=()):
+        '''
+        执行多个查询任务(无参数函数), 返回各任务结果列表, 顺序同tasks.
+        virtual_workers 大于1且任务多于1个时, 使用线程池并发, 每个线程使用各自的数据库连接.
+        已在工作线程中(嵌套调用)或数据库连接处于事务中时, 在当前线程依次执行.
+        '''
+        workers = min(self.virtual_workers or 1, len(tasks))
+        if workers <= 1 or getattr(_local, 'worker', False) or any(
+            connections[alias].in_atomic_block for alias in aliases
+        ):
+            return [task() for task in tasks]
+
+        # 任务按线程分组, 每个线程依次执行本组任务, 只建立一次数据库连接
+        groups = [tasks[i::workers] for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='generic-virtual') as executor:
+            group_results = list(executor.map(run_in_worker, groups))
+        results = [None] * len(tasks)
+        for i, group_result in enumerate(group_results):
+            results[i::workers] = group_result
+        return results
+
+    def virtual_joins(self, qs1, joins):
+        '''
+        qs1与多个表分别虚拟关联, 各关联表互不依赖, 开启并发(virtual_workers)时同时查询.
+        joins: [{'qs2': qs2, 'attr': .., 'rel_field': .., 'to_field': .., 'reverse': ..}, ...], 参数同virtual_join()
+        返回obj1列表
+        '''
+        obj_list1 = [obj1 for obj1 in qs1]  # 各关联共用同一批obj1
+        aliases = {join['qs2'].db for join in joins if isinstance(join['qs2'], models.query.QuerySet)}
+        self.run_tasks([
+            lambda join=join: self.virtual_join(obj_list1, **join) for join in joins
+        ], aliases)
+        return obj_list1
+
     def virtual_m2m(self,
                     qs_1, qs_m, qs_2,
                     m_rel_field_1, m_rel_field_2,
@@ -480,10 +1166,14 @@ class VirtualRelation:
                         obj_m.attr_2 = obj_2
 
         '''
-        qs_m = self.optimize_qs2(qs_1, qs_m, field1=to_field_1, field2=m_rel_field_1 or 'pk')  # 过滤数据减少查询量
+        obj_list_1 = [obj_1 for obj_1 in qs_1]
+        # 中间表数据只查出与qs_1关联的 (过滤数据减少查询量, 分批查询)
+        m_objs = self.fetch_qs2(obj_list_1, qs_m, field1=to_field_1, field2=m_rel_field_1 or 'pk')
 
-        m_objs = self.virtual_join(qs_m, qs_2, attr=attr_2, rel_field=m_rel_field_2, to_field=to_field_2)
-        return self.virtual_join(qs_1, m_objs, attr=attr_m, rel_field=m_rel_field_1, to_field=to_field_1, reverse=True)
+        m_objs = self.virtual_join(m_objs, qs_2, attr=attr_2, rel_field=m_rel_field_2, to_field=to_field_2)
+        return self.virtual_join(
+            obj_list_1, m_objs, attr=attr_m, rel_field=m_rel_field_1, to_field=to_field_1, reverse=True
+        )
 
     def set_attr(self, obj1, attr, obj2, IsForeignKeyField=False):
         '''
@@ -529,34 +1219,172 @@ class VirtualRelation:
         return attr, IsForeignKeyField
 
 
-# class VirtualRelationListView(VirtualRelation, SqlListView):
-#     '''
-#     比如跨库虚拟关联, self.model 与 rel_model 通过数据库字段rel_field建立虚拟关联
+def run_in_worker(tasks):
+    # 线程池工作线程依次执行任务, 完成后关闭本线程的数据库连接 (django连接按线程, 请求结束时不会关闭工作线程的连接)
+    _local.worker = True
+    try:
+        return [task() for task in tasks]
+    finally:
+        _local.worker = False
+        connections.close_all()
 
-#     virtual_relations = {
-#         # 虚拟关联
-#         'attr': {
-#             'rel_model': 'model2',
-#             'rel_field': 'db_field_name',
-#             'rel_type': 'ForeignKey',  # ForeignKey, OneToOneField, ManyToManyField
-#             'to_field': 'pk',
-#             'reverse': False,  # True:反向关联, False:正向关联
-#         }
-#     }
 
-#     使虚拟关联无需自定义模板扩展新列, 方便按需展示各字段前后顺序.
-#     list_fields 中使用attr虚拟字段,  f'{attr}__关联表(model2)xx字段'
-#     '''
+class VirtualRelationListView(VirtualRelation, JsTableListView):
+    '''
+    声明式虚拟关联, 比如跨库虚拟关联, self.model 与 rel_model 通过数据库字段建立虚拟关联
+
+    virtual_relations = {
+        # 虚拟关联名称attr: 配置
+        'attr': {
+            'rel_model': Model2,  # 关联表model, 或 'app_label.Model2'
+            'rel_field': 'db_field_name',  # 业务关联字段, reverse为False时在本表, 为True时在关联表, 为空表示主键
+            'to_field': 'pk',  # reverse为False时为关联表字段, 为True时为本表字段
+            'reverse': False,  # False: 正向, 每个obj对应一个关联obj; True: 反向, 对应关联obj列表
+            'using': None,  # 关联表数据库别名, 为空由数据库路由确定
+            'cache': None,  # 关联表缓存策略, 比如 {'timeout': 600, 'preload': True}, 参考 cache.VirtualCache
+        }
+    }
+
+    list_fields 中使用虚拟字段: 'attr' 显示str(关联obj), 'attr__xx' 显示关联表xx字段 (xx可继续x2o关联 attr__fk__name).
+    无需自定义模板扩展新列, 按需安排各字段前后顺序, 导出/DataTables服务端模式同样有效.
+    当前页数据查出后(分页之后), 所有虚拟关联一次性批量查询 (参考 virtual_joins/virtual_chunk_size/virtual_workers),
+    关联表只查询显示用到的字段 (显示str(obj)的除外).
+    虚拟字段不支持搜索过滤及排序, filter_fields 中的虚拟字段忽略.
+    虚拟m2m(三表)需自定义处理, 参考 virtual_m2m().
+    '''
+    virtual_relations = {}
+
+    def get_fields_plan_key(self):
+        return super().get_fields_plan_key(), get_fields_key(self.virtual_relations)
+
+    def is_virtual_field(self, field_path):
+        return field_path.split('__', 1)[0] in self.virtual_relations
 
-#     virtual_relations = {}
+    def init_fields(self, fields, multi_valued=False):
+        # 虚拟字段在 build_fields_plan() 中单独处理
+        if self.virtual_relations:
+            fields = [f for f in fields if not self.is_virtual_field(f if isinstance(f, str) else f[0])]
+        return super().init_fields(fields, multi_valued)
 
-#     def init_fields(self, fields):
-#         # self.model._meta 加入虚拟字段attr, 仅用于列表页自动模板展示虚拟关联表数据.
-#         meta = self.model._meta
-#         for attr, info in virtual_relations.items():
-#             1
+    def build_fields_plan(self):
+        plan = super().build_fields_plan()
+        plan.virtual_relations = {}  # {attr: 虚拟关联查询配置}
+        if not self.virtual_relations:
+            return plan
+
+        model = self.model or self.queryset.model
+        aligned = [name for name in ('accessors', 'export_accessors', 'js_table_orderings') if hasattr(plan, name)]
+        if plan.list_fields and not plan.list_fields[0][0]:
+            # 无有效的普通字段, 去掉只显示obj的默认列
+            plan.list_fields = []
+            for name in aligned:
+                setattr(plan, name, [])
+
+        index = 0  # 虚拟字段在已解析字段中的位置, 保持list_fields配置顺序
+        for _field in self.list_fields:
+            field_path, verbose_name = (_field, None) if isinstance(_field, str) else _field
+            if not self.is_virtual_field(field_path):
+                if init_fields(model, [_field]):
+                    index += 1
+                continue
+
+            attr, _, rel_path = field_path.partition('__')
+            relation = plan.virtual_relations.get(attr) or self.init_virtual_relation(attr)
+            rel_info = None
+            if rel_path:
+                rel_fields = init_fields(relation['rel_model'], [(rel_path, verbose_name)])
+                if not rel_fields:
+                    logger.warning(f'虚拟字段"{field_path}"配置错误, 关联表{relation["rel_model"]}无字段{rel_path}')
+                    continue
+                rel_info = rel_fields[0]
+                verbose_name = rel_info[1]
+            verbose_name = verbose_name or relation['rel_model']._meta.verbose_name
+            self.add_virtual_field(relation, rel_info)
+            plan.virtual_relations[attr] = relation
+
+            field_info = (f'{attr}__{rel_info[0]}' if rel_info else attr, verbose_name, attr, rel_info and rel_info[3])
+            plan.list_fields.insert(index, field_info)
+            plan.accessors.insert(index, columns.compile_virtual_accessor(attr, relation['many'], rel_info))
+            plan.export_accessors.insert(
+                index, columns.compile_virtual_accessor(attr, relation['many'], rel_info, export=True)
+            )
+            if 'js_table_orderings' in aligned:
+                plan.js_table_orderings.insert(index, None)  # 虚拟字段不支持排序
+            index += 1
+
+        for relation in plan.virtual_relations.values():
+            plan.related_models.add(relation['rel_model'])
+            if plan.onlys:
+                plan.onlys.append(relation['field1'])  # 本表关联字段需查出
+        return plan
+
+    def init_virtual_relation(self, attr):
+        # 虚拟关联配置转为查询配置
+        config = self.virtual_relations[attr]
+        rel_model = config['rel_model']
+        if isinstance(rel_model, str):
+            rel_model = apps.get_model(rel_model)
+        rel_field = config.get('rel_field')
+        to_field = config.get('to_field') or 'pk'
+        reverse = bool(config.get('reverse'))
+        return {
+            'rel_model': rel_model,
+            'rel_field': rel_field,
+            'to_field': to_field,
+            'reverse': reverse,
+            'many': reverse and bool(rel_field),  # 同virtual_join(), 反向关联为一对多
+            'field1': to_field if reverse and rel_field else rel_field or to_field,  # 本表关联字段
+            'field2': rel_field if reverse and rel_field else to_field,  # 关联表关联字段
+            'using': config.get('using'),
+            'cache': config.get('cache'),
+            'select_related': set(),
+            'prefetch_related': set(),
+            'onlys': set(),  # 为None时查询关联表所有字段
+        }
+
+    def add_virtual_field(self, relation, rel_info):
+        # 关联表查询需要的 select_related/prefetch_related/only 字段
+        if rel_info is None or (isinstance(rel_info[3], related.ForeignKey) and rel_info[2] != rel_info[3].attname):
+            relation['onlys'] = None  # 显示str(obj), 无法确定用到哪些字段
+        sr_fields, pr_fields, onlys = get_optimize_fields([rel_info] if rel_info else [])
+        relation['select_related'].update(sr_fields)
+        relation['prefetch_related'].update(pr_fields)
+        if relation['onlys'] is not None:
+            relation['onlys'].update(onlys)
+            relation['onlys'].add(relation['field2'])
+
+    def get_virtual_queryset(self, attr, relation):
+        # 虚拟关联表queryset, 可重写增加过滤条件等
+        queryset = relation['rel_model']._default_manager.all()
+        if relation['using']:
+            queryset = queryset.using(relation['using'])
+        if relation['select_related']:
+            queryset = queryset.select_related(*relation['select_related'])
+        if relation['prefetch_related']:
+            queryset = queryset.prefetch_related(*relation['prefetch_related'])
+        if relation['onlys']:
+            add_only_fields(queryset, relation['onlys'])
+        return queryset
 
-#         return super().init_fields(fields)
+    def prepare_objects(self, objects):
+        objects = super().prepare_objects(objects)
+        relations = self.fields_plan.virtual_relations
+        if not relations:
+            return objects
+
+        objects = [obj for obj in objects]
+        if objects:
+            # 所有虚拟关联一次性查询, 关联表只按当前页数据的关联值过滤
+            self.virtual_joins(objects, [{
+                'qs2': self.get_virtual_queryset(attr, relation),
+                'attr': attr,
+                'rel_field': relation['rel_field'],
+                'to_field': relation['to_field'],
+                'reverse': relation['reverse'],
+                'optimize': True,
+                'cache': relation['cache'],
+            } for attr, relation in relations.items()])
+        return objects
 
 
 '''
@@ -564,9 +1392,16 @@ class VirtualRelation:
 
 class XxxList(views.ModelMixin, views.MyListView):
     model = models.Xxx
-    list_fields = ['pk', 'm2o__o2o__pk', 'x2o__x2m']
+    list_fields = ['pk', 'm2o__o2o__pk', 'x2o__x2m', 'attr__name', 'attr2']
     filter_fields = ['field1', 'x2o__field3']
     optimize_sql = True
+    virtual_relations = {
+        # 声明式虚拟关联, list_fields 直接使用, 无需自定义模板
+        'attr': {'rel_model': 'other_app.Model2', 'rel_field': 'model2_code', 'to_field': 'code'},
+        # 维度表缓存, 整表预加载到进程内存, 10分钟过期
+        'dept': {'rel_model': 'other_app.Dept', 'rel_field': 'dept_code', 'cache': {'timeout': 600, 'preload': True}},
+        'attr2': {'rel_model': 'other_app.Model3', 'rel_field': 'xxx_id', 'reverse': True},
+    }
 
 
 # 模板 (虚拟关联)
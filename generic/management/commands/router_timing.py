@@ -0,0 +1,35 @@
+# coding=utf-8
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver, URLResolver
+
+from generic import routers
+
+
+class Command(BaseCommand):
+    '''
+    加载URL配置, 显示各app自动路由(MyRouter)的model数/url数/耗时
+
+    python manage.py router_timing
+    python manage.py router_timing --build  # 延迟生成的视图全部生成, 统计视图生成耗时
+    '''
+    help = '显示各app自动路由(MyRouter)生成耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--build', action='store_true', help='生成所有延迟生成的视图 (lazy)')
+
+    def handle(self, *args, **options):
+        patterns = get_resolver().url_patterns  # 导入urls, 生成自动路由
+        if options['build']:
+            count = self.build(patterns)
+            self.stdout.write(f'生成延迟视图: {count}个')
+        self.stdout.write(routers.get_router_report())
+
+    def build(self, patterns):
+        count = 0
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                count += self.build(pattern.url_patterns)
+            elif hasattr(pattern.callback, 'build'):
+                pattern.callback.build()
+                count += 1
+        return count
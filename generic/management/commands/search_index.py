@@ -0,0 +1,39 @@
+# coding=utf-8
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+from django.utils.module_loading import import_string
+
+from generic import search
+
+
+class Command(BaseCommand):
+    '''
+    为列表页视图 filter_fields 建立/维护搜索索引 (全文检索表/GIN索引等), 搜索后端参考 generic/search.py
+
+    python manage.py search_index app_label.views.XxxList
+    python manage.py search_index app_label.views.XxxList --backend sqlite_fts5 --rebuild
+    '''
+    help = '为列表页视图(filter_fields)建立/重建/删除搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('views', nargs='+', help='列表页视图类的导入路径, 比如 app_label.views.XxxList')
+        parser.add_argument('--backend', help='搜索后端, 默认使用视图配置的 search_backend')
+        parser.add_argument('--database', help='数据库, 默认为model写入数据库')
+        parser.add_argument('--rebuild', action='store_true', help='删除后重建索引')
+        parser.add_argument('--drop', action='store_true', help='删除索引')
+
+    def handle(self, *args, **options):
+        for view_path in options['views']:
+            try:
+                view_class = import_string(view_path)
+            except ImportError as e:
+                raise CommandError(f'视图导入失败: {view_path} {e}')
+
+            view = view_class()
+            model = view.model or view.queryset.model
+            backend = search.get_search_backend(options['backend'] or view.search_backend)
+            using = options['database'] or router.db_for_write(model)
+            self.stdout.write(f'{view_path} ({model._meta.label}) - {type(backend).__name__} - {using}')
+            backend.build_index(
+                view, using=using, rebuild=options['rebuild'], drop=options['drop'], stdout=self.stdout
+            )
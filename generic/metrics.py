@@ -0,0 +1,251 @@
+# coding=utf-8
+'''
+通用视图性能指标: 每个请求的SQL查询次数/SQL耗时/各阶段耗时, 及列表页N+1查询检测
+
+    阶段: get_queryset(构造queryset), count(分页总条数), fetch(查询当前页/详情obj及各列取值), render(模板渲染),
+         other(权限检查等其它).  各阶段耗时不含其内部嵌套阶段.
+    输出: 响应头 Server-Timing (浏览器开发者工具 Network->Timing 可查看),
+         conf.GENERIC_METRICS_HOOKS 回调 hook(view, response, metrics), 可接入日志/监控系统.
+    N+1: 各列取值(columns访问器/模板过滤器lookup_val)时执行的SQL, 记到对应的 list_fields 列,
+         一般是关联字段未 select_related/prefetch (比如只写了外键名, 取 str(obj)), 每行查询一次.
+         同一列查询次数达到 conf.GENERIC_METRICS_N_PLUS_ONE 时 logger.warning.
+    并发查询: 异步视图(asyncviews)在其它线程执行的SQL也统计 (record_thread), 计入请求线程的当前阶段.
+
+视图配置 metrics = True 开启, 或 conf.GENERIC_METRICS 全局开启. 开启后每条SQL/每个单元格都有额外开销, 生产环境按需开启.
+'''
+import time
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import conf
+
+logger = logging.getLogger()
+
+_local = threading.local()  # 当前线程正在统计的请求指标, lookup_val 等无法访问视图的地方使用
+
+
+def get_current():
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def column(name):
+    # 列取值期间执行的SQL记到该列, 当前请求未开启指标时无操作
+    metrics = get_current()
+    if metrics is None:
+        yield
+        return
+    prev, metrics.current_column = metrics.current_column, name
+    try:
+        yield
+    finally:
+        metrics.current_column = prev
+
+
+class RequestMetrics:
+    '''
+    一个请求的性能指标
+        phases: {阶段: {'time': 秒, 'queries': SQL次数, 'sql_time': SQL秒}}
+        columns: {列字段路径: {'calls': 取值次数(行数), 'queries': SQL次数, 'sql_time': SQL秒}}
+    '''
+
+    def __init__(self):
+        self.phases = {}
+        self.columns = {}
+        self.current_column = None
+        self.total = 0
+        self._stack = []  # [[阶段, 开始时间], ...]
+        self._thread = None  # 请求线程, 阶段计时只在请求线程中进行
+        self._lock = threading.Lock()
+
+    def get_phase(self, name):
+        return self.phases.setdefault(name, {'time': 0, 'queries': 0, 'sql_time': 0})
+
+    def _pause(self, now):
+        # 当前阶段计时到now
+        if self._stack:
+            top = self._stack[-1]
+            self.get_phase(top[0])['time'] += now - top[1]
+            top[1] = now
+
+    @contextmanager
+    def phase(self, name):
+        if self._thread is not None and self._thread != threading.get_ident():
+            yield  # 并发查询线程中不计时, SQL计入请求线程的当前阶段
+            return
+        now = time.perf_counter()
+        self._pause(now)
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._pause(now)
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] = now
+
+    @contextmanager
+    def record(self):
+        # 统计期间当前线程所有数据库连接执行的SQL
+        start = time.perf_counter()
+        prev, _local.metrics = get_current(), self
+        self._thread = threading.get_ident()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.execute))
+                with self.phase('other'):
+                    yield self
+        finally:
+            _local.metrics = prev
+            self.total = time.perf_counter() - start
+
+    @contextmanager
+    def record_thread(self):
+        # 统计其它线程(并发查询)所有数据库连接执行的SQL
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.execute))
+            yield self
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                stats = self.get_phase(self._stack[-1][0] if self._stack else 'other')
+                stats['queries'] += 1
+                stats['sql_time'] += duration
+                if self.current_column is not None and self._thread == threading.get_ident():
+                    stats = self.get_column(self.current_column)
+                    stats['queries'] += 1
+                    stats['sql_time'] += duration
+
+    def get_column(self, name):
+        return self.columns.setdefault(name, {'calls': 0, 'queries': 0, 'sql_time': 0})
+
+    def track_accessor(self, name, accessor):
+        # 包装列访问器, 取值期间执行的SQL记到该列
+        stats = self.get_column(name)
+
+        def tracked(obj):
+            stats['calls'] += 1
+            prev, self.current_column = self.current_column, name
+            try:
+                return accessor(obj)
+            finally:
+                self.current_column = prev
+        return tracked
+
+    @property
+    def queries(self):
+        return sum(stats['queries'] for stats in self.phases.values())
+
+    @property
+    def sql_time(self):
+        return sum(stats['sql_time'] for stats in self.phases.values())
+
+    def get_n_plus_one(self, threshold=None):
+        # 逐行查询的列 {列: 查询次数}
+        threshold = threshold or conf.GENERIC_METRICS_N_PLUS_ONE
+        return {name: stats['queries'] for name, stats in self.columns.items() if stats['queries'] >= threshold}
+
+    def server_timing(self):
+        # Server-Timing 响应头, 耗时单位毫秒
+        items = [
+            f'{name};dur={stats["time"] * 1000:.1f};desc="{name} {stats["queries"]}q"'
+            for name, stats in self.phases.items()
+        ]
+        items.append(f'sql;dur={self.sql_time * 1000:.1f};desc="sql {self.queries}q"')
+        items.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(items)
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'queries': self.queries,
+            'sql_time': self.sql_time,
+            'phases': self.phases,
+            'columns': self.columns,
+        }
+
+
+def get_hooks(hooks):
+    # hooks: 回调函数或其导入路径的列表
+    return [import_string(hook) if isinstance(hook, str) else hook for hook in hooks]
+
+
+class MetricsMixin:
+    '''
+    视图性能指标, 参考模块说明. 结果为 view.request_metrics (RequestMetrics).
+    '''
+    metrics = conf.GENERIC_METRICS  # 是否统计
+    metrics_server_timing = conf.GENERIC_METRICS_SERVER_TIMING  # 是否输出 Server-Timing 响应头
+    metrics_hooks = conf.GENERIC_METRICS_HOOKS  # 回调 hook(view, response, metrics)
+
+    request_metrics = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.metrics:
+            return super().dispatch(request, *args, **kwargs)
+
+        self.request_metrics = metrics = RequestMetrics()
+        with metrics.record():
+            response = super().dispatch(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)) and not response.is_rendered:
+                # TemplateResponse 本应在视图返回后渲染, 提前渲染以便统计
+                with metrics.phase('render'):
+                    response.render()
+        self.report_metrics(response, metrics)
+        return response
+
+    def report_metrics(self, response, metrics):
+        if self.metrics_server_timing:
+            response['Server-Timing'] = metrics.server_timing()
+        for name, queries in metrics.get_n_plus_one().items():
+            logger.warning(
+                f'{type(self).__name__} 列"{name}"逐行查询: {metrics.columns[name]["calls"]}行执行了{queries}次SQL, '
+                f'应配置为关联表字段(xx__xx)或检查SQL优化(select_related/prefetch_related)'
+            )
+        for hook in get_hooks(self.metrics_hooks):
+            try:
+                hook(self, response, metrics)
+            except Exception:
+                logger.exception(f'性能指标回调出错: {hook}')
+
+    def metrics_phase(self, name):
+        if self.request_metrics is None:
+            return ExitStack()  # 空的上下文管理器
+        return self.request_metrics.phase(name)
+
+    def get_queryset(self):
+        with self.metrics_phase('get_queryset'):
+            return super().get_queryset()
+
+    def get_queryset_count(self, queryset):
+        with self.metrics_phase('count'):
+            return super().get_queryset_count(queryset)
+
+    def get_object_rows(self, object_list):
+        with self.metrics_phase('fetch'):
+            return super().get_object_rows(object_list)
+
+    def get_object(self, queryset=None):
+        with self.metrics_phase('fetch'):
+            return super().get_object(queryset)
+
+    def get_row_accessors(self):
+        accessors = super().get_row_accessors()
+        if self.request_metrics is None:
+            return accessors
+        return [
+            self.request_metrics.track_accessor(field_info[0] or str(field_info[1]), accessor)
+            for field_info, accessor in zip(self.fields_plan.list_fields, accessors)
+        ]
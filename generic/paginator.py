@@ -0,0 +1,191 @@
+# coding=utf-8
+'''
+列表页分页器
+
+KeysetPaginator: 游标分页 (keyset/seek), 按排序字段值定位下一页, 不使用 OFFSET, 也不需 COUNT(*),
+适合超大表的深度翻页. 每页多查一条数据, 用于判断是否还有下一页.
+CountPaginator: 普通页码分页, 总条数由视图的计数方式(counts)提供, 支持缓存/估算.
+'''
+import json
+import base64
+import logging
+
+from django.core.paginator import EmptyPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.functional import cached_property
+
+logger = logging.getLogger()
+
+
+class InvalidCursor(Exception):
+    1
+
+
+class KeysetPaginator:
+    '''
+    游标分页
+    ordering: 排序字段列表, 比如 ['-created', 'pk'], 最后应为唯一字段(默认自动追加pk), 以保证翻页不重复不遗漏.
+    排序字段值不能为NULL, 否则无法进行 >/< 比较定位.
+    '''
+
+    def __init__(self, object_list, per_page, ordering=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = self.get_ordering(ordering or ['pk'])
+
+    def get_ordering(self, ordering):
+        # [(字段, 是否倒序), ...]
+        ordering = [(f[1:], True) if f.startswith('-') else (f, False) for f in ordering]
+        pk_name = self.object_list.model._meta.pk.name
+        if not any(f in ('pk', pk_name) for f, desc in ordering):
+            ordering.append(('pk', ordering[-1][1] if ordering else False))
+        return ordering
+
+    def page(self, cursor=None):
+        previous, values = self.decode_cursor(cursor)
+        qs = self.object_list.order_by(*[
+            f'{"-" if desc != previous else ""}{f}' for f, desc in self.ordering
+        ])  # 向前翻页时反向排序
+        if values is not None:
+            qs = qs.filter(self.get_seek_q(values, previous))
+
+        object_list = list(qs[:self.per_page + 1])  # 多查一条, 判断是否还有下一页
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if previous:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return KeysetPage(object_list, self, has_next, has_previous)
+
+    def get_seek_q(self, values, previous=False):
+        '''
+        排序字段 (f1, f2, f3) 定位条件:
+            f1 > v1
+            or (f1 = v1 and f2 > v2)
+            or (f1 = v1 and f2 = v2 and f3 > v3)
+        倒序字段使用 <
+        '''
+        q = models.Q()
+        equals = {}
+        for (field, desc), value in zip(self.ordering, values):
+            lookup = 'lt' if desc != previous else 'gt'
+            q |= models.Q(**equals, **{f'{field}__{lookup}': value})
+            equals[field] = value
+        return q
+
+    def get_values(self, obj):
+        # obj各排序字段值, 支持关联字段 xx__xx
+        values = []
+        for field, desc in self.ordering:
+            value = obj
+            for attr in field.split('__'):
+                value = getattr(value, attr) if value is not None else None
+            if isinstance(value, models.Model):
+                value = value.pk  # 按外键排序, 为关联obj主键
+            values.append(value)
+        return values
+
+    def encode_cursor(self, obj, previous=False):
+        data = json.dumps([int(previous), self.get_values(obj)], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        # 返回 (是否向前翻页, 排序字段值列表)
+        if not cursor:
+            return False, None
+        try:
+            cursor += '=' * (-len(cursor) % 4)
+            previous, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError(values)
+        except Exception as e:
+            logger.debug(f'游标解析失败: {cursor} {e}')
+            raise InvalidCursor(cursor)
+        return bool(previous), values
+
+
+class KeysetPage:
+    '''
+    游标分页的当前页, 页码相关属性兼容django Page, 模板使用 next_cursor/previous_cursor 生成翻页链接.
+    '''
+    is_keyset = True
+    number = None
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return bool(self._has_next and self.object_list)
+
+    def has_previous(self):
+        return bool(self._has_previous and self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return self.paginator.encode_cursor(self.object_list[0], previous=True)
+
+
+class CountPaginator(Paginator):
+    '''
+    总条数可定制的分页器, count_func(object_list) 返回 (总条数, 是否为估算值)
+    估算条数多于实际条数时, 按估算页数生成的页码可能超出实际尾页, 这种页码改为精确计数后显示实际尾页.
+    '''
+    count_func = None
+    count_estimated = False  # 总条数是否为估算值, 模板显示"约N页/约N条"
+
+    @cached_property
+    def count(self):
+        if self.count_func is None:
+            return super().count
+        count, self.count_estimated = self.count_func(self.object_list)
+        return count
+
+    def page(self, number):
+        page = super().page(number)
+        if self.count_estimated and page.number > 1 and not page.object_list.exists():
+            # 超出实际尾页
+            return self.use_exact_count().page(self.num_pages)
+        return page
+
+    def use_exact_count(self):
+        self.count = self.object_list.count()  # 覆盖 cached_property
+        self.count_estimated = False
+        self.__dict__.pop('num_pages', None)
+        self.__dict__.pop('page_range', None)
+        return self
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.count_estimated:
+                raise
+            # 估算条数少于实际条数, 页码超出估算页数时, 改为精确计数后再验证
+            return self.use_exact_count().validate_number(number)
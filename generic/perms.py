@@ -0,0 +1,204 @@
+# coding=utf-8
+'''
+model增删改查权限, 一次性计算并缓存
+
+    请求内: 结果存于 request.user 对象, 同一请求中 dispatch权限检查/列表页model_perms/模板 共用, 不重复计算.
+    跨请求: 结果存于django缓存, key包含 用户pk + model + 权限版本号,
+           用户/组/权限变化(save/delete/m2m_changed信号)时版本号递增, 旧缓存失效.
+           conf.GENERIC_PERMS_CACHE_TIMEOUT 为0(默认)时不跨请求缓存.
+           只有 conf.GENERIC_CACHE_ALIAS 为共享缓存时才跨请求缓存, 进程内存缓存(locmem)时其它进程的权限变化
+           不能使本进程缓存失效, 撤销的权限在超时前仍然有效, 所以不缓存.
+
+计算方式同 user.has_perm(): 超级用户全部有权限, 否则按 AUTHENTICATION_BACKENDS 顺序检查,
+后端的 has_perm 为django默认实现(基于 get_all_permissions)时, 一次取出该后端所有权限集合判断,
+自定义 has_perm 的后端, 才逐个权限调用 has_perm.
+
+注意: 自定义权限后端的权限来源如不是django的用户/组/权限表, 数据变化时需调用 bump_perms_version(),
+或依赖缓存超时失效.
+'''
+import time
+import logging
+
+from django.contrib import auth
+from django.contrib.auth import get_permission_codename
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.db.models import signals
+
+from . import conf
+from . import cache
+
+logger = logging.getLogger()
+
+PERMS = ('add', 'change', 'delete', 'view')  # model默认权限
+
+try:
+    from django.contrib.auth.backends import BaseBackend  # django 3.0+
+    _set_based = {BaseBackend.has_perm, ModelBackend.has_perm}
+except ImportError:
+    _set_based = {ModelBackend.has_perm}
+
+
+def get_perm_names(model):
+    # {权限: 权限全称}, 比如 {'add': 'app_label.add_xxx', ...}
+    opts = model._meta
+    return {perm: f'{opts.app_label}.{get_permission_codename(perm, opts)}' for perm in PERMS}
+
+
+def get_model_perms(user, model):
+    '''
+    用户对model的增删改查权限 {'add': True/False, 'change': .., 'delete': .., 'view': ..}
+    '''
+    label = model._meta.label_lower
+    request_perms = getattr(user, '_generic_perms', None)
+    if request_perms is None:
+        request_perms = {}
+        try:
+            user._generic_perms = request_perms
+        except AttributeError:
+            pass
+    if label in request_perms:
+        return request_perms[label]
+
+    key = None
+    timeout = get_cache_timeout()
+    if timeout and user.is_authenticated and user.pk is not None:
+        key = cache.make_key('perms', get_perms_version(), get_perms_version(user.pk), user.pk, label)
+        perms = cache.get_cache().get(key)
+        if perms is not None:
+            request_perms[label] = perms
+            return perms
+
+    perms = request_perms[label] = compute_model_perms(user, model)
+    if key:
+        cache.get_cache().set(key, perms, timeout)
+    return perms
+
+
+def get_cache_timeout():
+    # 跨请求缓存秒数, 非共享缓存时为0
+    if conf.GENERIC_PERMS_CACHE_TIMEOUT and cache.is_shared_cache():
+        return conf.GENERIC_PERMS_CACHE_TIMEOUT
+    return 0
+
+
+def compute_model_perms(user, model):
+    names = get_perm_names(model)
+    if user.is_active and getattr(user, 'is_superuser', False):
+        return {perm: True for perm in names}
+
+    perms = {perm: False for perm in names}
+    pending = dict(names)  # 尚未确定的权限
+    for backend in auth.get_backends():
+        if not pending:
+            break
+        if not hasattr(backend, 'has_perm'):
+            continue
+        if getattr(type(backend), 'has_perm', None) in _set_based:
+            # 默认实现: 权限在 get_all_permissions() 中
+            all_perms = backend.get_all_permissions(user) if user.is_active else ()
+            for perm, name in list(pending.items()):
+                if name in all_perms:
+                    perms[perm] = True
+                    del pending[perm]
+            continue
+
+        for perm, name in list(pending.items()):
+            try:
+                if backend.has_perm(user, name):
+                    perms[perm] = True
+                    del pending[perm]
+            except PermissionDenied:
+                # 同 django _user_has_perm(), 后端拒绝则不再检查后续后端
+                del pending[perm]
+    return perms
+
+
+def has_perms(user, perm_list, model=None):
+    '''
+    同 user.has_perms(perm_list), model的增删改查权限使用缓存结果
+    '''
+    names = {name: perm for perm, name in get_perm_names(model).items()} if model else {}
+    model_perms = None
+    for name in perm_list:
+        if name in names:
+            if model_perms is None:
+                model_perms = get_model_perms(user, model)
+            if not model_perms[names[name]]:
+                return False
+        elif not user.has_perm(name):
+            return False
+    return True
+
+
+def get_perms_version_key(user_pk=None):
+    return f'{conf.GENERIC_CACHE_PREFIX}:perms:version:{"" if user_pk is None else user_pk}'
+
+
+def get_perms_version(user_pk=None):
+    # 权限版本号, user_pk为空时为全局版本号(组/权限变化), 否则为该用户的版本号
+    key = get_perms_version_key(user_pk)
+    version = cache.get_cache().get(key)
+    if version is None:
+        cache.get_cache().add(key, int(time.time() * 1000), None)
+        version = cache.get_cache().get(key)
+    return version
+
+
+def bump_perms_version(user_pk=None):
+    # 权限已变化, user_pk为空时所有用户权限缓存失效, 否则只有该用户失效
+    key = get_perms_version_key(user_pk)
+    try:
+        cache.get_cache().incr(key)
+    except ValueError:
+        cache.get_cache().set(key, int(time.time() * 1000), None)
+
+
+def user_changed(sender, instance, **kwargs):
+    # 用户修改 (is_active/is_superuser等)/删除
+    bump_perms_version(instance.pk)
+
+
+def perms_changed(sender, **kwargs):
+    # 组/权限修改删除, 组的权限变化
+    action = kwargs.get('action')
+    if action and not action.startswith('post_'):
+        return
+    bump_perms_version()
+
+
+def user_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # 用户的组/权限变化, 正向(user.groups.add)只影响该用户, 反向(group.user_set.add)影响pk_set中的用户
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_perms_version(instance.pk)
+    elif pk_set:
+        for pk in pk_set:
+            bump_perms_version(pk)
+    else:
+        bump_perms_version()  # 反向clear, 不知道涉及哪些用户
+
+
+def watch_perms():
+    '''
+    监听用户/组/权限变化, 在 AppConfig.ready() 中调用,
+    每个进程启动即监听, 不管是否使用过权限缓存, 修改方进程才能使其它进程的缓存失效.
+    '''
+    from django.apps import apps
+    if not apps.is_installed('django.contrib.auth'):
+        return
+    from django.contrib.auth.models import Group, Permission
+    User = auth.get_user_model()
+    uid = 'generic.perms'
+    for signal in (signals.post_save, signals.post_delete):
+        signal.connect(user_changed, sender=User, dispatch_uid=uid)
+        signal.connect(perms_changed, sender=Group, dispatch_uid=uid)
+        signal.connect(perms_changed, sender=Permission, dispatch_uid=uid)
+    signals.m2m_changed.connect(perms_changed, sender=Group.permissions.through, dispatch_uid=uid)
+    for field_name in ('groups', 'user_permissions'):
+        try:
+            through = User._meta.get_field(field_name).remote_field.through
+        except Exception:
+            continue  # 自定义用户模型无该字段
+        signals.m2m_changed.connect(user_m2m_changed, sender=through, dispatch_uid=uid)
@@ -1,18 +1,31 @@
 
 import sys
+import time
 import logging
 from importlib import import_module
 from django.conf.urls import url
+from django.urls import Resolver404, URLResolver
+from django.urls.resolvers import RegexPattern
 
 from . import views
 from . import conf
+from . import cache
 
 logger = logging.getLogger()
 
+# 各app自动路由耗时 {app_label: {'models': model数, 'urls': url数, 'time': 生成url秒数, 'views': 已生成视图数, 'view_time': 生成视图秒数}}
+router_timings = {}
+
+
+def get_router_timing(app_label):
+    return router_timings.setdefault(app_label, {'models': 0, 'urls': 0, 'time': 0, 'views': 0, 'view_time': 0})
+
 
 class MyRouter:
     """根据Model, 自动生成对应的Views和urls"""
     INDEXS = {
+        7: 'bulk_update',
+        6: 'export',
         5: 'create',
         4: 'delete',
         3: 'update',
@@ -20,7 +33,7 @@ class MyRouter:
         1: 'list',
     }
 
-    def __init__(self, model, args=0b11111, **kwargs):
+    def __init__(self, model, args=0b11111, async_views=None, lazy=None, **kwargs):
         '''
         model 用户提供的模型对象, 用于自动生成对应的ModelView
         args 和 kwargs, conf.ROUTER_ACTIONS 都是用来确定生成哪些view,
@@ -36,6 +49,8 @@ class MyRouter:
         args: 只对action字典中未配置的action才生效,
             五位二进制数字, 1为开启, 0为禁用
             分别代表是否开启生成 "增/删/改/查单/查列" 对应的View和url,
+            7: bulk_update (批量修改, 需第7位为1或 bulk_update=True 才生成)
+            6: export (导出, 需第6位为1或 export=True 才生成)
             5: create
             4: delete
             3: update
@@ -45,14 +60,27 @@ class MyRouter:
             比如 0b00011, 表示增删改的视图和url由人工定义,
             只自动生成 DetailView ListView 视图及对应url
 
+        async_views: 生成异步视图 (asyncviews), 为None时使用 conf.ROUTER_ASYNC_VIEWS, 导出仍为同步视图
+        lazy: 延迟生成视图, url照常注册, 视图类在首次请求时才生成并缓存, 加快启动/减少未访问页面的内存.
+            为None时使用 conf.ROUTER_LAZY_VIEWS
         '''
+        start = time.perf_counter()
         self.model = model
         self.args = args
+        self.async_views = conf.ROUTER_ASYNC_VIEWS if async_views is None else async_views
+        self.lazy = conf.ROUTER_LAZY_VIEWS if lazy is None else lazy
         self.kwargs = kwargs
         self.set_actions()  # 合并args配置
 
         self.urls = []
         self.set_urls()
+        if self.lazy and (conf.GENERIC_PAGE_CACHE or conf.GENERIC_CONDITIONAL_GET):
+            self.watch_models()
+
+        timing = get_router_timing(model._meta.app_label)
+        timing['models'] += 1
+        timing['urls'] += len(self.urls)
+        timing['time'] += time.perf_counter() - start
 
     def __getitem__(self, i):
         return self.urls[i]
@@ -60,7 +88,7 @@ class MyRouter:
     def set_actions(self):
         self.actions = conf.ROUTER_ACTIONS.copy()  # 默认actions配置
         self.actions.update(self.kwargs)  # 加载urls.py提供的actions
-        for index in range(1, 6):
+        for index in self.INDEXS:
             self.set_action(index)
         logger.debug(f'{self.actions} - ({self.model._meta.app_label}.{self.model.__name__})')
 
@@ -83,7 +111,7 @@ class MyRouter:
         url_path = self.get_url_path(action)
         return url(
             rf'^{model_name}/{url_path}',
-            self.get_view(action).as_view(),
+            self.get_lazy_view(action) if self.lazy else self.build_view(action),
             name=f"{model_name}_{action}"
         )
 
@@ -91,6 +119,47 @@ class MyRouter:
         # url路由对应的路径
         return conf.ROUTER_URL_RULES.get(action, f'{action}/')
 
+    def build_view(self, action):
+        # 生成视图类并 as_view(), 返回视图函数
+        start = time.perf_counter()
+        view = self.get_view(action).as_view()
+        timing = get_router_timing(self.model._meta.app_label)
+        timing['views'] += 1
+        timing['view_time'] += time.perf_counter() - start
+        return view
+
+    def get_lazy_view(self, action):
+        '''
+        延迟生成的视图函数, 首次请求时才生成视图, 之后直接调用.
+        并发的首次请求可能各自生成一次, 结果相同, 不加锁.
+        '''
+        view = None
+
+        def build():
+            nonlocal view
+            if view is None:
+                view = self.build_view(action)
+            return view
+
+        if self.async_views:
+            async def lazy_view(request, *args, **kwargs):
+                return await build()(request, *args, **kwargs)
+        else:
+            def lazy_view(request, *args, **kwargs):
+                return build()(request, *args, **kwargs)
+        lazy_view.build = build
+        return lazy_view
+
+    def watch_models(self):
+        '''
+        延迟生成视图时, 页面缓存/条件GET需监听的model (视图 as_view() 时监听) 提前监听,
+        以免本进程只修改数据而未访问过页面时, 缓存不失效. 自动视图的字段为本表字段, 关联model只有x2o.
+        '''
+        cache.watch_model(self.model)
+        for field in self.model._meta.fields:
+            if field.is_relation and field.related_model:
+                cache.watch_model(field.related_model)
+
     def get_view(self, action):
         # 自动创建MyModelView视图, 用于urls.py调用
         kwargs = {
@@ -100,32 +169,102 @@ class MyRouter:
         if action in ['create', 'update']:
             kwargs['fields'] = '__all__'
 
-        view_name = f'{action.capitalize()}View'
+        view_name = f'{"".join(word.capitalize() for word in action.split("_"))}View'  # bulk_update: BulkUpdateView
+        base = getattr(views, f'My{view_name}')
+        if self.async_views:
+            from . import asyncviews  # 不使用异步视图时不导入
+            base = getattr(asyncviews, f'Async{view_name}', base)
         view = type(
             f'{self.model.__name__}{view_name}',
-            (getattr(views, f'My{view_name}'), ),
+            (base, ),
             kwargs
         )
         return view
 
 
-def add_router_for_all_models(models=None, urlpatterns=None, args=0b11111, **kwargs):
-    # 自动为models模块中所有的模型创建urls/views.
-    f_locals = sys._getframe().f_back.f_locals
+class AppRouter(URLResolver):
+    '''
+    一个app所有model的自动路由只注册为一个url项, 解析时按路径首段(model名)查字典, 只尝试该model的几个url.
+    MyRouter每个model五六个url正则, model很多时, 排在后面的url要依次尝试几百个正则才能匹配.
+    url名称不变 ({model_name}_{action}), reverse() 照常使用; 路径不匹配时继续尝试后面的url, 同 MyRouter.
+
+    urlpatterns = [
+        ...  # 人工url
+        AppRouter(models),  # models模块所有model, 或 [models.Xxx, models.Yyy], 其它参数同 MyRouter
+    ]
+    '''
+
+    def __init__(self, models, args=0b11111, **kwargs):
+        self.routers = [MyRouter(model, args, **kwargs) for model in get_model_list(models)]
+        self.model_patterns = {}  # {model_name: [该model的url, ...]}
+        for router in self.routers:
+            self.model_patterns.setdefault(router.model._meta.model_name, []).extend(router.urls)
+        super().__init__(RegexPattern(r'^'), [pattern for router in self.routers for pattern in router.urls])
+
+    def resolve(self, path):
+        path = str(path)
+        tried = []
+        for pattern in self.model_patterns.get(path.split('/', 1)[0], ()):
+            match = pattern.resolve(path)
+            if match:
+                return match  # 无前缀/命名空间, 由上级resolver合并
+            tried.append([pattern])
+        raise Resolver404({'tried': tried, 'path': path})
+
+
+def get_model_list(models):
+    # models模块中所有(非抽象)模型, 或model列表/单个model
     if hasattr(models, '_meta'):
-        models = [models]
-    else:
-        models = models or f_locals.get('models') or get_models(f_locals)
-    urlpatterns = urlpatterns or f_locals['urlpatterns']  # 未提供则自动从urls.loacls()中取
-
-    logger.debug(f"{f_locals.get('__name__')} 自动路由...")
+        return [models]
+    if isinstance(models, (list, tuple, set)):
+        return list(models)
+    model_list = []
     for attr in dir(models):
         if attr.startswith('_'):
             continue
         model = getattr(models, attr)
         if hasattr(model, '_meta') and not model._meta.abstract:
+            model_list.append(model)
+    return model_list
+
+
+def add_router_for_all_models(models=None, urlpatterns=None, args=0b11111, app_router=None, **kwargs):
+    '''
+    自动为models模块中所有的模型创建urls/views.
+    app_router: 所有model只注册一个url项 (AppRouter), 为None时使用 conf.ROUTER_APP_ROUTER
+    '''
+    f_locals = sys._getframe().f_back.f_locals
+    if not hasattr(models, '_meta'):
+        models = models or f_locals.get('models') or get_models(f_locals)
+    if urlpatterns is None:
+        urlpatterns = f_locals['urlpatterns']  # 未提供则自动从urls.loacls()中取
+    if app_router is None:
+        app_router = conf.ROUTER_APP_ROUTER
+
+    logger.debug(f"{f_locals.get('__name__')} 自动路由...")
+    start = time.perf_counter()
+    model_list = get_model_list(models)
+    if app_router:
+        urlpatterns.append(AppRouter(model_list, args, **kwargs))
+    else:
+        for model in model_list:
             # 自动生成model的url和视图
             urlpatterns.extend(MyRouter(model, args, **kwargs))
+    logger.info(
+        f"{f_locals.get('__name__')} 自动路由: {len(model_list)}个model, "
+        f"耗时{(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+
+
+def get_router_report():
+    # 各app自动路由耗时报表, 参考 manage.py router_timing
+    lines = [f'{"app":<24} {"model":>6} {"url":>6} {"路由ms":>9} {"视图":>6} {"视图ms":>9}']
+    for app_label, timing in sorted(router_timings.items(), key=lambda item: -item[1]['time']):
+        lines.append(
+            f'{app_label:<24} {timing["models"]:>6} {timing["urls"]:>6} {timing["time"] * 1000:>9.1f} '
+            f'{timing["views"]:>6} {timing["view_time"] * 1000:>9.1f}'
+        )
+    return '\n'.join(lines)
 
 
 def get_models(f_locals):
@@ -188,4 +327,12 @@ urlpatterns = [
 ]
 add_router_for_all_models()
 
+
+# model很多时, 一个app的自动路由只注册一个url项, 按model名分发 (reverse()使用的url名称不变)
+
+urlpatterns = [
+    ...
+    AppRouter(models, lazy=True),
+]
+
 '''
@@ -0,0 +1,379 @@
+# coding=utf-8
+'''
+列表页搜索后端 (QueryListView.search_backend), 用于 filter_fields 多字段搜索
+
+    None/'icontains': 各字段 icontains 模糊查询, 逻辑或 (默认, 无需索引, 大表为全表扫描)
+    'postgres': PostgreSQL 全文检索, 本表字符串字段建 tsvector GIN表达式索引
+    'postgres_trgm': PostgreSQL pg_trgm 三元组GIN索引, 查询仍为icontains (索引自动生效), 支持关联表字段
+    'sqlite_fts5': SQLite FTS5 全文检索虚拟表 (默认trigram分词, 支持中文子串), 触发器自动维护
+
+全文检索只处理本表的字符串字段 (CharField/TextField), 关联表字段 x2o__xx 等仍使用icontains, 逻辑或合并.
+数据库类型不符或索引未建立时, 自动使用icontains.
+
+多值关联字段 (反向外键/多对多, 比如 tags__name) 的查询条件转为 EXISTS 子查询 (get_lookup_q),
+主查询不JOIN多值关联表, 每个obj一行, 无重复数据, 无需DISTINCT, COUNT/分页不受关联表数据量影响.
+
+索引建立/维护, 使用管理命令:
+    python manage.py search_index app_label.views.XxxList [--rebuild] [--drop]
+'''
+import hashlib
+import logging
+import time
+
+import django
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from . import conf
+
+logger = logging.getLogger()
+
+_index_tables = {}  # 全文检索表是否存在 {(db, table): (True/False, 检查时间)}
+
+
+class IcontainsSearch:
+    '''各字段 icontains 模糊查询, 逻辑或'''
+    vendor = None  # 支持的数据库类型, None表示不限
+
+    def search(self, view, queryset, fields, s):
+        return queryset.filter(self.get_q(view, queryset, fields, s))
+
+    def get_q(self, view, queryset, fields, s):
+        q = models.Q()
+        for field in fields:
+            q |= get_lookup_q(queryset.model, f'{field}__icontains', s)
+        return q
+
+    def build_index(self, view, using=None, rebuild=False, drop=False, stdout=None):
+        # 建立/维护索引, icontains无需索引
+        self.log(stdout, f'{type(self).__name__} 无需建立索引')
+
+    def log(self, stdout, msg):
+        if stdout:
+            stdout.write(msg)
+        else:
+            logger.info(msg)
+
+
+class FullTextSearch(IcontainsSearch):
+    '''
+    全文检索基类, 本表字符串字段使用全文检索, 其余字段使用icontains
+    '''
+
+    def search(self, view, queryset, fields, s):
+        connection = connections[queryset.db]
+        if connection.vendor != self.vendor:
+            return super().search(view, queryset, fields, s)
+
+        model = queryset.model
+        index_columns = self.get_index_columns(view)
+        columns, others = [], []  # 全文检索字段 / 其它使用icontains的字段
+        for field_path in fields:
+            field = self.get_local_field(model, field_path)
+            if field and field.column in index_columns:
+                columns.append(field.column)
+            else:
+                others.append(field_path)
+        if not columns or not self.can_search(connection, model, s):
+            return super().search(view, queryset, fields, s)
+
+        q = models.Q(pk__in=self.get_search_sql(connection, model, columns, index_columns, s))
+        if others:
+            q |= self.get_q(view, queryset, others, s)
+        return queryset.filter(q)
+
+    def can_search(self, connection, model, s):
+        return True
+
+    def get_search_sql(self, connection, model, columns, index_columns, s):
+        # 返回 RawSQL, 查询匹配的主键
+        raise NotImplementedError
+
+    def get_index_columns(self, view):
+        # 全文检索索引字段, 为filter_fields中本表的字符串字段
+        model = view.model or view.queryset.model
+        return [field.column for field in self.get_local_fields(model, view.fields_plan.filter_fields)]
+
+    def get_local_fields(self, model, fields):
+        return [field for field in (self.get_local_field(model, f) for f in fields) if field]
+
+    def get_local_field(self, model, field_path):
+        if '__' in field_path:
+            return
+        try:
+            field = model._meta.get_field(field_path)
+        except Exception:
+            return
+        if isinstance(field, (models.CharField, models.TextField)):
+            return field
+
+
+class PostgresSearch(FullTextSearch):
+    '''
+    PostgreSQL 全文检索: to_tsvector(本表各字符串字段拼接) @@ plainto_tsquery(s)
+    索引为相同表达式的GIN索引, 数据库自动维护.
+    中文分词需安装zhparser等扩展并配置 conf.SEARCH_PG_CONFIG.
+    '''
+    vendor = 'postgresql'
+    config = conf.SEARCH_PG_CONFIG
+
+    def get_tsvector_sql(self, connection, columns):
+        qn = connection.ops.quote_name
+        text = " || ' ' || ".join(f"coalesce({qn(column)}::text, '')" for column in columns)
+        return f"to_tsvector('{self.config}', {text})"
+
+    def get_search_sql(self, connection, model, columns, index_columns, s):
+        qn = connection.ops.quote_name
+        # 使用索引字段表达式, 与GIN索引表达式一致才能使用索引
+        return RawSQL(
+            f'SELECT {qn(model._meta.pk.column)} FROM {qn(model._meta.db_table)} '
+            f"WHERE {self.get_tsvector_sql(connection, index_columns)} @@ plainto_tsquery('{self.config}', %s)",
+            [s]
+        )
+
+    def build_index(self, view, using=None, rebuild=False, drop=False, stdout=None):
+        model = view.model or view.queryset.model
+        connection = connections[using or 'default']
+        columns = self.get_index_columns(view)
+        table = model._meta.db_table
+        name = get_index_name('fts', table, *columns)
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if rebuild or drop:
+                cursor.execute(f'DROP INDEX IF EXISTS {qn(name)}')
+                self.log(stdout, f'删除索引 {name}')
+            if drop or not columns:
+                return
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {qn(name)} ON {qn(table)} '
+                f'USING gin ({self.get_tsvector_sql(connection, columns)})'
+            )
+        self.log(stdout, f'全文检索索引 {name}: {table}({", ".join(columns)})')
+
+
+class PostgresTrigramSearch(IcontainsSearch):
+    '''
+    PostgreSQL pg_trgm 三元组索引, icontains查询 UPPER(字段::text) LIKE UPPER('%s%') 可直接使用索引,
+    filter_fields 中的关联表字段也会在关联表上建立索引.
+    '''
+    vendor = 'postgresql'
+
+    def build_index(self, view, using=None, rebuild=False, drop=False, stdout=None):
+        model = view.model or view.queryset.model
+        connection = connections[using or 'default']
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if not drop:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for field_path in view.fields_plan.filter_fields:
+                field = get_path_field(model, field_path)
+                if not field or not field.concrete or not field.column:
+                    self.log(stdout, f'字段 {field_path} 非数据库字段, 忽略')
+                    continue
+                table = field.model._meta.db_table
+                name = get_index_name('trgm', table, field.column)
+                if rebuild or drop:
+                    cursor.execute(f'DROP INDEX IF EXISTS {qn(name)}')
+                    self.log(stdout, f'删除索引 {name}')
+                if drop:
+                    continue
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {qn(name)} ON {qn(table)} '
+                    f'USING gin ((UPPER({qn(field.column)}::text)) gin_trgm_ops)'
+                )
+                self.log(stdout, f'三元组索引 {name}: {table}({field.column})')
+
+
+class SqliteFTS5Search(FullTextSearch):
+    '''
+    SQLite FTS5 全文检索, 外部内容表(content=本表), 本表增删改由触发器同步到FTS表.
+    默认使用trigram分词 (SQLite 3.34+), 查询相当于各字段子串匹配, 支持中文, 搜索词少于3个字符时使用icontains.
+    要求本表主键为整数 (rowid).
+    '''
+    vendor = 'sqlite'
+    tokenize = conf.SEARCH_SQLITE_TOKENIZE
+    check_interval = conf.SEARCH_INDEX_CHECK_INTERVAL  # 检查结果缓存秒数, 管理命令建立索引后运行中的进程按此间隔生效
+
+    def get_fts_table(self, model):
+        return f'{model._meta.db_table}_fts'
+
+    def can_search(self, connection, model, s):
+        if self.tokenize.startswith('trigram') and len(s) < 3:
+            return False
+        table = self.get_fts_table(model)
+        key = (connection.alias, table)
+        exists, checked = _index_tables.get(key, (None, 0))
+        now = time.monotonic()
+        if exists is None or now - checked >= self.check_interval:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=%s", [table])
+                found = bool(cursor.fetchone())
+            if not found and exists is not False:
+                logger.warning(f'全文检索表 {table} 不存在, 使用icontains搜索, 请执行管理命令 search_index 建立')
+            exists = found
+            _index_tables[key] = (exists, now)
+        return exists
+
+    def get_search_sql(self, connection, model, columns, index_columns, s):
+        qn = connection.ops.quote_name
+        fts_table = self.get_fts_table(model)
+        match = '{%s} : "%s"' % (' '.join(columns), s.replace('"', '""'))  # 整个搜索词作为一个短语
+        return RawSQL(f'SELECT rowid FROM {qn(fts_table)} WHERE {qn(fts_table)} MATCH %s', [match])
+
+    def build_index(self, view, using=None, rebuild=False, drop=False, stdout=None):
+        model = view.model or view.queryset.model
+        connection = connections[using or 'default']
+        qn = connection.ops.quote_name
+        table = model._meta.db_table
+        fts_table = self.get_fts_table(model)
+        pk = model._meta.pk.column
+        columns = self.get_index_columns(view)
+        cols = ', '.join(qn(c) for c in columns)
+        new_cols = ', '.join(f'new.{qn(c)}' for c in columns)
+        old_cols = ', '.join(f'old.{qn(c)}' for c in columns)
+        with connection.cursor() as cursor:
+            if rebuild or drop:
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {qn(f"{fts_table}_{suffix}")}')
+                cursor.execute(f'DROP TABLE IF EXISTS {qn(fts_table)}')
+                self.log(stdout, f'删除全文检索表 {fts_table}')
+            _index_tables.pop((connection.alias, fts_table), None)
+            if drop or not columns:
+                return
+
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {qn(fts_table)} USING fts5('
+                f"{cols}, content='{table}', content_rowid='{pk}', tokenize='{self.tokenize}')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {qn(f"{fts_table}_ai")} AFTER INSERT ON {qn(table)} BEGIN '
+                f'INSERT INTO {qn(fts_table)}(rowid, {cols}) VALUES (new.{qn(pk)}, {new_cols}); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {qn(f"{fts_table}_ad")} AFTER DELETE ON {qn(table)} BEGIN '
+                f"INSERT INTO {qn(fts_table)}({qn(fts_table)}, rowid, {cols}) VALUES ('delete', old.{qn(pk)}, {old_cols}); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {qn(f"{fts_table}_au")} AFTER UPDATE ON {qn(table)} BEGIN '
+                f"INSERT INTO {qn(fts_table)}({qn(fts_table)}, rowid, {cols}) VALUES ('delete', old.{qn(pk)}, {old_cols}); "
+                f'INSERT INTO {qn(fts_table)}(rowid, {cols}) VALUES (new.{qn(pk)}, {new_cols}); END'
+            )
+            cursor.execute(f"INSERT INTO {qn(fts_table)}({qn(fts_table)}) VALUES ('rebuild')")
+        self.log(stdout, f'全文检索表 {fts_table}: {table}({", ".join(columns)})')
+
+
+def get_path_field(model, field_path):
+    # 字段路径 xx__xx 最终对应的字段
+    field = None
+    for field_name in field_path.split('__'):
+        if field is not None:
+            if not field.related_model:
+                return
+            model = field.related_model
+        try:
+            field = model._meta.get_field(model._meta.pk.name if field_name == 'pk' else field_name)
+        except Exception:
+            return
+    return field
+
+
+def split_multi_valued(model, lookup):
+    '''
+    拆分查询路径, 在第一个多值关联字段(反向外键/多对多)处拆开,
+    返回 (前段x2o路径字段名列表, 多值关联字段, 后段路径字段名列表), 路径中无多值关联字段则返回None
+    比如 publisher__books__tags__name: (['publisher'], books, ['tags', 'name'])
+    '''
+    field_names = lookup.split('__')
+    opts = model._meta
+    for i, field_name in enumerate(field_names):
+        try:
+            field = opts.get_field(opts.pk.name if field_name == 'pk' else field_name)
+        except FieldDoesNotExist:
+            return  # 查询类型 (icontains/in等) 或不存在的字段
+        if not field.is_relation or not field.related_model:
+            return
+        if field.many_to_many or field.one_to_many:
+            if isinstance(field, (models.ManyToManyField, models.ManyToManyRel, models.ManyToOneRel)):
+                return field_names[:i], field, field_names[i + 1:]
+            return  # GenericRelation等, 仍使用JOIN查询
+        opts = field.related_model._meta
+
+
+def get_multi_valued_source(field):
+    '''
+    多值关联字段的子查询表, 返回 (子查询model, 子查询表中关联当前表的外键, 子查询表中关联目标表的外键名称)
+        反向外键: 关联表本身, 关联表外键 = 当前表被关联字段, 无目标表外键(None)
+        多对多: 中间表 (through), 不JOIN目标表本身, 目标表字段条件由中间表外键关联
+    '''
+    if isinstance(field, models.ManyToOneRel):
+        return field.related_model, field.field, None
+
+    m2m = field if isinstance(field, models.ManyToManyField) else field.field
+    sub_model = m2m.remote_field.through
+    if m2m is field:
+        source_name, target_name = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+    else:
+        source_name, target_name = m2m.m2m_reverse_field_name(), m2m.m2m_field_name()
+    return sub_model, sub_model._meta.get_field(source_name), target_name
+
+
+def get_lookup_q(model, lookup, value):
+    '''
+    查询条件 Q(lookup=value), 路径中有多值关联字段时, 转为关联表 EXISTS 子查询:
+        Q(tags__name__icontains=s) 相当于
+        Q(Exists(Book.tags.through.objects.filter(book_id=OuterRef('id'), tag__name__icontains=s)))
+    多值关联表可多层嵌套, 子查询中递归转换.
+    isnull=True 同JOIN (LEFT JOIN 无关联数据时也为NULL), 另外包含没有关联数据的:
+        Q(tags__isnull=True) 相当于 ~Exists(无条件子查询), Q(tags__name__isnull=True) 为 Exists(...) | ~Exists(...)
+    django 3.0以前版本 filter() 不支持Exists表达式, 仍使用JOIN查询.
+    '''
+    split = django.VERSION >= (3, 0) and split_multi_valued(model, lookup)
+    if not split:
+        return models.Q(**{lookup: value})
+
+    prefix, field, field_names = split
+    sub_model, source, target_name = get_multi_valued_source(field)
+    if target_name:
+        field_names = [target_name, *field_names]
+
+    if not field_names:
+        field_names = ['pk']
+    else:
+        try:
+            sub_model._meta.get_field(field_names[0])
+        except FieldDoesNotExist:
+            if field_names[0] != 'pk':
+                field_names = ['pk', *field_names]  # 关联表主键的查询类型, 比如 books__in=[1, 2]
+
+    outer_ref = models.OuterRef('__'.join([*prefix, source.target_field.attname]))
+    related = sub_model._base_manager.filter(**{source.attname: outer_ref})
+    subquery = related.filter(get_lookup_q(sub_model, '__'.join(field_names), value))
+    q = models.Q(models.Exists(subquery.values('pk')))
+    if field_names[-1] == 'isnull' and value:
+        q |= ~models.Q(models.Exists(related.values('pk')))
+    return q
+
+
+def get_index_name(*args):
+    digest = hashlib.md5('.'.join(args).encode()).hexdigest()[:10]
+    return f'generic_{args[0]}_{digest}'
+
+
+BACKENDS = {
+    None: IcontainsSearch,
+    'icontains': IcontainsSearch,
+    'postgres': PostgresSearch,
+    'postgres_trgm': PostgresTrigramSearch,
+    'sqlite_fts5': SqliteFTS5Search,
+}
+
+
+def get_search_backend(backend):
+    # backend: 名称/类/实例/类的导入路径
+    if isinstance(backend, str) or backend is None:
+        backend = BACKENDS.get(backend) or import_string(backend)
+    if isinstance(backend, type):
+        backend = backend()
+    return backend
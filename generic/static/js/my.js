@@ -39,7 +39,10 @@ function DeleteObj(that, id, url) {
                 data: data,
                 success: function (res) {
                     // console.log(res);
-                    if (res.status) {
+                    if (res.status && res.task) {
+                        // 删除条数较多, 后台删除, 轮询进度
+                        DeleteProgress(url, res.task);
+                    } else if (res.status) {
                         swal({ 
                             title: "删除成功",
                             type: 'success',
@@ -68,6 +71,37 @@ function DeleteObj(that, id, url) {
 }
 
 
+function DeleteProgress(url, task) {
+    // 查询后台删除任务进度, 完成后刷新页面
+    $.get(url, {task: task}, function (res) {
+        if (! res.finished) {
+            swal({
+                title: '正在删除 ' + res.done + ' / ' + res.total,
+                type: 'info',
+                position: 'top',
+                toast: true,
+                showConfirmButton: false
+            });
+            setTimeout(function () { DeleteProgress(url, task) }, 1000);
+        } else if (res.status) {
+            swal({
+                title: '删除成功 ' + res.deleted + '条',
+                type: 'success',
+                position: 'top',
+                timer: 3000,
+                toast: true,
+                showConfirmButton: false
+            });
+            setTimeout('location.reload()', 2000);
+        } else {
+            swal('删除出错', '已删除' + res.deleted + '条, ' + res.error, "error");
+        }
+    }).fail(function (error) {
+        swal('删除进度查询失败', "HTTP: " + error.status, "error");
+    });
+}
+
+
 // function getUrlParam(name) {
 //     //解析当前URL参数，getUrlParam(参数名)
 //     var reg = new RegExp("(^|&)" + name + "=([^&]*)(&|$)"); 
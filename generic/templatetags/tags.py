@@ -4,6 +4,7 @@
 import logging
 from django import template
 from generic.views import lookup_val
+from generic.cache import get_cache
 register = template.Library()
 logger = logging.getLogger()
 
@@ -25,6 +26,38 @@ def add(*args):
 register.filter(lookup_val)  # 列表页获取 object.field_name
 
 
+class PageCacheNode(template.Node):
+    def __init__(self, nodelist, name):
+        self.nodelist = nodelist
+        self.name = name
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        fragments = context.get('page_cache_fragments')
+        if fragments and name in fragments:
+            return fragments[name]
+        html = self.nodelist.render(context)
+        view = context.get('view')
+        key = getattr(view, 'page_cache_key', None)
+        if key:
+            get_cache().set(f'{key}:{name}', html, view.page_cache_timeout)
+        return html
+
+
+@register.tag
+def pagecache(parser, token):
+    '''
+    页面内容缓存片段 {% pagecache "content" %}...{% endpagecache %}, 视图 page_cache 开启时有效, 参考 cache.PageCacheMixin
+    缓存命中时直接输出缓存内容, 否则渲染后存入缓存.
+    '''
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' 需要一个参数: 片段名称")
+    nodelist = parser.parse(('endpagecache',))
+    parser.delete_first_token()
+    return PageCacheNode(nodelist, parser.compile_filter(bits[1]))
+
+
 # @register.simple_tag
 # def get_attr(obj, *args):
 #     # 模板标签 getattr
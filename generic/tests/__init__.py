@@ -0,0 +1,7 @@
+# coding=utf-8
+'''
+通用视图测试, 使用基准测试的模型 (benchmarks/bench) 及内存数据库
+
+    python -m generic.tests            # django测试运行器
+    python -m pytest generic/tests     # pytest (conftest.py 配置django)
+'''
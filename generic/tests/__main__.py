@@ -0,0 +1,18 @@
+# coding=utf-8
+import sys
+
+from django.test.utils import get_runner
+from django.conf import settings
+
+from benchmarks.settings import configure
+
+
+def main():
+    configure()
+    runner = get_runner(settings)(verbosity=2)
+    failures = runner.run_tests(['generic.tests'])
+    sys.exit(bool(failures))
+
+
+if __name__ == '__main__':
+    main()
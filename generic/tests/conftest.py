@@ -0,0 +1,14 @@
+# coding=utf-8
+'''
+pytest: 使用基准测试的django配置, 内存数据库建表 (测试用例为 django TestCase, 每个用例事务回滚)
+'''
+from django.conf import settings
+
+
+def pytest_configure(config):
+    if settings.configured:
+        return
+    from django.core.management import call_command
+    from benchmarks.settings import configure
+    configure()
+    call_command('migrate', run_syncdb=True, verbosity=0)
@@ -0,0 +1,61 @@
+# coding=utf-8
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from benchmarks.bench import models
+from generic import bulkupdate
+
+
+class BulkUpdaterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        country = models.Country.objects.create(name='国家')
+        cls.publisher = models.Publisher.objects.create(name='出版社', country=country)
+        cls.other = models.Publisher.objects.create(name='其它出版社', country=country)
+        cls.books = [
+            models.Book.objects.create(title=f'书{i}', publisher=cls.publisher, active=bool(i % 2)) for i in range(5)
+        ]
+        cls.old = timezone.now() - datetime.timedelta(days=1)
+        models.Book.objects.update(updated=cls.old)
+        cls.pks = [book.pk for book in cls.books]
+
+    def test_fast_update(self):
+        # 一条UPDATE, 不查询obj, auto_now字段同时更新
+        with self.assertNumQueries(3):  # SAVEPOINT + UPDATE + RELEASE
+            status = bulkupdate.BulkUpdater(models.Book, self.pks[:3], {'status': 2}).run().get_status()
+        self.assertEqual(status, {'status': True, 'error': '', 'total': 3, 'updated': 3})
+        self.assertEqual(list(models.Book.objects.filter(status=2).values_list('pk', flat=True).order_by('pk')),
+                         self.pks[:3])
+        self.assertFalse(models.Book.objects.filter(pk__in=self.pks[:3], updated=self.old).exists())
+        self.assertEqual(models.Book.objects.filter(updated=self.old).count(), 2)
+
+    def test_chunks(self):
+        updater = bulkupdate.BulkUpdater(models.Book, self.pks, {'publisher': self.other}, chunk_size=2).run()
+        self.assertEqual(updater.updated, 5)
+        self.assertEqual(models.Book.objects.filter(publisher=self.other).count(), 5)
+
+    def test_update_object(self):
+        # 逐条处理: 查出obj, bulk_update写回修改字段
+        def update_object(obj, values):
+            obj.title = f'{values["title"]}-{obj.pk}'
+
+        updater = bulkupdate.BulkUpdater(models.Book, self.pks[:2], {'title': '新'}, update_object=update_object)
+        self.assertEqual(updater.run().updated, 2)
+        self.assertEqual(
+            list(models.Book.objects.filter(pk__in=self.pks[:2]).values_list('title', flat=True).order_by('pk')),
+            [f'新-{pk}' for pk in self.pks[:2]]
+        )
+
+    def test_queryset_scope(self):
+        queryset = models.Book.objects.filter(active=True)
+        self.assertEqual(bulkupdate.BulkUpdater(models.Book, self.pks, {'status': 1}, queryset=queryset).run().updated, 2)
+        self.assertEqual(set(models.Book.objects.filter(status=1).values_list('active', flat=True)), {True})
+
+    def test_error_rollback(self):
+        updater = bulkupdate.BulkUpdater(models.Book, [*self.pks, 'x'], {'status': 1}, chunk_size=2).run()
+        self.assertTrue(updater.error)
+        self.assertEqual(updater.updated, 0)
+        self.assertFalse(models.Book.objects.filter(status=1).exists())
@@ -0,0 +1,59 @@
+# coding=utf-8
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+
+from benchmarks.bench import models
+from generic import views
+
+
+class X2mPreviewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        country = models.Country.objects.create(name='国家')
+        publisher = models.Publisher.objects.create(name='出版社', country=country)
+        for i in range(6):
+            book = models.Book.objects.create(title=f'书{i}', publisher=publisher)
+            models.Chapter.objects.bulk_create(models.Chapter(book=book, name=f'章{i}-{j}') for j in range(i))
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def get_view(self, **attrs):
+        attrs = {
+            'model': models.Book, 'model_meta': models.Book._meta,
+            'list_fields': ['title', 'chapter'], 'x2m_preview': 2, **attrs
+        }
+        view = type('BookList', (views.MyListView, ), attrs)()
+        request = RequestFactory().get('/')
+        request.user = self.user
+        view.setup(request)
+        return view
+
+    def get_cells(self, view):
+        return [row.cells[1] for row in view.get_object_rows(view.get_queryset().order_by('pk'))]
+
+    def test_prefetch(self):
+        # 当前页查出后统一prefetch, 查询条数与行数无关
+        with self.assertNumQueries(3):  # 列表 + 预览 + 条数统计(或prefetch全部关联数据)
+            cells = self.get_cells(self.get_view())
+        self.assertEqual(cells[0], '')
+        self.assertEqual(cells[2], '章2-0<br/>章2-1')
+        self.assertIn('+3', cells[5])
+        self.assertIn('共5条', cells[5])
+
+    def test_no_prefetch(self):
+        # 未开启SQL优化时每行只查询预览数据(多查一条判断是否还有), 不再逐行COUNT
+        view = self.get_view(optimize_sql=False)
+        with self.assertNumQueries(1 + 6):
+            cells = self.get_cells(view)
+        self.assertEqual(cells[2], '章2-0<br/>章2-1')
+        self.assertNotIn('+', cells[2])
+        self.assertIn('+...', cells[5])
+        self.assertNotIn('共', cells[5])
+
+    def test_export(self):
+        # 导出不限预览条数, 反向外键按 xxx_set prefetch
+        view = self.get_view()
+        with self.assertNumQueries(2):
+            rows = list(view.iter_export_rows(view.get_queryset().order_by('pk')))
+        self.assertEqual(len(rows), 6)
+        self.assertIn('章5-4', str(rows[5][1]))
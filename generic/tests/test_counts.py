@@ -0,0 +1,95 @@
+# coding=utf-8
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+
+from benchmarks.bench import models
+from generic import counts
+from generic import paginator
+from generic import views
+
+
+class FixedCount(counts.ExactCount):
+    # 固定的估算条数
+    def __init__(self, estimate):
+        self.estimate = estimate
+
+    def count(self, view, queryset):
+        return self.estimate, True
+
+
+class CountStrategyTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        country = models.Country.objects.create(name='国家')
+        publisher = models.Publisher.objects.create(name='出版社', country=country)
+        for i in range(25):
+            models.Book.objects.create(title=f'书{i}', publisher=publisher)
+
+    def get_view(self, **attrs):
+        view = type('BookList', (views.MyListView, ), {'model': models.Book, 'list_fields': ['title'], **attrs})()
+        view.setup(RequestFactory().get('/'))
+        return view
+
+    def test_exact(self):
+        queryset = models.Book.objects.all()
+        self.assertEqual(counts.ExactCount().count(self.get_view(), queryset), (25, False))
+
+    def test_list_object_list(self):
+        # object_list为list时同django Paginator, 使用len()
+        view = self.get_view()
+        self.assertEqual(view.get_queryset_count([1, 2, 3]), (3, False))
+        page_paginator = view.get_paginator(list(range(45)), 20)
+        self.assertEqual((page_paginator.count, page_paginator.num_pages), (45, 3))
+
+    def test_cached(self):
+        view = self.get_view()
+        queryset = models.Book.objects.filter(title__startswith='书')
+        strategy = counts.CachedCount()
+        self.assertEqual(strategy.count(view, queryset), (25, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(strategy.count(view, queryset), (25, False))
+
+        models.Book.objects.first().delete()  # 数据变化, 版本号递增, 缓存失效
+        self.assertEqual(strategy.count(view, queryset), (24, False))
+        self.assertEqual(strategy.count(view, models.Book.objects.filter(title='书1')), (1, False))
+
+    def test_estimate_fallback(self):
+        # 非PostgreSQL使用精确计数
+        self.assertEqual(counts.EstimatedCount().count(self.get_view(), models.Book.objects.all()), (25, False))
+
+    def test_estimate_past_last_page(self):
+        # 估算条数多于实际条数, 页码超出实际尾页时显示实际尾页
+        view = self.get_view(count_strategy=FixedCount(100))
+        page_paginator = view.get_paginator(models.Book.objects.order_by('pk'), 10)
+        self.assertEqual((page_paginator.num_pages, page_paginator.count_estimated), (10, True))
+        page = page_paginator.page(7)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page.object_list), 5)
+        self.assertEqual((page_paginator.count, page_paginator.num_pages), (25, 3))
+        self.assertFalse(page_paginator.count_estimated)
+
+    def test_estimate_below_real_count(self):
+        # 估算条数少于实际条数, 超出估算页数的页码仍有效
+        view = self.get_view(count_strategy=FixedCount(5))
+        page_paginator = view.get_paginator(models.Book.objects.order_by('pk'), 10)
+        page = page_paginator.page(3)
+        self.assertEqual((page.number, len(page.object_list), page_paginator.num_pages), (3, 5, 3))
+
+    def test_estimate_in_range(self):
+        view = self.get_view(count_strategy=FixedCount(30))
+        page = view.get_paginator(models.Book.objects.order_by('pk'), 10).page(2)
+        self.assertEqual((page.number, page.paginator.count_estimated), (2, True))
+        with self.assertRaises(paginator.EmptyPage):
+            view.get_paginator(models.Book.objects.order_by('pk'), 10).page(9)
+
+    def test_estimate_view_last_page(self):
+        view = type('BookList', (views.MyListView, ), {
+            'model': models.Book, 'list_fields': ['title'], 'js_table_server': False, 'paginate_by': 10,
+            'count_strategy': FixedCount(100), 'queryset': models.Book.objects.order_by('pk'),
+        })
+        request = RequestFactory().get('/', {'page': 'last'})
+        request.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        response = view.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context_data['page_obj'].number, len(response.context_data['object_rows'])), (3, 5))
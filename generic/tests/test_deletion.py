@@ -0,0 +1,74 @@
+# coding=utf-8
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+
+from benchmarks.bench import models
+from generic import conf
+from generic import deletion
+from generic import views
+
+
+class BulkDeleterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        country = models.Country.objects.create(name='国家')
+        publisher = models.Publisher.objects.create(name='出版社', country=country)
+        cls.books = [
+            models.Book.objects.create(title=f'书{i}', publisher=publisher, active=bool(i % 2)) for i in range(7)
+        ]
+        for book in cls.books:
+            models.Chapter.objects.create(book=book, name='第1章')
+
+    def test_fast_delete(self):
+        # 章节无级联删除/信号, 不查询obj直接删除, 每批一条DELETE
+        pks = list(models.Chapter.objects.values_list('pk', flat=True)[:5])
+        deleter = deletion.BulkDeleter(models.Chapter, pks + pks[:1], chunk_size=2)
+        self.assertTrue(deleter.can_fast_delete())
+        self.assertEqual(deleter.total, 5)  # 去重
+        with self.assertNumQueries(3 * 3):  # 3批, 每批一个事务: SAVEPOINT + DELETE + RELEASE
+            status = deleter.run().get_status()
+        self.assertEqual(status, {'status': True, 'error': '', 'total': 5, 'done': 5, 'deleted': 5})
+        self.assertEqual(models.Chapter.objects.count(), 2)
+
+    def test_cascade_delete(self):
+        pks = [book.pk for book in self.books[:3]]
+        deleter = deletion.BulkDeleter(models.Book, pks, chunk_size=2)
+        self.assertFalse(deleter.can_fast_delete())
+        self.assertEqual(deleter.run().deleted, 3)
+        self.assertFalse(models.Book.objects.filter(pk__in=pks).exists())
+        self.assertFalse(models.Chapter.objects.filter(book_id__in=pks).exists())
+
+    def test_queryset_scope(self):
+        # 只删除queryset范围内的数据, 范围外的主键忽略
+        pks = [book.pk for book in self.books]
+        deleter = deletion.BulkDeleter(models.Book, pks, queryset=models.Book.objects.filter(active=True))
+        self.assertEqual(deleter.run().deleted, 3)
+        self.assertEqual(set(models.Book.objects.values_list('active', flat=True)), {False})
+
+    def test_error(self):
+        status = deletion.BulkDeleter(models.Book, ['x']).run().get_status()
+        self.assertFalse(status['status'])
+        self.assertTrue(status['error'])
+
+    def test_background_requires_shared_cache(self):
+        self.assertFalse(deletion.can_delete_in_background())  # 测试配置为locmem缓存
+        with mock.patch('generic.cache.is_shared_cache', return_value=True):
+            self.assertTrue(deletion.can_delete_in_background())
+            with mock.patch.object(conf, 'DELETE_WORKERS', 0):
+                self.assertFalse(deletion.can_delete_in_background())
+
+    def test_task_status(self):
+        deletion.set_task_status('t1', {'finished': False})
+        self.assertEqual(deletion.get_task_status('t1'), {'finished': False})
+        self.assertIsNone(deletion.get_task_status('t2'))
+
+    def test_view_sync_fallback(self):
+        # 达到后台删除条数, 但非共享缓存, 仍同步删除
+        view = type('BookDelete', (views.MyDeleteView, ), {'model': models.Book, 'delete_background_threshold': 1})
+        request = RequestFactory().post('/', {'id': [book.pk for book in self.books[:2]]})
+        request.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        response = view.as_view()(request)
+        self.assertJSONEqual(response.content, {'status': True, 'error': '', 'total': 2, 'done': 2, 'deleted': 2})
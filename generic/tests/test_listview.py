@@ -0,0 +1,60 @@
+# coding=utf-8
+from types import SimpleNamespace
+
+from django.test import RequestFactory, TestCase
+
+from benchmarks.bench import models
+from generic import listview
+from generic import views
+
+
+class BookList(views.MyListView):
+    model = models.Book
+    list_fields = ['title', 'chapter']
+
+
+class FieldsPlanTest(TestCase):
+    '''
+    字段方案按视图类及影响方案的配置缓存, as_view(**initkwargs) 修改的配置使用各自的方案
+    '''
+
+    def setUp(self):
+        listview.clear_fields_plans()
+        self.addCleanup(listview.clear_fields_plans)
+
+    def get_view(self, view_class=BookList, **initkwargs):
+        view = view_class(**initkwargs)
+        view.setup(RequestFactory().get('/'))
+        return view
+
+    def test_initkwargs(self):
+        preview = self.get_view(x2m_preview=2).fields_plan
+        self.assertEqual(list(preview.x2m_previews), ['chapter'])
+        self.assertEqual(self.get_view(x2m_preview=None).fields_plan.x2m_previews, {})
+        self.assertEqual(self.get_view(x2m_preview={'chapter': (2, 'name')}).fields_plan.x2m_previews['chapter'][:2], (2, 'name'))
+        self.assertIs(self.get_view(x2m_preview=2).fields_plan, preview)  # 配置相同, 使用缓存
+
+        self.assertNotEqual(
+            self.get_view(row_mode='values').get_fields_plan_key(), self.get_view(row_mode='objects').get_fields_plan_key()
+        )
+
+    def test_model(self):
+        # 同一视图类, 不同model (as_view(model=xx)/queryset)
+        view_class = type('NameList', (views.MyListView, ), {'model': models.Tag, 'list_fields': ['name']})
+        tag_field = self.get_view(view_class).fields_plan.list_fields[0][3]
+        country_plan = self.get_view(view_class, model=None, queryset=models.Country.objects.all()).fields_plan
+        self.assertIs(tag_field.model, models.Tag)
+        self.assertIs(country_plan.list_fields[0][3].model, models.Country)
+
+    def test_class_prepared(self):
+        # 模型重新加载时只清除使用该model(含关联model)的方案
+        tag_view = self.get_view(type('TagList', (views.MyListView, ), {'model': models.Tag, 'list_fields': ['name']}))
+        tag_plan = tag_view.fields_plan
+        book_plan = self.get_view().fields_plan
+        reloaded = SimpleNamespace(_meta=SimpleNamespace(label=models.Chapter._meta.label))
+        listview.clear_model_fields_plans(reloaded)
+        self.assertIs(self.get_view(tag_view.__class__).fields_plan, tag_plan)
+        self.assertIsNot(self.get_view().fields_plan, book_plan)
+
+        listview.clear_model_fields_plans(models.Tag)  # 当前model, 方案仍有效
+        self.assertIs(self.get_view(tag_view.__class__).fields_plan, tag_plan)
@@ -0,0 +1,93 @@
+# coding=utf-8
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+
+from benchmarks.bench import models
+from generic import paginator
+from generic import views
+
+
+class KeysetPaginatorTest(TestCase):
+    '''
+    游标分页, 按游标前后翻页遍历全部数据, 结果同 OFFSET 分页: 不重复, 不遗漏
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        country = models.Country.objects.create(name='国家')
+        publisher = models.Publisher.objects.create(name='出版社', country=country)
+        for i in range(23):
+            # 价格有重复值, 同价格按书名/主键区分
+            models.Book.objects.create(title=f'书{i % 5}', price=Decimal(i % 4) + Decimal('0.5'), publisher=publisher)
+
+    def get_paginator(self, ordering, per_page=5):
+        return paginator.KeysetPaginator(models.Book.objects.all(), per_page, ordering)
+
+    def walk(self, keyset_paginator):
+        # 向后翻到尾页, 再向前翻回首页, 返回 (向后各页, 向前各页)
+        forward = [keyset_paginator.page()]
+        while forward[-1].has_next():
+            forward.append(keyset_paginator.page(forward[-1].next_cursor))
+        backward = [forward[-1]]
+        while backward[-1].has_previous():
+            backward.append(keyset_paginator.page(backward[-1].previous_cursor))
+        return [[o.pk for o in page] for page in forward], [[o.pk for o in page] for page in backward]
+
+    def test_round_trip(self):
+        for ordering in (['pk'], ['-pk'], ['-price', 'title'], ['price', '-title', '-pk'], ['publisher__name', 'price']):
+            expected = list(models.Book.objects.order_by(*ordering, 'pk').values_list('pk', flat=True))
+            forward, backward = self.walk(self.get_paginator(ordering))
+            self.assertEqual(sum(forward, []), expected, ordering)
+            self.assertEqual(backward, forward[::-1], ordering)
+            self.assertEqual([len(page) for page in forward], [5, 5, 5, 5, 3], ordering)
+
+    def test_page_flags(self):
+        keyset_paginator = self.get_paginator(['-price', 'title'], per_page=10)
+        first = keyset_paginator.page()
+        self.assertEqual((first.has_previous(), first.has_next(), first.previous_cursor), (False, True, None))
+        second = keyset_paginator.page(first.next_cursor)
+        previous = keyset_paginator.page(second.previous_cursor)
+        self.assertEqual([o.pk for o in previous], [o.pk for o in first])
+        self.assertFalse(previous.has_previous())
+
+        last = keyset_paginator.page(keyset_paginator.page(second.next_cursor).previous_cursor)
+        self.assertEqual([o.pk for o in last], [o.pk for o in second])
+
+    def test_cursor(self):
+        keyset_paginator = self.get_paginator(['-price', 'title'])
+        book = models.Book.objects.order_by('pk').first()
+        cursor = keyset_paginator.encode_cursor(book)
+        self.assertNotIn('=', cursor)
+        previous, values = keyset_paginator.decode_cursor(cursor)
+        self.assertEqual((previous, Decimal(values[0]), values[1:]), (False, book.price, [book.title, book.pk]))
+        self.assertTrue(keyset_paginator.decode_cursor(keyset_paginator.encode_cursor(book, previous=True))[0])
+
+        for cursor in ('xxx', '!!', keyset_paginator.encode_cursor(book)[:-4], self.get_paginator(['pk']).encode_cursor(book)):
+            with self.assertRaises(paginator.InvalidCursor):
+                keyset_paginator.page(cursor)
+
+    def test_view(self):
+        view_class = type('BookList', (views.MyListView, ), {
+            'model': models.Book, 'list_fields': ['title'], 'js_table_server': False, 'paginate_by': 10,
+            'keyset_pagination': True, 'keyset_ordering': ['-price', 'title'],
+        })
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        pks, cursor = [], None
+        while True:
+            request = RequestFactory().get('/', {'cursor': cursor} if cursor else {})
+            request.user = user
+            response = view_class.as_view()(request)
+            page = response.context_data['page_obj']
+            pks += [row.object.pk for row in response.context_data['object_rows']]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        self.assertEqual(pks, list(models.Book.objects.order_by('-price', 'title', 'pk').values_list('pk', flat=True)))
+
+        request = RequestFactory().get('/', {'cursor': 'xxx'})
+        request.user = user
+        with self.assertRaises(Http404):
+            view_class.as_view()(request)
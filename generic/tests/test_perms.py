@@ -0,0 +1,57 @@
+# coding=utf-8
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.test import TestCase
+
+from benchmarks.bench import models
+from generic import conf
+from generic import perms
+
+
+class ModelPermsCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('perms', password='perms')
+        cls.view_perm = Permission.objects.get(codename='view_book')
+        cls.user.user_permissions.add(cls.view_perm)
+
+    def get_perms(self):
+        # 每次新的user对象, 相当于新的请求
+        return perms.get_model_perms(get_user_model().objects.get(pk=self.user.pk), models.Book)
+
+    def revoke_without_signal(self):
+        # 不发送m2m_changed信号, 比如其它进程修改 (本进程版本号不变)
+        through = get_user_model().user_permissions.through
+        through.objects.filter(user_id=self.user.pk, permission=self.view_perm)._raw_delete(through.objects.db)
+
+    def test_request_cache(self):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertTrue(perms.get_model_perms(user, models.Book)['view'])
+        self.revoke_without_signal()
+        self.assertTrue(perms.get_model_perms(user, models.Book)['view'])  # 同一请求内不重复计算
+        self.assertFalse(self.get_perms()['view'])
+
+    def test_local_cache_not_shared(self):
+        # 进程内存缓存不跨请求缓存, 权限撤销立即生效
+        with mock.patch.object(conf, 'GENERIC_PERMS_CACHE_TIMEOUT', 300):
+            self.assertEqual(perms.get_cache_timeout(), 0)
+            self.assertTrue(self.get_perms()['view'])
+            self.revoke_without_signal()
+            self.assertFalse(self.get_perms()['view'])
+
+    def test_shared_cache_invalidation(self):
+        with mock.patch.object(conf, 'GENERIC_PERMS_CACHE_TIMEOUT', 300), \
+                mock.patch('generic.cache.is_shared_cache', return_value=True):
+            self.assertTrue(self.get_perms()['view'])
+            self.assertFalse(self.get_perms()['change'])
+
+            self.user.user_permissions.add(Permission.objects.get(codename='change_book'))
+            self.assertTrue(self.get_perms()['change'])  # 信号使版本号递增, 缓存失效
+
+            self.revoke_without_signal()
+            self.assertTrue(self.get_perms()['view'])  # 无信号时使用缓存结果
+            perms.bump_perms_version(self.user.pk)
+            self.assertFalse(self.get_perms()['view'])
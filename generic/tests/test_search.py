@@ -0,0 +1,74 @@
+# coding=utf-8
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from benchmarks.bench import models
+from generic import search
+from generic.search import get_lookup_q
+
+
+class LookupQTest(TestCase):
+    '''
+    多值关联字段查询转为 EXISTS 子查询, 结果同JOIN查询 (去重后)
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        country = models.Country.objects.create(name='国家')
+        publisher = models.Publisher.objects.create(name='出版社', country=country)
+        cls.tag = models.Tag.objects.create(name='标签')
+        cls.tagged = models.Book.objects.create(title='有标签', publisher=publisher)
+        cls.tagged.tags.add(cls.tag)
+        models.Chapter.objects.create(book=cls.tagged, name='第1章')
+        cls.empty = models.Book.objects.create(title='无标签', publisher=publisher)
+        cls.empty_publisher = models.Publisher.objects.create(name='无书', country=country)
+
+    def assertSameResult(self, model, lookup, value):
+        expected = set(model.objects.filter(**{lookup: value}).values_list('pk', flat=True))
+        result = set(model.objects.filter(get_lookup_q(model, lookup, value)).values_list('pk', flat=True))
+        self.assertEqual(result, expected, f'{lookup}={value!r}')
+        return result
+
+    def test_x2m_lookup(self):
+        self.assertEqual(self.assertSameResult(models.Book, 'tags__name__icontains', '标'), {self.tagged.pk})
+        self.assertEqual(self.assertSameResult(models.Book, 'chapter__name', '第1章'), {self.tagged.pk})
+        self.assertEqual(self.assertSameResult(models.Book, 'tags__in', [self.tag.pk]), {self.tagged.pk})
+
+    def test_x2m_isnull(self):
+        for lookup in ('tags__isnull', 'chapter__isnull'):
+            self.assertEqual(self.assertSameResult(models.Book, lookup, True), {self.empty.pk})
+            self.assertEqual(self.assertSameResult(models.Book, lookup, False), {self.tagged.pk})
+
+    def test_nested_isnull(self):
+        # 关联数据不存在 或 关联数据字段为空
+        for value in (True, False):
+            self.assertSameResult(models.Book, 'tags__name__isnull', value)
+            self.assertSameResult(models.Publisher, 'book__tags__isnull', value)
+            self.assertSameResult(models.Tag, 'book__publisher__isnull', value)
+
+
+class SqliteFTS5IndexTest(TestCase):
+    '''
+    全文检索表是否存在的检查结果按间隔重新检查, 其它进程(管理命令)建立索引后无需重启
+    '''
+
+    def setUp(self):
+        search._index_tables.clear()
+        self.addCleanup(search._index_tables.clear)
+
+    def test_recheck(self):
+        backend = search.SqliteFTS5Search()
+        table = backend.get_fts_table(models.Book)
+        self.assertFalse(backend.can_search(connection, models.Book, '关键词'))
+
+        with connection.cursor() as cursor:  # 相当于其它进程执行 search_index
+            cursor.execute(f'CREATE TABLE {connection.ops.quote_name(table)} (x integer)')
+        with self.assertNumQueries(0):
+            self.assertFalse(backend.can_search(connection, models.Book, '关键词'))
+
+        later = time.monotonic() + backend.check_interval
+        with mock.patch('generic.search.time.monotonic', return_value=later):
+            self.assertTrue(backend.can_search(connection, models.Book, '关键词'))
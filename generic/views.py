@@ -2,10 +2,13 @@
 import logging
 
 from django.http import JsonResponse
-from django.views.generic import View, DetailView, CreateView, UpdateView
+from django import forms
+from django.db import models
+from django.views.generic import View, DetailView, CreateView, UpdateView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 # from django.db.models.constants import LOOKUP_SEP
 from django.urls import reverse_lazy
+from django.utils.functional import cached_property
 
 import traceback
 from django.db.models.fields import reverse_related
@@ -13,14 +16,22 @@ from django.db.models.fields import related
 
 from django.contrib.admin import utils
 from django.core.exceptions import ObjectDoesNotExist
-from django.utils.html import format_html
 
+from . import conf
 from . import listview
+from . import columns
+from . import export
+from . import deletion
+from . import bulkupdate
+from . import perms
+from . import cache
+from . import metrics
+from .columns import display_qs
 logger = logging.getLogger()
 
 __all__ = [
     'ModelMixin', 'MyCreateView', 'MyDeleteView', 'MyUpdateView', 'MyListView', 'MyDetailView',
-    'lookup_val'
+    'MyExportView', 'MyBulkUpdateView', 'lookup_val'
 
 ]
 
@@ -80,7 +91,7 @@ class ModelMixin(LoginRequiredMixin, PermissionRequiredMixin):
                 action = 'add'  # 增
             elif issubclass(cls, MyDeleteView):
                 action = 'delete'  # 删
-            elif issubclass(cls, UpdateView):
+            elif issubclass(cls, (UpdateView, MyBulkUpdateView)):
                 action = 'change'  # 改
             else:
                 action = 'view'  # 查
@@ -94,6 +105,10 @@ class ModelMixin(LoginRequiredMixin, PermissionRequiredMixin):
         view = super().as_view(*a, **k)
         return view
 
+    def has_permission(self):
+        # model增删改查权限使用缓存结果 (perms.py), 同一请求中列表页/模板等共用
+        return perms.has_perms(self.request.user, self.get_permission_required(), self.model)
+
 
 class MyModelFormMixin(ModelMixin):
 
@@ -125,18 +140,36 @@ class MyUpdateView(MyModelFormMixin, UpdateView):
 
 
 class MyDeleteView(ModelMixin, View):
-    '''批量删除model表数据'''
+    '''
+    批量删除model表数据, 分批删除, 每批一个事务, 参考deletion.py
+    删除条数较多时后台线程执行(需共享缓存), 返回任务id, 前端 GET ?task=任务id 查询进度
+    只删除视图 queryset (未配置则为model默认管理器) 中的数据
+    '''
     model = None
+    delete_chunk_size = conf.DELETE_CHUNK_SIZE  # 每批删除条数
+    delete_background_threshold = conf.DELETE_BACKGROUND_THRESHOLD  # 后台删除的条数, 为0则不使用后台删除
+
+    def get(self, request, *args, **kwargs):
+        # 查询后台删除任务进度
+        status = deletion.get_task_status(request.GET.get('task', ''))
+        if not status or status['user'] != request.user.pk:
+            return JsonResponse({'status': False, 'error': '删除任务不存在或已过期'}, status=404)
+        return JsonResponse(status)
 
     def post(self, request, *args, **kwargs):
         error = ''
         if self.model:
             ids = request.POST.getlist('id', [])
             if ids:
-                try:
-                    self.model.objects.filter(id__in=ids).delete()
-                except Exception as e:
-                    error = str(e)
+                deleter = deletion.BulkDeleter(
+                    self.model, ids, chunk_size=self.delete_chunk_size, queryset=self.queryset
+                )
+                if self.delete_background_threshold and deleter.total >= self.delete_background_threshold and (
+                    deletion.can_delete_in_background()
+                ):
+                    task_id = deletion.delete_in_background(deleter, request.user.pk)
+                    return JsonResponse({'status': True, 'error': '', 'task': task_id, 'total': deleter.total})
+                return JsonResponse(deleter.run().get_status())
             else:
                 error = '未提供删除对象id, 操作忽略'
         else:
@@ -148,6 +181,87 @@ class MyDeleteView(ModelMixin, View):
         })
 
 
+class MyBulkUpdateView(ModelMixin, FormView):
+    '''
+    批量修改列表页勾选的数据, 选中的各条修改为相同的字段值, 参考bulkupdate.py
+    GET ?id=1&id=2 显示表单, 表单只含 bulk_update_fields, 勾选要修改的字段 (_fields) 后只验证/修改这些字段,
+    POST 验证一次后修改, 完成后跳转到列表页.
+    需按obj逐条处理(比如根据原值计算)时重写 update_object(), 改为查出obj后分批 bulk_update(),
+    否则直接 queryset.update(), 不查询obj. 都不调用 model.save()/不发送save信号.
+    '''
+    model = None
+    bulk_update_fields = []  # 可批量修改的字段, 为空则为本表可编辑字段 (不含主键/unique/文件字段)
+    bulk_update_chunk_size = conf.BULK_UPDATE_CHUNK_SIZE  # 每批修改条数 (IN列表参数个数)
+    fields_kwarg = '_fields'  # 表单中勾选修改字段的参数名称
+    template_name_suffix = '_bulk_update'
+
+    def get_bulk_update_fields(self):
+        if self.bulk_update_fields:
+            return list(self.bulk_update_fields)
+        return [
+            field.name for field in self.model._meta.concrete_fields
+            if field.editable and not field.primary_key and not field.unique and not isinstance(field, models.FileField)
+        ]
+
+    def get_ids(self):
+        return (self.request.POST if self.request.method == 'POST' else self.request.GET).getlist('id')
+
+    def get_form_class(self):
+        fields = self.get_bulk_update_fields()
+        form_class = forms.modelform_factory(self.model, fields=fields)
+        choices = [(name, form_class.base_fields[name].label or name) for name in fields if name in form_class.base_fields]
+        return type(form_class.__name__, (form_class, ), {
+            self.fields_kwarg: forms.MultipleChoiceField(
+                label='修改字段', choices=choices, widget=forms.CheckboxSelectMultiple
+            ),
+            'field_order': [self.fields_kwarg],
+        })
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        if form.is_bound:
+            # 只验证勾选的字段, 未勾选的不修改
+            selected = self.get_selected_fields(form)
+            for name in list(form.fields):
+                if name != self.fields_kwarg and name not in selected:
+                    del form.fields[name]
+        return form
+
+    def get_selected_fields(self, form):
+        return [name for name in form.data.getlist(self.fields_kwarg) if name in form.fields]
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(ids=self.get_ids(), **kwargs)
+
+    def form_valid(self, form):
+        ids = self.get_ids()
+        if not ids:
+            form.add_error(None, '未提供修改对象id, 请在列表页勾选数据')
+            return self.form_invalid(form)
+        values = {name: form.cleaned_data[name] for name in form.fields if name != self.fields_kwarg}
+        per_object = type(self).update_object is not MyBulkUpdateView.update_object
+        updater = bulkupdate.BulkUpdater(
+            self.model, ids, values, chunk_size=self.bulk_update_chunk_size,
+            update_object=self.update_object if per_object else None, queryset=self.queryset,
+        ).run()
+        if updater.error:
+            form.add_error(None, f'修改出错: {updater.error}')
+            return self.form_invalid(form)
+        return super().form_valid(form)
+
+    def update_object(self, obj, values):
+        # 逐条处理, 重写时改为查出obj后 bulk_update()
+        for name, value in values.items():
+            setattr(obj, name, value)
+
+    def get_success_url(self):
+        # 修改完成后, 跳转到列表页
+        if self.success_url:
+            return str(self.success_url)
+        view_name = self.request.resolver_match.view_name  # app_name可能和meta.app_label不同
+        return reverse_lazy(f'{view_name[:-len("bulk_update")]}list')
+
+
 # class MyPermissionRequiredMixin(PermissionRequiredMixin):
 #     '''
 #     django的PermissionRequiredMixin不按request.method请求类型进行区分权限,
@@ -158,31 +272,25 @@ class MyDeleteView(ModelMixin, View):
 #         method = self.request.method  # 根据method返回相应权限
 
 
-class MyListView(ModelMixin, listview.VirtualRelation, listview.SqlListView):
+class MyListView(
+    ModelMixin, metrics.MetricsMixin, export.ExportMixin, cache.ConditionalGetMixin, cache.PageCacheMixin,
+    listview.VirtualRelationListView
+):
     1
 
 
+class MyExportView(MyListView):
+    '''导出列表数据, 默认csv格式, url参数 export=jsonl 可指定其它格式'''
+    export_format = 'csv'
+
+
 def lookup_val(obj, field_info):
     '''
     ListView 获取 object.field_name 值, 支持多层关联表路径字段 xx__xxx__xx
     field_info: field_path, verbose_name, field
     '''
-    field_path, verbose_name, last_field_name, field = field_info
-    if not field_path:
-        # ListView.list_fields 为空或无任何有效字段, 返回obj本身
-        return obj
-
-    try:
-        field_names = field_path.split('__')
-        for field_name in field_names[:-1]:
-            # 循环取关联表数据
-            obj = getattr(obj, field_name)
-            if not obj:
-                return
-        return obj_get_val(obj, field, last_field_name)
-
-    except Exception:
-        traceback.print_exc()
+    with metrics.column(field_info[0]):
+        return columns.get_accessor(field_info)(obj)
 
 
 def obj_get_val(obj, field, source_field_name=None):
@@ -239,22 +347,66 @@ def obj_get_val(obj, field, source_field_name=None):
         traceback.print_exc()
 
 
-def display_qs(qs):
-    return format_html('<br/>'.join([str(obj) for obj in qs]))
-
-
-class MyDetailView(ModelMixin, DetailView):
+class MyDetailView(ModelMixin, metrics.MetricsMixin, cache.ConditionalGetMixin, cache.PageCacheMixin, DetailView):
+    '''
+    详情页
+    detail_fields, 格式同 MyListView.list_fields, 支持x2o多层__关联及x2m字段, 为空则显示本表所有字段.
+    optimize_sql, 根据字段配置自动 select_related/prefetch_related/only, 外键字段不再各自单独查询.
+    '''
     # template_name = "generic/_detail.html"
+    detail_fields = []  # 详情页显示的字段
+    optimize_sql = conf.LISTVIEW_OPTIMIZE_SQL  # SQL优化
+    page_cache_fragments = ('title', 'content')  # 页面内容缓存 (page_cache), 参考cache.PageCacheMixin
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.optimize_sql:
+            plan = self.fields_plan
+            if plan.select_related:
+                queryset = queryset.select_related(*plan.select_related)
+            if plan.prefetch_related:
+                queryset = queryset.prefetch_related(*plan.prefetch_related)
+            listview.add_only_fields(queryset, plan.onlys)
+        return queryset
+
+    @cached_property
+    def fields_plan(self):
+        # 字段方案, 按视图类缓存
+        key = (type(self), self.model or self.queryset.model, listview.get_fields_key(self.detail_fields))
+        return listview.get_fields_plan(key, self.build_fields_plan)
+
+    def build_fields_plan(self):
+        model = self.model or self.queryset.model
+        plan = listview.FieldsPlan()
+        plan.model = model
+        if self.detail_fields:
+            plan.list_fields = listview.init_fields(model, self.detail_fields)
+            plan.select_related, plan.prefetch_related, plan.onlys = listview.get_optimize_fields(plan.list_fields)
+        else:
+            # 本表所有字段, 外键/o2o显示关联obj, select_related一次性查出, 不限定字段
+            plan.list_fields = [
+                (field.name, field.verbose_name or field.attname, field.name, field) for field in model._meta.fields
+            ]
+            plan.select_related = [field.name for field in model._meta.fields if field.is_relation]
+        for field_info in plan.list_fields:
+            plan.related_models.update(listview.get_related_models(model, field_info[0]))
+        plan.accessors = [columns.compile_accessor(field_info) for field_info in plan.list_fields]
+        return plan
 
     def get_context_data(self, **kwargs):
         """生成各字段key/val，以便在模板中直接使用"""
         context = super().get_context_data(**kwargs)
-        self.object.fields_list = []
-        for field in self.object._meta.fields:
-            val = obj_get_val(self.object, field)
-            self.object.fields_list.append((field.verbose_name or field.attname, val))
+        plan = self.fields_plan
+        accessors = self.get_row_accessors()
+        self.object.fields_list = [
+            (field_info[1], accessor(self.object)) for field_info, accessor in zip(plan.list_fields, accessors)
+        ]
         return context
 
+    def get_row_accessors(self):
+        # 各字段取值函数, 与 fields_plan.list_fields 一一对应
+        return self.fields_plan.accessors
+
 
 '''
 # 使用示例:
@@ -269,7 +421,7 @@ class XxxList(XxxMixin, views.MyListView):
 
 
 class XxxDetail(XxxMixin, views.MyDetailView):
-    1
+    detail_fields = ['pk', 'field1', 'x2o__field3', 'x2m']  # 为空则显示本表所有字段
 
 
 class XxxForm(XxxMixin):